@@ -22,7 +22,10 @@ if "bpy" in locals():
 import bpy
 from bpy.props import (
         BoolProperty,
+        CollectionProperty,
         FloatProperty,
+        FloatVectorProperty,
+        IntProperty,
         StringProperty,
         EnumProperty
         )
@@ -42,14 +45,8 @@ class ModuleInfo:
 IOData3dOrientationHelper = orientation_helper_factory('IOData3dOrientationHelper', axis_forward='-Z', axis_up='Y')
 
 
-class ImportData3d(bpy.types.Operator, ImportHelper, IOData3dOrientationHelper):
-    """ Load a Archilogic Data3d File """
-
-    bl_idname = 'import_scene.data3d'
-    bl_label = 'Import Data3d'
-    bl_options = {'PRESET', 'UNDO'}
-
-    filter_glob = StringProperty(default='*.data3d.buffer;*.data3d.json', options={'HIDDEN'})
+class ImportData3dOptions:
+    """ The import options shared by the data3d import operators """
 
     import_materials = BoolProperty(
         name='Import Materials',
@@ -57,6 +54,16 @@ class ImportData3d(bpy.types.Operator, ImportHelper, IOData3dOrientationHelper):
         default=True
         )
 
+    material_engine = EnumProperty(
+        name='Material Setup',
+        description='Create the materials for this render engine, the other setup is created when the render engine '
+                    'is toggled',
+        items=(('BOTH', 'Both', 'Create the Blender Internal and the Cycles setup'),
+               ('CYCLES', 'Cycles', 'Create the Cycles node setup only'),
+               ('BLENDER_RENDER', 'Blender Internal', 'Create the Blender Internal setup only')),
+        default='BOTH'
+    )
+
     import_hierarchy = BoolProperty(
         name='Import Hierarchy',
         description='Import objects with parent-child relations.',
@@ -94,6 +101,80 @@ class ImportData3d(bpy.types.Operator, ImportHelper, IOData3dOrientationHelper):
         default=True
     )
 
+    import_region = EnumProperty(
+        name='Region',
+        description='Only import the meshes intersecting the region (scene coordinates)',
+        default='NONE',
+        items=[
+            ('NONE', 'Everything', '', 0),
+            ('BOX', 'Box', '', 1),
+            ('SPHERE', 'Sphere', '', 2)
+            ]
+    )
+
+    region_min = FloatVectorProperty(
+        name='Box Min',
+        description='Lower corner of the import box',
+        default=(-10.0, -10.0, -10.0),
+        subtype='XYZ'
+    )
+
+    region_max = FloatVectorProperty(
+        name='Box Max',
+        description='Upper corner of the import box',
+        default=(10.0, 10.0, 10.0),
+        subtype='XYZ'
+    )
+
+    region_center = FloatVectorProperty(
+        name='Sphere Center',
+        description='Center of the import sphere',
+        default=(0.0, 0.0, 0.0),
+        subtype='XYZ'
+    )
+
+    region_radius = FloatProperty(
+        name='Sphere Radius',
+        description='Radius of the import sphere',
+        default=10.0,
+        min=0.0
+    )
+
+    memory_budget = IntProperty(
+        name='Memory Budget (MB)',
+        description='Import the meshes in chunks of this size and release the source data after each chunk, '
+                    '0 imports all meshes at once',
+        default=0,
+        min=0
+    )
+
+    geometry_cache_dir = StringProperty(
+        name='Geometry Cache',
+        description='Cache the processed geometry in this directory for faster re-imports, no cache if empty',
+        default='',
+        subtype='DIR_PATH'
+    )
+
+    geometry_cache_size = IntProperty(
+        name='Cache Size (MB)',
+        description='Size limit of the geometry cache directory',
+        default=4096,
+        min=0
+    )
+
+    track_memory = BoolProperty(
+        name='Memory Report',
+        description='Log and write a json report of the memory used by each import stage',
+        default=False
+    )
+
+    memory_report_path = StringProperty(
+        name='Report File',
+        description='The memory report file, named after the data3d file in the temp directory if empty',
+        default='',
+        subtype='FILE_PATH'
+    )
+
     config_logger = BoolProperty(
         name='Configure logger',
         description='Configure and format log output',
@@ -112,20 +193,159 @@ class ImportData3d(bpy.types.Operator, ImportHelper, IOData3dOrientationHelper):
             #row.prop(self, "create cycles material")
             row = box.row()
             row.prop(self, "import_place_holder_images")
+            row = box.row()
+            row.prop(self, "material_engine")
 
         layout.prop(self, 'import_hierarchy')
         layout.prop(self, 'convert_tris_to_quads')
+        layout.prop(self, 'memory_budget')
+        layout.prop(self, 'geometry_cache_dir')
+        if self.geometry_cache_dir:
+            layout.prop(self, 'geometry_cache_size')
+        layout.prop(self, 'track_memory')
+        if self.track_memory:
+            layout.prop(self, 'memory_report_path')
+
+        layout.prop(self, 'import_region')
+        if self.import_region == 'BOX':
+            box = layout.box()
+            box.prop(self, 'region_min')
+            box.prop(self, 'region_max')
+        elif self.import_region == 'SPHERE':
+            box = layout.box()
+            box.prop(self, 'region_center')
+            box.prop(self, 'region_radius')
 
         layout.prop(self, "axis_forward")
         layout.prop(self, "axis_up")
 
+
+class ImportData3d(bpy.types.Operator, ImportHelper, ImportData3dOptions, IOData3dOrientationHelper):
+    """ Load a Archilogic Data3d File """
+
+    bl_idname = 'import_scene.data3d'
+    bl_label = 'Import Data3d'
+    bl_options = {'PRESET', 'UNDO'}
+
+    filter_glob = StringProperty(default='*.data3d.buffer;*.data3d.json', options={'HIDDEN'})
+
+    progressive = BoolProperty(
+        name='Progressive Import',
+        description='Import in time slices while blender stays responsive, show the objects as they are created. '
+                    'Press Esc to cancel',
+        default=False
+    )
+
+    _progressive_import = None
+    _timer = None
+
+    def draw(self, context):
+        self.layout.prop(self, 'progressive')
+        ImportData3dOptions.draw(self, context)
+
     def execute(self, context):
         from . import import_data3d
         keywords = self.as_keywords(ignore=('axis_forward',
                                             'axis_up',
                                             'filter_glob'))
         keywords['global_matrix'] = axis_conversion(from_forward=self.axis_forward, from_up=self.axis_up).to_4x4()
-        return import_data3d.load(**keywords)
+        if not self.progressive or context.window is None:
+            return import_data3d.load(**keywords)
+
+        self._progressive_import = import_data3d.ProgressiveImport(**keywords)
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(import_data3d.PROGRESSIVE_TIMER_STEP, context.window)
+        wm.progress_begin(0, 100)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.cancel(context)
+            self.report({'WARNING'}, 'Data3d import cancelled')
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER':
+            try:
+                finished = self._progressive_import.step()
+            except Exception as e:
+                self.cancel(context)
+                self.report({'ERROR'}, 'Data3d import failed: ' + str(e))
+                return {'CANCELLED'}
+
+            context.window_manager.progress_update(int(self._progressive_import.progress * 100))
+            # Show the objects created in this slice
+            for area in context.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+            if finished:
+                self._stop(context)
+                return {'FINISHED'}
+
+        return {'PASS_THROUGH'}
+
+    def cancel(self, context):
+        if self._progressive_import is not None:
+            self._progressive_import.cancel()
+            self._stop(context)
+
+    def _stop(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        self._timer = None
+        self._progressive_import = None
+
+
+class ImportData3dBatch(bpy.types.Operator, ImportHelper, ImportData3dOptions, IOData3dOrientationHelper):
+    """ Load multiple Archilogic Data3d Files into one group, materials, textures and geometry are shared """
+
+    bl_idname = 'import_scene.data3d_batch'
+    bl_label = 'Import Data3d Batch'
+    bl_options = {'PRESET', 'UNDO'}
+
+    filter_glob = StringProperty(default='*.data3d.buffer;*.data3d.json', options={'HIDDEN'})
+
+    files = CollectionProperty(
+        name='File Path',
+        type=bpy.types.OperatorFileListElement
+    )
+
+    directory = StringProperty(subtype='DIR_PATH')
+
+    pattern = StringProperty(
+        name='Pattern',
+        description='Glob pattern of additional files to import, relative to the directory (e.g. *.data3d.buffer)',
+        default=''
+    )
+
+    group_name = StringProperty(
+        name='Group',
+        description='Add the imported objects to this group',
+        default='data3d_batch'
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, 'pattern')
+        layout.prop(self, 'group_name')
+        ImportData3dOptions.draw(self, context)
+
+    def execute(self, context):
+        import os
+        from . import import_data3d
+        keywords = self.as_keywords(ignore=('axis_forward',
+                                            'axis_up',
+                                            'filter_glob',
+                                            'filepath',
+                                            'files',
+                                            'directory',
+                                            'pattern'))
+        keywords['global_matrix'] = axis_conversion(from_forward=self.axis_forward, from_up=self.axis_up).to_4x4()
+        keywords['filepaths'] = [os.path.join(self.directory, f.name) for f in self.files if f.name]
+        if self.pattern:
+            keywords['filepaths'].append(os.path.join(self.directory, self.pattern))
+        return import_data3d.load_batch(**keywords)
 
 
 class ExportData3d(bpy.types.Operator, ExportHelper, IOData3dOrientationHelper):
@@ -153,6 +373,45 @@ class ExportData3d(bpy.types.Operator, ExportHelper, IOData3dOrientationHelper):
             ]
     )
 
+    compact_payload = BoolProperty(
+        name='Compact Payload',
+        description='Store quantized positions, normals and uvs (data3d.buffer version 2).',
+        default=False
+    )
+
+    aligned_buffer = BoolProperty(
+        name='Aligned Buffer',
+        description='Store the structure as UTF-8 and align the payload to 16 bytes (data3d.buffer version 3).',
+        default=False
+    )
+
+    compression = EnumProperty(
+        name='Compression',
+        description='Compression codec of the data3d.buffer file.',
+        default='gzip',
+        items=[
+            ('gzip', 'Gzip', 'Compatible default (.gz.data3d.buffer)', 0),
+            ('zlib', 'Zlib', 'Raw zlib streams, slightly smaller and faster to decode (.zlib.data3d.buffer)', 1),
+            ('xz', 'Xz', 'Smallest files, slow to encode (.xz.data3d.buffer)', 2),
+            ('none', 'None', 'Uncompressed (.data3d.buffer)', 3)
+            ]
+    )
+
+    compression_level = IntProperty(
+        name='Compression Level',
+        description='Compression level (xz preset) 0-9, -1 uses the codec default.',
+        default=-1,
+        min=-1,
+        max=9
+    )
+
+    seekable_buffer = BoolProperty(
+        name='Seekable',
+        description='Compress the payload in independent blocks with an index, single meshes can be read without '
+                    'decompressing the whole file (.chunked.data3d.buffer).',
+        default=False
+    )
+
     use_selection = BoolProperty(
         name='Selection Only',
         description='Export selected objects only.',
@@ -165,6 +424,51 @@ class ExportData3d(bpy.types.Operator, ExportHelper, IOData3dOrientationHelper):
         default=False
     )
 
+    link_textures = BoolProperty(
+        name='Hardlink Textures',
+        description='Hardlink changed texture files into the export directory instead of copying them, if possible',
+        default=False
+    )
+
+    export_previews = BoolProperty(
+        name='Preview Textures',
+        description='Generate downscaled preview maps of the exported textures (mapXPreview)',
+        default=True
+    )
+
+    use_export_cache = BoolProperty(
+        name='Export Cache',
+        description='Re-use the geometry of unchanged objects from previous exports.',
+        default=False
+    )
+
+    export_cache_size = IntProperty(
+        name='Cache Size (MB)',
+        description='Size limit of the cached export geometry.',
+        default=1024,
+        min=0
+    )
+
+    export_threads = IntProperty(
+        name='Threads',
+        description='Number of threads for encoding the export, 0 uses the number of processors.',
+        default=0,
+        min=0
+    )
+
+    track_memory = BoolProperty(
+        name='Memory Report',
+        description='Log and write a json report of the memory used by each export stage',
+        default=False
+    )
+
+    memory_report_path = StringProperty(
+        name='Report File',
+        description='The memory report file, named after the data3d file in the temp directory if empty',
+        default='',
+        subtype='FILE_PATH'
+    )
+
     # Hidden context
     export_al_metadata = BoolProperty(
         name='Export Archilogic Metadata',
@@ -181,8 +485,25 @@ class ExportData3d(bpy.types.Operator, ExportHelper, IOData3dOrientationHelper):
     def draw(self, context):
         layout = self.layout
         layout.prop(self, 'export_format')
+        if self.export_format == 'INTERLEAVED':
+            layout.prop(self, 'compact_payload')
+            layout.prop(self, 'aligned_buffer')
+            layout.prop(self, 'compression')
+            if self.compression != 'none':
+                layout.prop(self, 'compression_level')
+                layout.prop(self, 'seekable_buffer')
         layout.prop(self, 'use_selection')
         layout.prop(self, 'export_images')
+        if self.export_images:
+            layout.prop(self, 'link_textures')
+            layout.prop(self, 'export_previews')
+        layout.prop(self, 'use_export_cache')
+        if self.use_export_cache:
+            layout.prop(self, 'export_cache_size')
+        layout.prop(self, 'export_threads')
+        layout.prop(self, 'track_memory')
+        if self.track_memory:
+            layout.prop(self, 'memory_report_path')
 
     def execute(self, context):
         from . import export_data3d
@@ -213,6 +534,18 @@ class ToggleEngine(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class ClearExportCache(bpy.types.Operator):
+    bl_idname = 'al.clear_export_cache'
+    bl_label = 'Clear data3d export cache.'
+    bl_description = 'Invalidate the cached geometry of previous data3d exports.'
+    bl_register = True
+
+    def execute(self, context):
+        from . import export_data3d
+        export_data3d.export_cache.clear()
+        return {'FINISHED'}
+
+
 class MATERIAL_PT_data3d(bpy.types.Panel):
     bl_label = "Data3d Material Utils"
     bl_space_type = "PROPERTIES"
@@ -229,6 +562,7 @@ class MATERIAL_PT_data3d(bpy.types.Panel):
 
 def menu_func_import(self, context):
     self.layout.operator(ImportData3d.bl_idname, text='Archilogic Data3d (data3d.buffer/data3d.json)')
+    self.layout.operator(ImportData3dBatch.bl_idname, text='Archilogic Data3d Batch (data3d.buffer/data3d.json)')
 
 
 def menu_func_export(self, context):
@@ -0,0 +1,257 @@
+import os
+import sys
+import time
+import json
+import logging
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+if __package__:
+    from . import data3d_utils
+else:
+    # Run as a script outside of blender, the package __init__ requires bpy
+    import data3d_utils
+
+
+log = logging.getLogger('archilogic')
+
+SERVICE_OPERATIONS = ('inspect', 'validate', 'convert')
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 64
+
+
+def _warm_up():
+    """ Start the worker process with the data3d utilities (and numpy) imported. """
+    return os.getpid()
+
+
+def _run_operation(operation, args):
+    """ Run the requested operation in the worker process.
+        Args:
+            operation ('str') - The operation. Enum {'inspect', 'validate', 'convert'}
+            args ('dict') - The operation arguments: input, output and the convert options.
+        Returns:
+            _ ('dict') - The json serializable result.
+    """
+    if operation == 'inspect':
+        return data3d_utils.inspect_data3d(args['input'])
+    elif operation == 'validate':
+        return data3d_utils.validate_data3d(args['input'])
+    elif operation == 'convert':
+        options = args['options'] if 'options' in args else {}
+        return {'output': data3d_utils.convert_data3d(args['input'], args['output'], **options)}
+    raise Exception('Unknown operation: ' + str(operation))
+
+
+class Data3dService(object):
+    """ Long running conversion service. Requests are queued and run on a bounded pool of warm worker processes,
+        the responses are streamed back as soon as they are done.
+        Protocol: one json request per line {'id', 'op', 'input', 'output', 'options'}, one json response per line
+        {'id', 'ok', 'result' | 'error'}. The 'metrics' operation returns the queue depth and latency metrics.
+        Attributes:
+            workers ('int') - The number of worker processes.
+            queue_size ('int') - The maximum number of queued requests, further requests are rejected.
+            executor ('concurrent.futures.Executor') - The worker pool.
+            queue ('asyncio.Queue') - The request queue.
+            in_flight ('int') - The number of running requests.
+            metrics ('dict') - The request count, error count, queue wait and run times per operation.
+    """
+
+    def __init__(self, workers=None, queue_size=DEFAULT_QUEUE_SIZE, executor=None):
+        """ Kwargs:
+                workers ('int') - The number of worker processes, number of processors if None.
+                queue_size ('int') - The maximum number of queued requests.
+                executor ('concurrent.futures.Executor') - Run the requests on this executor instead of a process
+                                                           pool, e.g. a ThreadPoolExecutor to run in-process.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.executor = executor
+        self._owns_executor = executor is None
+        self.queue = None
+        self.in_flight = 0
+        self.metrics = {op: {'count': 0, 'errors': 0, 'wait': 0.0, 'run': 0.0, 'maxWait': 0.0, 'maxRun': 0.0}
+                        for op in SERVICE_OPERATIONS}
+        self._server = None
+        self._dispatchers = []
+
+    async def start(self, socket_path=None, host='127.0.0.1', port=DEFAULT_PORT):
+        """ Start the worker pool and the dispatchers. Listen on the unix socket or the localhost port.
+            Kwargs:
+                socket_path ('str') - The unix socket path, no server is started if socket_path and port are None.
+                host ('str') - The host of the tcp server.
+                port ('int') - The port of the tcp server.
+        """
+        loop = asyncio.get_event_loop()
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            # Keep the decoders warm: spawn all workers before the first request
+            await asyncio.gather(*[loop.run_in_executor(self.executor, _warm_up) for _ in range(self.workers)])
+
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._dispatchers = [asyncio.ensure_future(self._dispatch()) for _ in range(self.workers)]
+
+        if socket_path:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=socket_path)
+            log.info('Data3d service listening on %s', socket_path)
+        elif port is not None:
+            self._server = await asyncio.start_server(self._handle_connection, host=host, port=port)
+            log.info('Data3d service listening on %s:%s', host, port)
+
+    async def close(self):
+        """ Stop the server and the dispatchers, shut down the worker pool if the service created it. """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        if self._owns_executor and self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def submit(self, request):
+        """ Queue the request and wait for the response. Used by the connection handler and in-process callers.
+            Args:
+                request ('dict') - The request: id, op, input, output and options.
+            Returns:
+                response ('dict') - The response: id, ok and result or error.
+        """
+        request_id = request.get('id') if isinstance(request, dict) else None
+        operation = request.get('op') if isinstance(request, dict) else None
+        if operation == 'metrics':
+            return {'id': request_id, 'ok': True, 'result': self.get_metrics()}
+        if operation not in SERVICE_OPERATIONS:
+            return {'id': request_id, 'ok': False, 'error': 'Unknown operation: ' + str(operation)}
+
+        future = asyncio.get_event_loop().create_future()
+        try:
+            self.queue.put_nowait((operation, request, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            return {'id': request_id, 'ok': False, 'error': 'Queue full, try again later.'}
+
+        try:
+            result = await future
+            return {'id': request_id, 'ok': True, 'result': result}
+        except Exception as e:
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+
+    def get_metrics(self):
+        """ Return the queue depth and the latency metrics.
+            Returns:
+                _ ('dict') - Queue depth, running requests and count, errors, mean & max queue wait and run time
+                             (seconds) per operation.
+        """
+        operations = {}
+        for op, m in self.metrics.items():
+            count = m['count']
+            operations[op] = {
+                'count': count,
+                'errors': m['errors'],
+                'meanWait': m['wait'] / count if count else 0.0,
+                'maxWait': m['maxWait'],
+                'meanRun': m['run'] / count if count else 0.0,
+                'maxRun': m['maxRun']
+            }
+        return {
+            'workers': self.workers,
+            'queueDepth': self.queue.qsize() if self.queue is not None else 0,
+            'inFlight': self.in_flight,
+            'operations': operations
+        }
+
+    async def _dispatch(self):
+        """ Take the requests from the queue and run them on the worker pool, one at a time per dispatcher. """
+        loop = asyncio.get_event_loop()
+        while True:
+            operation, request, future, t_queued = await self.queue.get()
+            t0 = time.perf_counter()
+            self.in_flight += 1
+            m = self.metrics[operation]
+            try:
+                result = await loop.run_in_executor(self.executor, _run_operation, operation, request)
+                if not future.cancelled():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                m['errors'] += 1
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                self.in_flight -= 1
+                t1 = time.perf_counter()
+                m['count'] += 1
+                m['wait'] += t0 - t_queued
+                m['run'] += t1 - t0
+                m['maxWait'] = max(m['maxWait'], t0 - t_queued)
+                m['maxRun'] = max(m['maxRun'], t1 - t0)
+
+    async def _handle_connection(self, reader, writer):
+        """ Read json requests line by line, the responses are written as soon as each request is done. """
+        # The running requests of the connection, responded requests are removed
+        pending = set()
+
+        async def respond(request):
+            response = await self.submit(request)
+            writer.write((json.dumps(response) + '\n').encode('utf-8'))
+            await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                except ValueError as e:
+                    request = None
+                    writer.write((json.dumps({'id': None, 'ok': False, 'error': 'Invalid request: ' + str(e)}) + '\n')
+                                 .encode('utf-8'))
+                if request is not None:
+                    response = asyncio.ensure_future(respond(request))
+                    pending.add(response)
+                    response.add_done_callback(pending.discard)
+            await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            writer.close()
+
+
+def main(argv=None):
+    """ Run the data3d service until interrupted, e.g. python data3d_service.py --socket /tmp/data3d.sock
+        Args:
+            argv ('list(str)') - The command line arguments, defaults to sys.argv.
+        Returns:
+            _ ('int') - The exit code.
+    """
+    parser = argparse.ArgumentParser(description='Data3d conversion service.')
+    parser.add_argument('--socket', help='Listen on this unix socket instead of the localhost port.')
+    parser.add_argument('--host', default='127.0.0.1', help='The host of the tcp server.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='The port of the tcp server.')
+    parser.add_argument('--workers', type=int, default=None, help='The number of worker processes.')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help='The maximum queued requests.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level='INFO', format='%(asctime)s %(levelname)-10s %(message)s', stream=sys.stdout)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    service = Data3dService(workers=args.workers, queue_size=args.queue_size)
+    loop.run_until_complete(service.start(socket_path=args.socket, host=args.host, port=args.port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(service.close())
+        loop.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
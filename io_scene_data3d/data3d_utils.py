@@ -1,23 +1,107 @@
 import os.path
+import io
+import sys
+import time
 import logging
+import mmap
+import shutil
+import tempfile
+import threading
+import tracemalloc
 
 import struct
 import json
-import gzip
+import hashlib
+import zlib
+import lzma
 import re
 
 import string
 import random
-import copy
+import itertools
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 
-__all__ = ['deserialize_data3d', 'serialize_data3d']
+try:
+    import resource
+except ImportError:
+    # Not available on windows
+    resource = None
+
+import numpy as np
+
+__all__ = ['deserialize_data3d', 'serialize_data3d', 'inspect_data3d', 'validate_data3d', 'convert_data3d',
+           'benchmark_compression', 'GeometryCache', 'MemoryTracker']
 
 HEADER_BYTE_LENGTH = 16
 MAGIC_NUMBER = '\x44\x33\x44\x41' #Fixme reverse byteorder: '\x41\x44\x33\x44' #AD3D encoded as ASCII characters in hex
 VERSION = 1
+VERSION_COMPACT = 2
+# UTF-8 structure, payload start and attribute ranges aligned to ALIGNED_BYTE_LENGTH
+VERSION_ALIGNED = 3
+SUPPORTED_VERSIONS = (VERSION, VERSION_COMPACT, VERSION_ALIGNED)
+ALIGNED_BYTE_LENGTH = 16
 SUFFIX_JSON = 'data3d.json'
 SUFFIX_BUFFER = 'data3d.buffer'
 SUFFIX_GZIP = 'gz'
+GZIP_BLOCK_SIZE = 4 * 1024 * 1024
+# Compression codecs of the data3d.buffer file, read back by their leading magic bytes
+CODEC_NONE = 'none'
+CODEC_GZIP = 'gzip'
+CODEC_ZLIB = 'zlib'
+CODEC_XZ = 'xz'
+COMPRESSION_CODECS = (CODEC_NONE, CODEC_GZIP, CODEC_ZLIB, CODEC_XZ)
+CODEC_SUFFIXES = {CODEC_GZIP: SUFFIX_GZIP, CODEC_ZLIB: 'zlib', CODEC_XZ: 'xz'}
+# Default compression level (xz preset) per codec
+CODEC_LEVELS = {CODEC_GZIP: 9, CODEC_ZLIB: 6, CODEC_XZ: 6}
+# Seekable container: header (magic, codec, block size, block count, structure stream & payload byte length),
+# compressed header & structure, block index (block count + 1 stream offsets), independently compressed payload blocks
+CHUNKED_MAGIC = b'D3DZ'
+CHUNKED_HEADER = struct.Struct('<4s4sIIQQ')
+CHUNKED_BLOCK_SIZE = 256 * 1024
+# Number of decompressed payload blocks kept per container
+CHUNKED_CACHE_BLOCKS = 8
+SUFFIX_CHUNKED = 'chunked'
+# Geometry cache files: arrays, json table and footer (magic, version, table byte offset)
+GEOMETRY_CACHE_MAGIC = b'D3DC'
+# Version 2: welded vertices, version 3: degenerate faces and unreferenced vertices removed, version 4: vertices
+# welded within the threshold distance, version 5: vertices welded in rounds
+GEOMETRY_CACHE_VERSION = 5
+GEOMETRY_CACHE_SUFFIX = '.d3dcache'
+GEOMETRY_CACHE_FOOTER = struct.Struct('<4siq')
+# The number of source files (path, size, mtime) whose digest is kept in the cache index
+GEOMETRY_CACHE_INDEX_SIZE = 1024
+# Vertices closer than this distance are merged at decode time
+WELD_THRESHOLD = 0.0001
+# The maximum number of weld rounds, vertices not resolved by then are kept
+WELD_ROUNDS = 32
+# Triangles with this area or less are dropped at decode time (SMALL_NUM / Blender limitation)
+DEGENERATE_AREA = 0.00000001
+# Number of files whose mesh bounds are kept for region filtered imports
+BOUNDS_CACHE_SIZE = 32
+# Number of allocation sites reported per stage by the memory tracker
+MEMORY_TOP_ALLOCATIONS = 10
+# Rough memory cost of one payload float once decoded into the python mesh data (tuples, indices, faces)
+IMPORT_BYTES_PER_FLOAT = 96
+
+# Little endian payload types of the compact (version 2) buffer encoding
+BUFFER_DTYPES = {
+    'float32': '<f4',
+    'float16': '<f2',
+    'int16': '<i2',
+    'int8': 'i1',
+}
+COMPACT_NORMALS_TYPES = ('int16', 'int8')
+COMPACT_UVS_TYPES = ('float16', 'int16')
+
+JSON_CHUNK_SIZE = 1024 * 1024
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+JSON_SCALAR = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?|true|false|null')
+JSON_SCALAR_CHARS = re.compile(r'[-+.0-9a-zA-Z]+')
+JSON_CONSTANTS = {'true': True, 'false': False, 'null': None}
+# Keys of the flat numeric attribute arrays, parsed to float32 arrays
+JSON_FLOAT_ARRAY_KEYS = ('positions', 'normals', 'uvs', 'uvsLightmap')
 
 ESCAPE_ASCII = re.compile(r'([\\"]|[^\ -~])')
 ESCAPE_DCT = {
@@ -35,6 +119,11 @@ log = logging.getLogger('archilogic')
 # Temp
 dump_file = __file__.rsplit('.', 1)[0] + '.dump'
 
+# Local mesh bounds per file, keyed by (path, size, mtime)
+_bounds_cache = OrderedDict()
+# Serializes the read-modify-write of the geometry cache indices
+_geometry_cache_lock = threading.Lock()
+
 
 # Relevant Data3d keys
 class D3D:
@@ -105,6 +194,17 @@ class D3D:
     b_uvs_length = 'uvsLength'
     b_uvs2_offset = 'uvsLightmapOffset'
     b_uvs2_length = 'uvsLightmapLength'
+    b_coords_encoding = 'positionsEncoding'
+    b_normals_encoding = 'normalsEncoding'
+    b_uvs_encoding = 'uvsEncoding'
+    b_uvs2_encoding = 'uvsLightmapEncoding'
+
+    # Buffer Encoding (version 2)
+    e_type = 'type'
+    e_offset = 'offset'
+    e_scale = 'scale'
+    e_mapping = 'mapping'
+    e_octahedral = 'octahedral'
 
     #Blender Meta
     bl_meta = 'Data3d Material'
@@ -117,8 +217,9 @@ class Data3dObject(object):
             node_id ('str') - The nodeId of the object or a generated Id.
             parent ('Data3dObject') -
             children ('list(Data3dObject)') - The children of the D3D Object.
-            file_buffer ('bytearray') - The file buffer in memory, if import source is binary.
+            file_buffer ('bytearray', 'mmap.mmap', 'ChunkedBuffer') - The file buffer, if import source is binary.
             payload_byte_offset('int') - The payload byte offset for accessing geometry data.
+            buffer_version ('int') - The header version of the file buffer, defines the payload encoding.
             materials ('list(dict)') - The object materials as raw json data.
             position ('list(int)') - The relative position of the object.
             rotation ('list(int)') - The relative rotation of the object.
@@ -127,12 +228,13 @@ class Data3dObject(object):
             mesh_references('dict') - The mesh keys of the D3D object.
     """
 
-    def __init__(self, node, parent=None, file_buffer=None, payload_byte_offset=0):
+    def __init__(self, node, parent=None, file_buffer=None, payload_byte_offset=0, buffer_version=VERSION):
         self.node_id = node[D3D.node_id] if D3D.node_id in node else _id_generator(12)
         self.parent = None
         self.children = []
         self.file_buffer = file_buffer
         self.payload_byte_offset = payload_byte_offset
+        self.buffer_version = buffer_version
 
         self.materials = node[D3D.o_materials] if D3D.o_materials in node else []
         self.position = node[D3D.o_position] if D3D.o_position in node else [0, 0, 0]
@@ -147,86 +249,100 @@ class Data3dObject(object):
             self.parent = parent
             parent.add_child(self)
 
+    def estimate_import_bytes(self):
+        """ Estimate the memory needed to decode the meshes of this object for the import.
+            Returns:
+                _ ('int') - The estimated byte size of the decoded mesh data.
+        """
+        float_count = 0
+        for mesh in self.mesh_references.values():
+            # Encoded lengths differ from the decoded ones (version 2), count the decoded floats per vertex
+            vertex_count = (mesh[D3D.b_coords_length] if D3D.b_coords_length in mesh else len(mesh[D3D.v_coords])) // 3
+            vertex_floats = 6
+            if D3D.uv_coords in mesh or D3D.b_uvs_offset in mesh:
+                vertex_floats += 2
+            if D3D.uv2_coords in mesh or D3D.b_uvs2_offset in mesh:
+                vertex_floats += 2
+            float_count += vertex_count * vertex_floats
+        return float_count * IMPORT_BYTES_PER_FLOAT
+
+    def get_mesh_bounds(self, mesh_key):
+        """ Compute the axis aligned bounding box of the mesh in the space of this object, the mesh position, rotRad
+            and scale are applied. Only the positions are decoded, compact (version 2) positions store their
+            bounding box in the encoding and are not decoded at all.
+            Args:
+                mesh_key ('str') - The mesh key.
+            Returns:
+                _ ('tuple(numpy.ndarray)') - The lower and upper corner, None if the mesh has no positions.
+        """
+        mesh = self.mesh_references[mesh_key]
+        if D3D.b_coords_offset in mesh:
+            if mesh[D3D.b_coords_length] == 0:
+                return None
+            encoding = mesh[D3D.b_coords_encoding] if D3D.b_coords_encoding in mesh else None
+            if encoding and D3D.e_scale in encoding:
+                max_int = np.iinfo(BUFFER_DTYPES[encoding[D3D.e_type]]).max
+                offset, scale = np.asarray(encoding[D3D.e_offset]), np.asarray(encoding[D3D.e_scale])
+                lower, upper = offset - scale * max_int, offset + scale * max_int
+            else:
+                byte_offset = _payload_byte_offset(mesh[D3D.b_coords_offset], self.buffer_version)
+                positions = _decode_attribute(self.file_buffer, self.payload_byte_offset + byte_offset,
+                                              mesh[D3D.b_coords_length], encoding).reshape(-1, 3)
+                lower, upper = positions.min(axis=0), positions.max(axis=0)
+        else:
+            positions = np.asarray(mesh[D3D.v_coords] if D3D.v_coords in mesh else [], dtype=np.float32).reshape(-1, 3)
+            if len(positions) == 0:
+                return None
+            lower, upper = positions.min(axis=0), positions.max(axis=0)
+
+        matrix = _transform_matrix(mesh[D3D.m_position] if D3D.m_position in mesh else [0, 0, 0],
+                                   mesh[D3D.m_rotation] if D3D.m_rotation in mesh else [0, 0, 0],
+                                   mesh[D3D.m_scale] if D3D.m_scale in mesh else [1, 1, 1])
+        return _transform_bounds(lower, upper, matrix)
+
+    def release_source_data(self):
+        """ Drop the references to the source data (mesh json, materials and the file buffer) once the blender
+            objects are created, the buffer is freed when the last object releases it.
+        """
+        self.mesh_references = {}
+        self.materials = {}
+        self.file_buffer = None
+
     def _get_data3d_mesh_nodes(self, mesh, name):
-        """ Return all the relevant nodes of this mesh. Create face data for the mesh import.
+        """ Return the raw per vertex attributes of this mesh as float32 arrays. Float32 buffer payloads are not
+            copied, the arrays are views of the file buffer.
             Args:
                 mesh ('dict') - The json mesh data.
                 name ('str') - The mesh key.
             Returns:
-                mesh_data ('dict') - The data of the mesh
-        """
-        def distinct_coordinates(raw_coords):
-            """ Removes duplicate entries from the input. Returns the distincted list and a
-                indexed map of the raw input.
-                Args:
-                    raw_coords ('list') - The raw coordinate list.
-                Return:
-                    distinct_coords ('list') - The distinct list of coordinates.
-                    distinct_indices ('list') - The indices map from raw to distinct coordinates.
-            """
-            hashed_coords = {}
-            distinct_coords = []
-            distinct_indices = []
-            idx = 0
-            for c in raw_coords:
-                if c in hashed_coords:
-                    distinct_indices.append(int(hashed_coords[c]))
-                else:
-                    hashed_coords[c] = idx
-                    distinct_coords.append(c)
-                    distinct_indices.append(idx)
-                    idx += 1
-            del hashed_coords
-
-            return distinct_coords, distinct_indices
-
-        def from_buffer(m):
-            data = {}
-            unpacked_coords = self._get_data_from_buffer(m[D3D.b_coords_offset], m[D3D.b_coords_length])
-            data['verts_loc_raw'] = [tuple(unpacked_coords[x:x+3]) for x in range(0, len(unpacked_coords), 3)]
-            del unpacked_coords
-
-            unpacked_normals = self._get_data_from_buffer(m[D3D.b_normals_offset], m[D3D.b_normals_offset])
-            data['verts_nor_raw'] = [tuple(unpacked_normals[x:x+3]) for x in range(0, len(unpacked_normals), 3)]
-            del unpacked_normals
-
-            if has_uvs:
-                unpacked_uvs = self._get_data_from_buffer(mesh[D3D.b_uvs_offset], mesh[D3D.b_uvs_length])
-                data['verts_uvs_raw'] = [tuple(unpacked_uvs[x:x+2]) for x in range(0, len(unpacked_uvs), 2)]
-                del unpacked_uvs
-
-            if has_uvs2:
-                unpacked_uvs2 = self._get_data_from_buffer(m[D3D.b_uvs2_offset], m[D3D.b_uvs2_length])
-                data['verts_uvs2_raw'] = [tuple(unpacked_uvs2[x:x+2]) for x in range(0, len(unpacked_uvs2), 2)]
-                del unpacked_uvs2
-            return data
-
-        def from_json(m):
-            data = {}
-            # Vertex location, normal and uv coordinates, referenced by indices
-            data['verts_loc_raw'] = [tuple(m[D3D.v_coords][x:x+3]) for x in range(0, len(m[D3D.v_coords]), 3)]
-            data['verts_nor_raw'] = [tuple(m[D3D.v_normals][x:x+3]) for x in range(0, len(m[D3D.v_normals]), 3)]
-
-            if has_uvs:
-                data['verts_uvs_raw'] = [tuple(m[D3D.uv_coords][x:x+2]) for x in range(0, len(m[D3D.uv_coords]), 2)]
-            if has_uvs2:
-                data['verts_uvs2_raw'] = [tuple(m[D3D.uv2_coords][x:x+2]) for x in range(0, len(m[D3D.uv2_coords]), 2)]
-
-            return data
-
-        has_uvs = D3D.uv_coords in mesh or D3D.b_uvs_offset in mesh
-        has_uvs2 = D3D.uv2_coords in mesh or D3D.b_uvs2_offset in mesh
-
-        # Get mesh data from buffer
-        if D3D.b_coords_offset in mesh:
-            raw_mesh_data = from_buffer(mesh)
-
-        # Get mesh data from json
-        else:
-            raw_mesh_data = from_json(mesh)
+                mesh_data ('dict') - The mesh metadata, the verts_loc_raw, verts_nor_raw (n, 3) and the optional
+                                     verts_uvs_raw, verts_uvs2_raw (n, 2) arrays.
+        """
+        mesh_data = self._get_mesh_metadata(mesh, name)
+        for raw_key, array_key, offset_key, length_key, encoding_key, size in [
+                ('verts_loc_raw', D3D.v_coords, D3D.b_coords_offset, D3D.b_coords_length, D3D.b_coords_encoding, 3),
+                ('verts_nor_raw', D3D.v_normals, D3D.b_normals_offset, D3D.b_normals_length, D3D.b_normals_encoding, 3),
+                ('verts_uvs_raw', D3D.uv_coords, D3D.b_uvs_offset, D3D.b_uvs_length, D3D.b_uvs_encoding, 2),
+                ('verts_uvs2_raw', D3D.uv2_coords, D3D.b_uvs2_offset, D3D.b_uvs2_length, D3D.b_uvs2_encoding, 2)]:
+            if offset_key in mesh:
+                values = self._get_attribute_from_buffer(mesh, offset_key, length_key, encoding_key)
+            elif array_key in mesh or size == 3:
+                values = np.asarray(mesh[array_key], dtype=np.float32)
+            else:
+                continue
+            mesh_data[raw_key] = values.reshape(-1, size)
+        return mesh_data
 
-        # Convert the raw data to mesh_data.
-        mesh_data = {
+    @staticmethod
+    def _get_mesh_metadata(mesh, name):
+        """ Return the name, material and transform of the mesh.
+            Args:
+                mesh ('dict') - The json mesh data.
+                name ('str') - The mesh key.
+            Returns:
+                metadata ('dict') - The name, position, rotation, scale and material (if any) of the mesh.
+        """
+        metadata = {
             'name': name,
             'position': mesh[D3D.m_position] if D3D.m_position in mesh else [0, 0, 0],
             'rotation': mesh[D3D.m_rotation] if D3D.m_rotation in mesh else [0, 0, 0],
@@ -234,74 +350,56 @@ class Data3dObject(object):
         }
 
         if D3D.m_material in mesh:
-            mesh_data['material'] = mesh[D3D.m_material]
-
-        mesh_data['verts_loc'], v_indices = distinct_coordinates(raw_mesh_data['verts_loc_raw'])
-        face_vertex_indices = [tuple(v_indices[x:x+3]) for x in range(0, len(v_indices), 3)]
-        mesh_data['verts_nor'], n_indices = distinct_coordinates(raw_mesh_data['verts_nor_raw'])
-        face_normal_indices = [tuple(n_indices[x:x+3]) for x in range(0, len(n_indices), 3)]
-        face_uvs_indices = face_uvs2_indices = [(), ] * len(face_vertex_indices)
-
-        if has_uvs:
-            mesh_data['verts_uvs'], uvs_indices = distinct_coordinates(raw_mesh_data['verts_uvs_raw'])
-            face_uvs_indices = [tuple(uvs_indices[x:x+3]) for x in range(0, len(uvs_indices), 3)]
-
-        if has_uvs2:
-            mesh_data['verts_uvs2'], uvs2_indices = distinct_coordinates(raw_mesh_data['verts_uvs2_raw'])
-            face_uvs2_indices = [tuple(uvs2_indices[x:x+3]) for x in range(0, len(uvs2_indices), 3)]
-
-        # face = [(loc_idx), (norm_idx), (uv_idx), (uv2_idx)]
-        mesh_data['faces'] = [list(f) for f in zip(face_vertex_indices, face_normal_indices, face_uvs_indices, face_uvs2_indices)]
-
-        del raw_mesh_data
-
-        return mesh_data
+            metadata['material'] = mesh[D3D.m_material]
+        return metadata
 
-    def _get_data_from_buffer(self, offset, length):
-        """ Returns the specified chunk of the buffer bytearray as a float list.
+    def _get_attribute_from_buffer(self, mesh, offset_key, length_key, encoding_key):
+        """ Returns the decoded attribute of the mesh, dispatched by the buffer version.
             Args:
-                offset ('int') - The offset of the requested data in the payload.
-                length ('int') - The length of the requested data section in the payload.
+                mesh ('dict') - The json mesh data.
+                offset_key ('str') - The key of the attribute offset.
+                length_key ('str') - The key of the attribute length.
+                encoding_key ('str') - The key of the attribute encoding (version 2 & 3).
             Returns:
-                data ('list(float)') - The requested data chunk.
+                _ ('numpy.ndarray') - The flat float32 array, a view of the file buffer for float32 payloads.
         """
-        start = self.payload_byte_offset + (offset * 4)
-        end = start + (length * 4)
-        data = []
-        binary_data = self.file_buffer[start:end]
-        for x in range(0, len(binary_data), 4):
-            data.append(binary_unpack('f', binary_data[x:x+4]))
-        return data
+        byte_offset = self.payload_byte_offset + _payload_byte_offset(mesh[offset_key], self.buffer_version)
+        encoding = mesh[encoding_key] if encoding_key in mesh else None
+        return _decode_attribute(self.file_buffer, byte_offset, mesh[length_key], encoding)
 
     @staticmethod
-    def _handle_double_sided_faces(orig_mesh):
-        """ Split double sided faces from mesh into a new mesh object
-        """
-        orig_faces = orig_mesh['faces']
-        hashed_faces = {}
-        ss_faces = []
-        ds_faces = []
-        for f in orig_faces:
-            v_locs = f[0]
-            v_hash = str(sorted(v_locs))
-            if v_hash in hashed_faces:
-                ds_faces.append(f)
-            else:
-                ss_faces.append(f)
-                hashed_faces[v_hash] = True
-        del hashed_faces
-
-        if len(ds_faces) > 0:
-            # Fixme: both meshes use the same mesh_data, we only replace the faces -> results in unused points
-            # Fixme: implement: split coords per mesh (atm we clean this upon import @optimize_mesh)
-            keys = ['name', 'material', 'position', 'rotation', 'scale', 'verts_loc', 'verts_nor', 'verts_uvs', 'verts_uvs2']
-            ss_mesh = {key: orig_mesh[key] for key in keys if key in orig_mesh}
-            ds_mesh = {key: orig_mesh[key] for key in keys if key in orig_mesh}
-            ss_mesh['faces'] = ss_faces
-            ds_mesh['faces'] = ds_faces
-            return [ss_mesh, ds_mesh]
-        else:
-            return [orig_mesh]
+    def _handle_double_sided_faces(mesh_arrays):
+        """ Split double sided faces from the mesh into a new mesh: faces with the vertices of a previous face.
+            Both meshes share the vertex arrays, unreferenced vertices are dropped in _clean_mesh_arrays.
+            Args:
+                mesh_arrays ('dict') - The mesh arrays of _mesh_data_to_arrays.
+            Returns:
+                _ ('list(dict)') - The single sided and (if any) the double sided mesh arrays.
+        """
+        faces_loc = np.sort(mesh_arrays['faces_loc'], axis=1)
+        if len(faces_loc) == 0:
+            return [mesh_arrays]
+        _, first = np.unique(_as_row_keys(faces_loc), return_index=True)
+        single_sided = np.zeros(len(faces_loc), dtype=bool)
+        single_sided[first] = True
+        if np.all(single_sided):
+            return [mesh_arrays]
+
+        ss_mesh, ds_mesh = dict(mesh_arrays), dict(mesh_arrays)
+        for faces_key in ('faces_loc', 'faces_nor', 'faces_uvs', 'faces_uvs2'):
+            if faces_key in mesh_arrays:
+                ss_mesh[faces_key] = mesh_arrays[faces_key][single_sided]
+                ds_mesh[faces_key] = mesh_arrays[faces_key][~single_sided]
+        return [ss_mesh, ds_mesh]
+
+    def get_world_matrix(self):
+        """ Return the transformation of the node to data3d space, the position and rotRad of the node and its
+            parents.
+            Returns:
+                _ ('numpy.ndarray') - The 4x4 matrix.
+        """
+        local = _transform_matrix(self.position, self.rotation)
+        return local if self.parent is None else self.parent.get_world_matrix().dot(local)
 
     def set_bl_object(self, bl_object):
         """ Create a reference to the blender object associated with this Object.
@@ -318,26 +416,590 @@ class Data3dObject(object):
         """
         self.children.append(child)
 
+    def get_mesh_metadata(self, mesh_key):
+        """ Return the name, material and transform of the mesh, see get_mesh_data.
+            Args:
+                mesh_key ('str') - The mesh key.
+            Returns:
+                metadata ('dict') - The name, position, rotation, scale and material (if any) of the mesh.
+        """
+        return self._get_mesh_metadata(self.mesh_references[mesh_key], mesh_key)
+
+    def get_mesh_digest(self, mesh_key):
+        """ Hash the encoded geometry of the mesh without decoding it, meshes with equal digests result in equal
+            mesh arrays (the name, material and transform are not part of the digest).
+            Args:
+                mesh_key ('str') - The mesh key.
+            Returns:
+                _ ('str') - The sha1 hex digest of the mesh attributes.
+        """
+        mesh = self.mesh_references[mesh_key]
+        sha1 = hashlib.sha1()
+        for array_key, offset_key, length_key, encoding_key in [
+                (D3D.v_coords, D3D.b_coords_offset, D3D.b_coords_length, D3D.b_coords_encoding),
+                (D3D.v_normals, D3D.b_normals_offset, D3D.b_normals_length, D3D.b_normals_encoding),
+                (D3D.uv_coords, D3D.b_uvs_offset, D3D.b_uvs_length, D3D.b_uvs_encoding),
+                (D3D.uv2_coords, D3D.b_uvs2_offset, D3D.b_uvs2_length, D3D.b_uvs2_encoding)]:
+            sha1.update(array_key.encode('utf-8'))
+            if offset_key in mesh:
+                encoding = mesh[encoding_key] if encoding_key in mesh else None
+                item_size = np.dtype(BUFFER_DTYPES[encoding[D3D.e_type] if encoding else 'float32']).itemsize
+                start = self.payload_byte_offset + _payload_byte_offset(mesh[offset_key], self.buffer_version)
+                sha1.update(self.file_buffer[start:start + mesh[length_key] * item_size])
+                sha1.update(json.dumps(encoding, sort_keys=True).encode('utf-8'))
+            elif array_key in mesh:
+                sha1.update(np.asarray(mesh[array_key], dtype=np.float32).tobytes())
+        return sha1.hexdigest()
+
+    def get_mesh_arrays(self, mesh_key, handle_double_sided=True, weld_threshold=WELD_THRESHOLD):
+        """ Get the mesh_data for the specified mesh key as numpy arrays with welded vertices, without degenerate
+            faces and unreferenced vertices, see _mesh_data_to_arrays, _weld_mesh_arrays and _clean_mesh_arrays.
+            Args:
+                mesh_key ('str') - The mesh key.
+            Kwargs:
+                handle_double_sided ('bool') - Parse the mesh-data for double sided meshes.
+                weld_threshold ('float') - Merge the vertices closer than this distance, 0 merges equal vertices only.
+            Returns:
+                meshes ('list('dict')') - The list of mesh arrays. (Mesh is split when double sided)
+        """
+        meshes = []
+        for mesh_arrays in self.get_mesh_data(mesh_key, handle_double_sided):
+            mesh_arrays, merged = _weld_mesh_arrays(mesh_arrays, weld_threshold)
+            mesh_arrays, faces_removed, verts_removed = _clean_mesh_arrays(mesh_arrays)
+            if merged or faces_removed or verts_removed:
+                log.debug('Clean mesh %s: vertices welded: %d, faces removed: %d, vertices removed: %d', mesh_key,
+                          merged, faces_removed, verts_removed)
+            meshes.append(mesh_arrays)
+        return meshes
+
     def get_mesh_data(self, mesh_key, handle_double_sided=True):
-        """ Get the mesh_data for the specified mesh key.
+        """ Get the distinct vertex attributes and face indices of the mesh as numpy arrays, see _mesh_data_to_arrays.
             Args:
                 mesh_key ('str') - The mesh key.
             Kwargs:
                 handle_double_sided ('bool') - Parse the mesh-data for double sided meshes.
             Returns:
-                meshes ('list('dict')') - The list of mesh_data sets. (Mesh is split when double sided)
+                meshes ('list('dict')') - The list of mesh arrays. (Mesh is split when double sided)
         """
-        if mesh_key in self.mesh_references:
-            mesh_data = self._get_data3d_mesh_nodes(self.mesh_references[mesh_key], mesh_key)
-            if handle_double_sided:
-                meshes = self._handle_double_sided_faces(mesh_data)
-            else:
-                meshes = [mesh_data]
-            return meshes
-        else:
+        if mesh_key not in self.mesh_references:
             log.error('Mesh key %s not found.', mesh_key)
             return []
-        return []
+        mesh_arrays = _mesh_data_to_arrays(self._get_data3d_mesh_nodes(self.mesh_references[mesh_key], mesh_key))
+        if handle_double_sided:
+            return self._handle_double_sided_faces(mesh_arrays)
+        return [mesh_arrays]
+
+
+class GeometryCache(object):
+    """ On-disk cache of the processed mesh arrays (decoded, deduplicated and split double sided meshes) of data3d
+        files. One file per source content and processing options, the arrays are mapped straight into memory on a
+        hit. Entries are keyed by the content digest and the options, the digest is re-used while the source path,
+        size and mtime are unchanged. The least recently used files are evicted above the size limit, the index
+        keeps the digests of the last GEOMETRY_CACHE_INDEX_SIZE source files.
+        Attributes:
+            cache_dir ('str') - The cache directory.
+            max_bytes ('int') - The size limit of the cache files in bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=4 * 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _get_index_path(self):
+        """ The index maps the source path, size and mtime to the content digest. """
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def _read_index(self):
+        """ Read the digest index, empty if it does not exist. """
+        try:
+            with open(self._get_index_path(), mode='r', encoding='utf-8') as index_file:
+                return json.load(index_file, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            return OrderedDict()
+
+    def _write_index(self, index):
+        """ Replace the digest index atomically, readers never see a partially written index. """
+        with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', dir=self.cache_dir, suffix='.tmp',
+                                         delete=False) as index_file:
+            json.dump(index, index_file)
+        try:
+            os.replace(index_file.name, self._get_index_path())
+        except OSError:
+            os.remove(index_file.name)
+            raise
+
+    def get_digest(self, input_path):
+        """ Return the content digest of the source file, the file is only hashed if its path, size or mtime changed.
+            Args:
+                input_path ('str') - The path to the data3d file.
+            Returns:
+                digest ('str') - The sha1 hex digest of the file content.
+        """
+        stat = os.stat(input_path)
+        source_key = '|'.join([os.path.abspath(input_path), str(stat.st_size), str(stat.st_mtime_ns)])
+        with _geometry_cache_lock:
+            index = self._read_index()
+        if source_key in index:
+            return index[source_key]
+
+        sha1 = hashlib.sha1()
+        with open(input_path, 'rb') as source_file:
+            for block in iter(lambda: source_file.read(GZIP_BLOCK_SIZE), b''):
+                sha1.update(block)
+        digest = sha1.hexdigest()
+
+        # Other imports may have updated the index while hashing
+        with _geometry_cache_lock:
+            index = self._read_index()
+            index.pop(source_key, None)
+            index[source_key] = digest
+            while len(index) > GEOMETRY_CACHE_INDEX_SIZE:
+                index.popitem(last=False)
+            self._write_index(index)
+        return digest
+
+    def get_path(self, digest, options=None):
+        """ Return the cache file path of the content digest and the processing options.
+            Args:
+                digest ('str') - The content digest of the source file.
+            Kwargs:
+                options ('dict') - The json serializable options the cached arrays depend on.
+            Returns:
+                _ ('str') - The cache file path.
+        """
+        options_digest = hashlib.sha1(json.dumps(options or {}, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '-' + options_digest[:16] + GEOMETRY_CACHE_SUFFIX)
+
+    def open(self, input_path, options=None):
+        """ Map the cached mesh arrays of the source file.
+            Args:
+                input_path ('str') - The path to the data3d file.
+            Kwargs:
+                options ('dict') - The processing options, e.g. weld threshold and import region.
+            Returns:
+                _ ('_GeometryCacheEntry') - The cache entry, None if the file is not cached. Close it once the arrays
+                                            are no longer used.
+        """
+        path = self.get_path(self.get_digest(input_path), options)
+        if not os.path.exists(path):
+            return None
+        try:
+            entry = _GeometryCacheEntry(path)
+        except Exception as e:
+            log.warning('Geometry cache entry %s is invalid: %s', path, e)
+            return None
+        # Most recently used
+        os.utime(path)
+        return entry
+
+    def create(self, input_path, options=None):
+        """ Create a writer for the mesh arrays of the source file.
+            Args:
+                input_path ('str') - The path to the data3d file.
+            Kwargs:
+                options ('dict') - The processing options, e.g. weld threshold and import region.
+            Returns:
+                _ ('_GeometryCacheWriter') - The writer, commit() stores the entry and evicts old entries.
+        """
+        return _GeometryCacheWriter(self, self.get_path(self.get_digest(input_path), options))
+
+    def trim(self, keep=None):
+        """ Remove the least recently used cache files until the cache fits the size limit.
+            Kwargs:
+                keep ('str') - The path of a cache file which is not evicted.
+        """
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(GEOMETRY_CACHE_SUFFIX):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        total_bytes = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError as e:
+                # Still mapped (windows)
+                log.debug('Geometry cache eviction failed: %s', e)
+
+    def clear(self):
+        """ Remove all cache files. """
+        max_bytes, self.max_bytes = self.max_bytes, 0
+        self.trim()
+        self.max_bytes = max_bytes
+        with _geometry_cache_lock:
+            if os.path.exists(self._get_index_path()):
+                os.remove(self._get_index_path())
+
+
+class _GeometryCacheWriter(object):
+    """ Append the mesh arrays to a temporary file, the table and footer are written on commit. """
+
+    def __init__(self, cache, path):
+        self.cache = cache
+        self.path = path
+        self.table = {}
+        self.file = tempfile.NamedTemporaryFile(dir=cache.cache_dir, suffix='.tmp', delete=False)
+        self.byte_length = 0
+
+    def _write(self, data):
+        self.file.write(data)
+        self.byte_length += len(data)
+
+    def add(self, object_index, mesh_key, meshes):
+        """ Store the processed meshes of a mesh key.
+            Args:
+                object_index ('int') - The index of the Data3dObject in the deserialized objects.
+                mesh_key ('str') - The mesh key.
+                meshes ('list(dict)') - The mesh arrays.
+        """
+        entries = []
+        for mesh in meshes:
+            entry = {'arrays': {}}
+            for key, value in mesh.items():
+                if isinstance(value, np.ndarray):
+                    self._write(bytes(-self.byte_length % ALIGNED_BYTE_LENGTH))
+                    entry['arrays'][key] = [value.dtype.str, list(value.shape), self.byte_length]
+                    self._write(np.ascontiguousarray(value).tobytes())
+                else:
+                    entry[key] = value
+            entries.append(entry)
+        self.table[str(object_index) + '/' + mesh_key] = entries
+
+    def commit(self):
+        """ Write the table and the footer and move the file into the cache. """
+        table_byte_offset = self.byte_length
+        self._write(json.dumps(self.table).encode('utf-8'))
+        self._write(GEOMETRY_CACHE_FOOTER.pack(GEOMETRY_CACHE_MAGIC, GEOMETRY_CACHE_VERSION, table_byte_offset))
+        self.file.close()
+        os.replace(self.file.name, self.path)
+        self.cache.trim(keep=self.path)
+
+    def abort(self):
+        """ Discard the temporary file. """
+        self.file.close()
+        if os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+
+class _GeometryCacheEntry(object):
+    """ The mapped cache file, the mesh arrays are views of the mapping. """
+
+    def __init__(self, path):
+        with open(path, 'rb') as cache_file:
+            self.buffer = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            footer = self.buffer[-GEOMETRY_CACHE_FOOTER.size:]
+            magic, version, table_byte_offset = GEOMETRY_CACHE_FOOTER.unpack(footer)
+            if magic != GEOMETRY_CACHE_MAGIC or version != GEOMETRY_CACHE_VERSION:
+                raise Exception('Unsupported geometry cache file: ' + path)
+            self.table = json.loads(self.buffer[table_byte_offset:-GEOMETRY_CACHE_FOOTER.size].decode('utf-8'))
+        except:
+            self.buffer.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        """ Unmap the cache file. Arrays that are still referenced keep the mapping alive, it is then unmapped
+            when they are freed.
+        """
+        try:
+            self.buffer.close()
+        except BufferError:
+            log.debug('Geometry cache entry still referenced, unmapped when its arrays are freed')
+
+    def get(self, object_index, mesh_key):
+        """ Return the cached mesh arrays of the mesh key.
+            Args:
+                object_index ('int') - The index of the Data3dObject in the deserialized objects.
+                mesh_key ('str') - The mesh key.
+            Returns:
+                meshes ('list(dict)') - The mesh arrays, None if the mesh is not cached.
+        """
+        key = str(object_index) + '/' + mesh_key
+        if key not in self.table:
+            return None
+        meshes = []
+        for entry in self.table[key]:
+            mesh = {k: v for k, v in entry.items() if k != 'arrays'}
+            for name, (dtype, shape, byte_offset) in entry['arrays'].items():
+                count = int(np.prod(shape))
+                mesh[name] = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=byte_offset).reshape(shape)
+            meshes.append(mesh)
+        return meshes
+
+
+class Data3dSpatialIndex(object):
+    """ Axis aligned bounding boxes of the meshes and nodes of the scene graph in data3d space, the node position
+        and rotRad are accumulated through the hierarchy. Nodes are bounded by their meshes and children, queries
+        skip the subtrees outside the region.
+        Attributes:
+            data3d_objects ('list(Data3dObject)') - The indexed data3d objects.
+            mesh_bounds ('list(dict)') - The local mesh bounds per object index: mesh key -> (lower, upper) or None.
+            world_mesh_bounds ('dict') - The data3d space mesh bounds: (object index, mesh key) -> (lower, upper).
+            node_bounds ('dict') - The data3d space bounds of the subtree: object index -> (lower, upper).
+    """
+
+    def __init__(self, data3d_objects, mesh_bounds=None):
+        """ Args:
+                data3d_objects ('list(Data3dObject)') - The deserialized data3d objects.
+            Kwargs:
+                mesh_bounds ('list(dict)') - Cached local mesh bounds, computed from the objects if None.
+        """
+        self.data3d_objects = data3d_objects
+        if mesh_bounds is None:
+            mesh_bounds = [{key: o.get_mesh_bounds(key) for key in o.mesh_references} for o in data3d_objects]
+        self.mesh_bounds = mesh_bounds
+        self.world_mesh_bounds = {}
+        self.node_bounds = {}
+
+        self._indices = {id(o): i for i, o in enumerate(data3d_objects)}
+        world_matrices = {}
+
+        def world_matrix(i):
+            if i not in world_matrices:
+                o = data3d_objects[i]
+                local = _transform_matrix(o.position, o.rotation)
+                world_matrices[i] = local if o.parent is None else world_matrix(self._indices[id(o.parent)]).dot(local)
+            return world_matrices[i]
+
+        for i, o in enumerate(data3d_objects):
+            for key, bounds in mesh_bounds[i].items():
+                if bounds is not None:
+                    self.world_mesh_bounds[(i, key)] = _transform_bounds(bounds[0], bounds[1], world_matrix(i))
+
+        def node_bounds(i):
+            bounds = [self.world_mesh_bounds[(i, key)] for key in mesh_bounds[i] if (i, key) in self.world_mesh_bounds]
+            bounds.extend(node_bounds(self._indices[id(child)]) for child in data3d_objects[i].children)
+            bounds = [b for b in bounds if b is not None]
+            self.node_bounds[i] = (np.min([b[0] for b in bounds], axis=0),
+                                   np.max([b[1] for b in bounds], axis=0)) if bounds else None
+            return self.node_bounds[i]
+
+        for i, o in enumerate(data3d_objects):
+            if o.parent is None:
+                node_bounds(i)
+
+    def _query(self, intersects):
+        """ Collect the meshes whose bounds intersect, the subtrees are pruned by their node bounds. """
+        hits = set()
+        stack = [i for i, o in enumerate(self.data3d_objects) if o.parent is None]
+        while stack:
+            i = stack.pop()
+            bounds = self.node_bounds[i]
+            if bounds is None or not intersects(*bounds):
+                continue
+            for key in self.mesh_bounds[i]:
+                if (i, key) in self.world_mesh_bounds and intersects(*self.world_mesh_bounds[(i, key)]):
+                    hits.add((i, key))
+            stack.extend(self._indices[id(child)] for child in self.data3d_objects[i].children)
+        return hits
+
+    def query_box(self, box_min, box_max):
+        """ Return the meshes intersecting the box.
+            Args:
+                box_min ('list(float)') - The lower corner of the box.
+                box_max ('list(float)') - The upper corner of the box.
+            Returns:
+                _ ('set(tuple)') - The (object index, mesh key) pairs.
+        """
+        box_min, box_max = np.asarray(box_min), np.asarray(box_max)
+        return self._query(lambda lower, upper: bool(np.all(lower <= box_max) and np.all(upper >= box_min)))
+
+    def query_sphere(self, center, radius):
+        """ Return the meshes intersecting the sphere.
+            Args:
+                center ('list(float)') - The center of the sphere.
+                radius ('float') - The radius of the sphere.
+            Returns:
+                _ ('set(tuple)') - The (object index, mesh key) pairs.
+        """
+        center = np.asarray(center)
+        return self._query(lambda lower, upper: float(np.sum((np.clip(center, lower, upper) - center) ** 2)) <= radius ** 2)
+
+
+class MemoryTracker(object):
+    """ Memory accounting per import/export stage: python allocations (tracemalloc), the process memory and the top
+        allocation sites of the addon modules. Stages can be nested and entered repeatedly (e.g. once per mesh), the
+        figures of repeated stages are accumulated. A disabled tracker does nothing.
+        Attributes:
+            enabled ('bool') - Track the stages.
+            top_n ('int') - The number of allocation sites reported per stage.
+            stages ('OrderedDict') - The figures per stage name, in order of first completion.
+    """
+
+    def __init__(self, enabled=True, top_n=MEMORY_TOP_ALLOCATIONS):
+        self.enabled = enabled
+        self.top_n = top_n
+        self.stages = OrderedDict()
+        self._stack = []
+        self._owns_tracing = False
+        # Report the allocations of the decoder, importer and exporter only
+        self._filters = [tracemalloc.Filter(True, os.path.join(os.path.dirname(os.path.abspath(__file__)), '*'))]
+
+    def start(self):
+        """ Start tracing the python allocations, if not already traced. """
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+
+    def stop(self):
+        """ Stop tracing the python allocations, if the tracker started the tracing. """
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    @contextmanager
+    def stage(self, name, snapshot=True):
+        """ Track the memory of the enclosed stage.
+            Args:
+                name ('str') - The stage name.
+            Kwargs:
+                snapshot ('bool') - Report the top allocation sites of the stage, disable for stages entered per mesh.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        self.start()
+        self._update_peaks()
+        current, _ = tracemalloc.get_traced_memory()
+        entry = {
+            'current': current,
+            'peak': current,
+            'time': time.perf_counter(),
+            'snapshot': tracemalloc.take_snapshot().filter_traces(self._filters) if snapshot else None
+        }
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            self._update_peaks()
+            self._stack.pop()
+            current, _ = tracemalloc.get_traced_memory()
+            stats = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'allocated': 0, 'peak': 0})
+            stats['calls'] += 1
+            stats['seconds'] += time.perf_counter() - entry['time']
+            stats['allocated'] += current - entry['current']
+            stats['peak'] = max(stats['peak'], entry['peak'] - entry['current'])
+            stats['current'] = current
+            stats['rss'] = get_rss()
+            stats['peakRss'] = get_peak_rss()
+            if entry['snapshot'] is not None:
+                stats['topAllocations'] = self._get_top_allocations(entry['snapshot'])
+
+    def _update_peaks(self):
+        """ Fold the traced peak into the running stages and restart the peak measurement. """
+        _, peak = tracemalloc.get_traced_memory()
+        for entry in self._stack:
+            entry['peak'] = max(entry['peak'], peak)
+        # Python < 3.9: the peak is not reset, the stage peaks are an upper bound
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def _get_top_allocations(self, start_snapshot):
+        """ Return the sites with the largest allocation growth since the start snapshot.
+            Args:
+                start_snapshot ('tracemalloc.Snapshot') - The filtered snapshot of the stage start.
+            Returns:
+                _ ('list(dict)') - The file, line, size (bytes) and count of the allocations.
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces(self._filters)
+        top_allocations = []
+        for stat in snapshot.compare_to(start_snapshot, 'lineno')[:self.top_n]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            top_allocations.append({'file': os.path.basename(frame.filename), 'line': frame.lineno,
+                                    'size': stat.size_diff, 'count': stat.count_diff})
+        return top_allocations
+
+    def get_report(self):
+        """ Return the memory report.
+            Returns:
+                _ ('dict') - The stages with calls, seconds, allocated (net python bytes), peak (python bytes above the
+                             stage start), current (python bytes), rss, peakRss (bytes) and the top allocations.
+        """
+        return {
+            'peakIsUpperBound': not hasattr(tracemalloc, 'reset_peak'),
+            'stages': [dict(stats, name=name) for name, stats in self.stages.items()]
+        }
+
+    def log_report(self):
+        """ Log the memory report. """
+        if not self.stages:
+            return
+
+        def mb(value):
+            return '%.1f MB' % (value / 1048576) if value is not None else 'n/a'
+
+        lines = []
+        for name, stats in self.stages.items():
+            lines.append('{}: {} calls, {:.2f} s, allocated {}, peak {}, rss {}, peak rss {}'.format(
+                name, stats['calls'], stats['seconds'], mb(stats['allocated']), mb(stats['peak']), mb(stats['rss']),
+                mb(stats['peakRss'])))
+            for site in stats.get('topAllocations', []):
+                lines.append('    {}:{}: {:.1f} KB in {} blocks'.format(site['file'], site['line'], site['size'] / 1024,
+                                                                         site['count']))
+        log.info('Memory report\n%s', '\n'.join(lines))
+
+    def write_report(self, output_path):
+        """ Write the memory report as json.
+            Args:
+                output_path ('str') - The report file path.
+        """
+        with open(output_path, 'w', encoding='utf-8') as file:
+            json.dump(self.get_report(), file, indent=2)
+        log.info('Memory report written to %s', output_path)
+
+    @staticmethod
+    def get_report_path(input_path, report_path=''):
+        """ Return the report path, named after the input file in the temp directory by default.
+            Args:
+                input_path ('str') - The imported or exported file.
+            Kwargs:
+                report_path ('str') - The report path, if set.
+            Returns:
+                _ ('str') - The report path.
+        """
+        return report_path or os.path.join(tempfile.gettempdir(), os.path.basename(input_path) + '.memory.json')
+
+
+def get_rss():
+    """ Return the current resident set size of the process.
+        Returns:
+            _ ('int') - The resident memory in bytes, None if the platform does not report it.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * mmap.PAGESIZE
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def get_peak_rss():
+    """ Return the peak resident set size of the process.
+        Returns:
+            _ ('int') - The peak resident memory in bytes, None if the platform does not report it.
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on linux, bytes on macOS
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
 
 
 # Temp debugging
@@ -347,20 +1009,24 @@ def _dump_json_to_file(j, output_path):
 
 
 # Helper
-def _get_data3d_objects_recursive(root, parent=None, file_buffer=None, payload_byte_offset=0):
+def _get_data3d_objects_recursive(root, parent=None, file_buffer=None, payload_byte_offset=0, buffer_version=VERSION):
     """ Go trough the json hierarchy recursively and get all the children.
         Args:
             root ('dict') - The root object to be parsed.
         Kwargs:
             parent ('Data3dObject') - The parent object of the root object.
+            buffer_version ('int') - The header version of the file buffer.
     """
     recursive_data = []
     children = root[D3D.o_children] if D3D.o_children in root else []
     if children is not []:
         for child in children:
-            data3d_object = Data3dObject(child, parent, file_buffer=file_buffer, payload_byte_offset=payload_byte_offset)
+            data3d_object = Data3dObject(child, parent, file_buffer=file_buffer, payload_byte_offset=payload_byte_offset,
+                                         buffer_version=buffer_version)
             recursive_data.append(data3d_object)
-            recursive_data.extend(_get_data3d_objects_recursive(child, data3d_object, file_buffer=file_buffer, payload_byte_offset=payload_byte_offset))
+            recursive_data.extend(_get_data3d_objects_recursive(child, data3d_object, file_buffer=file_buffer,
+                                                                payload_byte_offset=payload_byte_offset,
+                                                                buffer_version=buffer_version))
     return recursive_data
 
 
@@ -397,6 +1063,773 @@ def binary_pack(t, a):
     return struct.pack(t*len(a), *a)
 
 
+def _quantize(values, size, data_type='int16'):
+    """ Quantize the values to integers against their per component bounding box.
+        Args:
+            values ('list(float)') - The flat list of values.
+            size ('int') - The number of components per element.
+        Kwargs:
+            data_type ('str') - The integer type of the quantized values.
+        Returns:
+            quantized ('numpy.ndarray') - The flat array of quantized values.
+            encoding ('dict') - The decode parameters, value = quantized * scale + offset.
+    """
+    elements = np.asarray(values, dtype=np.float64).reshape(-1, size)
+    max_int = np.iinfo(BUFFER_DTYPES[data_type]).max
+    if len(elements):
+        lower, upper = elements.min(axis=0), elements.max(axis=0)
+    else:
+        lower = upper = np.zeros(size)
+
+    offset = (lower + upper) / 2
+    scale = (upper - lower) / (2 * max_int)
+    divisor = np.where(scale > 0, scale, 1.0)
+    quantized = np.clip(np.rint((elements - offset) / divisor), -max_int, max_int).astype(BUFFER_DTYPES[data_type])
+
+    encoding = {D3D.e_type: data_type, D3D.e_offset: offset.tolist(), D3D.e_scale: scale.tolist()}
+    return quantized.ravel(), encoding
+
+
+def _octahedral_encode(values, data_type='int16'):
+    """ Encode unit vectors with the octahedral mapping to two quantized components.
+        Args:
+            values ('list(float)') - The flat list of normals [nx, ny, nz, ...].
+        Kwargs:
+            data_type ('str') - The integer type of the encoded components.
+        Returns:
+            encoded ('numpy.ndarray') - The flat array of encoded values [ex, ey, ...].
+            encoding ('dict') - The decode parameters.
+    """
+    normals = np.asarray(values, dtype=np.float64).reshape(-1, 3)
+    l1_norm = np.abs(normals).sum(axis=1, keepdims=True)
+    normals = normals / np.where(l1_norm > 0, l1_norm, 1.0)
+    x, y, z = normals[:, 0], normals[:, 1], normals[:, 2]
+
+    # Fold the lower hemisphere over the diagonals
+    lower = z < 0
+    oct_x = np.where(lower, (1 - np.abs(y)) * np.where(x >= 0, 1.0, -1.0), x)
+    oct_y = np.where(lower, (1 - np.abs(x)) * np.where(y >= 0, 1.0, -1.0), y)
+
+    max_int = np.iinfo(BUFFER_DTYPES[data_type]).max
+    encoded = np.rint(np.clip(np.stack([oct_x, oct_y], axis=1), -1, 1) * max_int).astype(BUFFER_DTYPES[data_type])
+
+    encoding = {D3D.e_type: data_type, D3D.e_mapping: D3D.e_octahedral}
+    return encoded.ravel(), encoding
+
+
+def _octahedral_decode(encoded):
+    """ Decode octahedral encoded unit vectors.
+        Args:
+            encoded ('numpy.ndarray') - The flat array of encoded integer values.
+        Returns:
+            _ ('numpy.ndarray') - The flat float32 array of unit vectors.
+    """
+    max_int = np.iinfo(encoded.dtype).max
+    oct_xy = encoded.astype(np.float64).reshape(-1, 2) / max_int
+    x, y = oct_xy[:, 0], oct_xy[:, 1]
+    z = 1 - np.abs(x) - np.abs(y)
+
+    # Unfold the lower hemisphere
+    t = np.clip(-z, 0, None)
+    x = x - np.where(x >= 0, t, -t)
+    y = y - np.where(y >= 0, t, -t)
+
+    normals = np.stack([x, y, z], axis=1)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals /= np.where(length > 0, length, 1.0)
+    return normals.astype(np.float32).ravel()
+
+
+def _payload_byte_offset(offset, version):
+    """ Return the byte offset of the attribute in the payload, version 1 offsets count floats.
+        Args:
+            offset ('int') - The attribute offset.
+            version ('int') - The buffer version.
+        Returns:
+            _ ('int') - The byte offset.
+    """
+    return offset * 4 if version == VERSION else offset
+
+
+def _decode_attribute(buffer, byte_offset, length, encoding=None):
+    """ Decode an attribute of the version 2 or 3 payload.
+        Args:
+            buffer ('bytearray', 'mmap.mmap', 'ChunkedBuffer') - The file buffer.
+            byte_offset ('int') - The byte offset of the attribute in the file buffer.
+            length ('int') - The number of encoded values.
+        Kwargs:
+            encoding ('dict') - The decode parameters, float32 values if None.
+        Returns:
+            _ ('numpy.ndarray') - The flat float32 array of decoded values.
+    """
+    if encoding is None:
+        encoding = {D3D.e_type: 'float32'}
+    dtype = np.dtype(BUFFER_DTYPES[encoding[D3D.e_type]])
+    if isinstance(buffer, ChunkedBuffer):
+        # Only the blocks overlapping the attribute are decompressed
+        buffer, byte_offset = buffer[byte_offset:byte_offset + length * dtype.itemsize], 0
+    data = np.frombuffer(buffer, dtype=dtype, count=length, offset=byte_offset)
+
+    if encoding.get(D3D.e_mapping) == D3D.e_octahedral:
+        return _octahedral_decode(data)
+    if D3D.e_scale in encoding:
+        size = len(encoding[D3D.e_scale])
+        decoded = data.reshape(-1, size) * np.asarray(encoding[D3D.e_scale]) + np.asarray(encoding[D3D.e_offset])
+        return decoded.astype(np.float32).ravel()
+    # A view of the buffer if the values are stored as float32
+    return data.astype(np.float32, copy=False)
+
+
+def _transform_matrix(position, rotation, scale=(1, 1, 1)):
+    """ Create the 4x4 transformation matrix of position, XYZ euler rotation and scale (blender convention).
+        Args:
+            position ('list(float)') - The translation.
+            rotation ('list(float)') - The XYZ euler angles in radians.
+        Kwargs:
+            scale ('list(float)') - The scale.
+        Returns:
+            matrix ('numpy.ndarray') - The matrix position * rotation * scale.
+    """
+    (cx, cy, cz), (sx, sy, sz) = np.cos(rotation), np.sin(rotation)
+    rot_x = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    rot_y = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rot_z = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    matrix = np.identity(4)
+    matrix[:3, :3] = rot_z.dot(rot_y).dot(rot_x) * np.asarray(scale, dtype=np.float64)
+    matrix[:3, 3] = position
+    return matrix
+
+
+def _transform_bounds(lower, upper, matrix):
+    """ Transform the axis aligned bounding box and return the bounds of the transformed corners.
+        Args:
+            lower ('numpy.ndarray') - The lower corner.
+            upper ('numpy.ndarray') - The upper corner.
+            matrix ('numpy.ndarray') - The 4x4 transformation matrix.
+        Returns:
+            _ ('tuple(numpy.ndarray)') - The transformed lower and upper corner.
+    """
+    corners = np.array([[x, y, z] for x in (lower[0], upper[0]) for y in (lower[1], upper[1]) for z in (lower[2], upper[2])])
+    corners = corners.dot(matrix[:3, :3].T) + matrix[:3, 3]
+    return corners.min(axis=0), corners.max(axis=0)
+
+
+def _filter_data3d_objects(data3d_objects, input_path, region_box=None, region_sphere=None):
+    """ Drop the mesh references outside the region, the meshes are never decoded. The local mesh bounds are
+        cached per file for the next filtered import.
+        Args:
+            data3d_objects ('list(Data3dObject)') - The deserialized data3d objects.
+            input_path ('str') - The path to the data3d file, the cache key.
+        Kwargs:
+            region_box ('tuple') - The lower and upper corner of the box in data3d space.
+            region_sphere ('tuple') - The center and radius of the sphere in data3d space.
+    """
+    stat = os.stat(input_path)
+    cache_key = (os.path.abspath(input_path), stat.st_size, stat.st_mtime)
+    mesh_bounds = _bounds_cache.pop(cache_key, None)
+    index = Data3dSpatialIndex(data3d_objects, mesh_bounds)
+    _bounds_cache[cache_key] = index.mesh_bounds
+    while len(_bounds_cache) > BOUNDS_CACHE_SIZE:
+        _bounds_cache.popitem(last=False)
+
+    hits = index.query_box(*region_box) if region_box is not None else index.query_sphere(*region_sphere)
+    skipped = 0
+    for i, data3d_object in enumerate(data3d_objects):
+        for key in list(data3d_object.mesh_references):
+            if (i, key) not in hits:
+                del data3d_object.mesh_references[key]
+                skipped += 1
+    log.info('Region filter: %d meshes imported, %d skipped (bounds cached: %s)', len(hits), skipped,
+             mesh_bounds is not None)
+
+
+def _as_row_keys(values):
+    """ View the rows of a 2d array as single void values, rows with equal bytes have equal keys.
+        Args:
+            values ('numpy.ndarray') - The 2d array.
+        Returns:
+            _ ('numpy.ndarray') - The 1d array of row keys.
+    """
+    values = np.ascontiguousarray(values)
+    return values.view(np.dtype((np.void, values.dtype.itemsize * values.shape[1]))).ravel()
+
+
+def _distinct_rows(values):
+    """ Remove the duplicate rows (equal values) in the order of their first occurrence.
+        Args:
+            values ('numpy.ndarray') - The (n, size) float32 values.
+        Returns:
+            distinct ('numpy.ndarray') - The distinct rows.
+            indices ('numpy.ndarray') - The int32 index of the distinct row of each input row.
+    """
+    # Adding 0 turns -0.0 into 0.0, which compare equal, and copies views of the file buffer
+    values = np.asarray(values, dtype=np.float32) + np.float32(0.0)
+    if len(values) == 0:
+        return values, np.empty(0, dtype=np.int32)
+    _, first, inverse = np.unique(_as_row_keys(values), return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+    return values[first[order]], rank[inverse.ravel()]
+
+
+def _mesh_data_to_arrays(mesh_data):
+    """ Convert the raw vertex attributes of _get_data3d_mesh_nodes to distinct vertex arrays and face indices.
+        Args:
+            mesh_data ('dict') - The mesh metadata and the raw float32 attributes, three vertices per face.
+        Returns:
+            mesh_arrays ('dict') - The name, material, position, rotation and scale, the float32 verts_loc, verts_nor
+                                   (n, 3) and verts_uvs, verts_uvs2 (n, 2) and the int32 faces_loc, faces_nor,
+                                   faces_uvs, faces_uvs2 (faces, 3) indices.
+    """
+    mesh_arrays = {key: mesh_data[key] for key in ['name', 'material', 'position', 'rotation', 'scale'] if key in mesh_data}
+    for verts_key, faces_key in [('verts_loc', 'faces_loc'), ('verts_nor', 'faces_nor'), ('verts_uvs', 'faces_uvs'),
+                                 ('verts_uvs2', 'faces_uvs2')]:
+        if verts_key + '_raw' in mesh_data:
+            mesh_arrays[verts_key], indices = _distinct_rows(mesh_data[verts_key + '_raw'])
+            mesh_arrays[faces_key] = indices.reshape(-1, 3)
+    return mesh_arrays
+
+
+def _weld_grid_cells(verts_loc, threshold):
+    """ Sort the vertices into eight grids with a cell size of twice the threshold, offset by 0 or the threshold
+        along each axis. Two vertices closer than the threshold share a cell in at least one of the grids.
+        Args:
+            verts_loc ('numpy.ndarray') - The (n, 3) vertex positions as float64.
+            threshold ('float') - The merge distance.
+        Returns:
+            _ ('list(tuple)') - The cell index of every vertex and the cell count per grid.
+    """
+    cells = np.floor(verts_loc / threshold).astype(np.int64)
+    cells -= cells.min(axis=0)
+    extents = [int(extent) // 2 + 1 for extent in cells.max(axis=0) + 1]
+    grids = []
+    for shift in itertools.product((0, 1), repeat=3):
+        grid_cells = (cells + shift) // 2
+        if extents[0] * extents[1] * extents[2] < 2 ** 62:
+            keys = (grid_cells[:, 0] * extents[1] + grid_cells[:, 1]) * extents[2] + grid_cells[:, 2]
+        else:
+            keys = _as_row_keys(grid_cells)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        grids.append((inverse.ravel(), len(unique_keys)))
+    return grids
+
+
+def _weld_vertices(verts_loc, threshold, max_rounds=WELD_ROUNDS):
+    """ Merge the vertices closer than the threshold. The vertices get a fixed pseudo random priority, each round
+        keeps the unresolved vertices with the lowest priority of all their grid cells and merges the unresolved
+        vertices within the threshold into the lowest of them. Kept vertices never share a cell, so they are more
+        than the threshold apart, merges do not chain and the kept position is at most the threshold away from the
+        merged ones. The random priority keeps the number of rounds low whatever the vertex order, coincident
+        vertices are resolved in the first round and vertices still unresolved after the last round are kept.
+        Args:
+            verts_loc ('numpy.ndarray') - The (n, 3) vertex positions.
+            threshold ('float') - The merge distance.
+        Kwargs:
+            max_rounds ('int') - The maximum number of rounds.
+        Returns:
+            welded ('numpy.ndarray') - The indices of the kept vertices.
+            remap ('numpy.ndarray') - The new index of every vertex.
+    """
+    vertex_count = len(verts_loc)
+    verts_loc = verts_loc.astype(np.float64)
+    grids = _weld_grid_cells(verts_loc, threshold)
+    max_distance = threshold * threshold
+    by_priority = np.random.RandomState(0).permutation(vertex_count)
+    priority = np.empty(vertex_count, dtype=np.int64)
+    priority[by_priority] = np.arange(vertex_count)
+
+    def cell_lowest(inverse, cell_count, vertices):
+        """ The lowest priority of the vertices per grid cell, the vertex count for empty cells. """
+        lowest = np.full(cell_count, vertex_count, dtype=np.int64)
+        np.minimum.at(lowest, inverse[vertices], priority[vertices])
+        return lowest
+
+    representative = np.arange(vertex_count, dtype=np.int64)
+    unresolved = representative.copy()
+    for _ in range(max_rounds):
+        is_lowest = np.ones(len(unresolved), dtype=bool)
+        for inverse, cell_count in grids:
+            is_lowest &= cell_lowest(inverse, cell_count, unresolved)[inverse[unresolved]] == priority[unresolved]
+        kept = unresolved[is_lowest]
+
+        target = np.full(len(unresolved), vertex_count, dtype=np.int64)
+        for inverse, cell_count in grids:
+            lower = cell_lowest(inverse, cell_count, kept)[inverse[unresolved]]
+            found = np.nonzero(lower < target)[0]
+            offsets = verts_loc[unresolved[found]] - verts_loc[by_priority[lower[found]]]
+            close = found[np.einsum('ij,ij->i', offsets, offsets) <= max_distance]
+            target[close] = lower[close]
+        merged = target < vertex_count
+        representative[unresolved[merged]] = by_priority[target[merged]]
+        unresolved = unresolved[~merged]
+        if len(unresolved) == 0:
+            break
+
+    kept = representative == np.arange(vertex_count)
+    new_index = np.cumsum(kept, dtype=np.int32) - 1
+    return np.nonzero(kept)[0], new_index[representative]
+
+
+def _weld_mesh_arrays(mesh_arrays, threshold=WELD_THRESHOLD):
+    """ Merge the vertices closer than the threshold and remap the face indices, collapsed faces are left to
+        _clean_mesh_arrays. Normals and uvs are per face corner and are kept.
+        Args:
+            mesh_arrays ('dict') - The mesh arrays of _mesh_data_to_arrays.
+        Kwargs:
+            threshold ('float') - The merge distance, 0 disables the weld.
+        Returns:
+            mesh_arrays ('dict') - The welded mesh arrays.
+            merged ('int') - The number of merged vertices.
+    """
+    verts_loc = mesh_arrays['verts_loc']
+    vertex_count = len(verts_loc)
+    if vertex_count < 2 or threshold <= 0:
+        return mesh_arrays, 0
+
+    welded, remap = _weld_vertices(verts_loc, threshold)
+    merged = vertex_count - len(welded)
+    if not merged:
+        return mesh_arrays, 0
+
+    return dict(mesh_arrays, verts_loc=verts_loc[welded], faces_loc=remap[mesh_arrays['faces_loc']]), merged
+
+
+def _clean_mesh_arrays(mesh_arrays, min_area=DEGENERATE_AREA):
+    """ Drop the triangles that do not span an area and compact the vertices, normals and uvs no face references.
+        Args:
+            mesh_arrays ('dict') - The mesh arrays of _mesh_data_to_arrays.
+        Kwargs:
+            min_area ('float') - Triangles with this area or less are dropped.
+        Returns:
+            mesh_arrays ('dict') - The cleaned mesh arrays.
+            faces_removed ('int') - The number of dropped faces.
+            verts_removed ('int') - The number of dropped vertices.
+    """
+    attribute_keys = [('verts_loc', 'faces_loc'), ('verts_nor', 'faces_nor'), ('verts_uvs', 'faces_uvs'),
+                      ('verts_uvs2', 'faces_uvs2')]
+    verts_loc = mesh_arrays['verts_loc'].astype(np.float64)
+    faces_loc = mesh_arrays['faces_loc']
+    corners = verts_loc[faces_loc]
+    areas = 0.5 * np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+    keep = areas > min_area
+    faces_removed = int(len(keep) - np.count_nonzero(keep))
+
+    cleaned = dict(mesh_arrays)
+    if faces_removed:
+        for _, faces_key in attribute_keys:
+            if faces_key in cleaned:
+                cleaned[faces_key] = cleaned[faces_key][keep]
+
+    verts_removed = 0
+    for verts_key, faces_key in attribute_keys:
+        if verts_key not in cleaned:
+            continue
+        used = np.zeros(len(cleaned[verts_key]), dtype=bool)
+        used[cleaned[faces_key].ravel()] = True
+        if np.all(used):
+            continue
+        new_indices = (np.cumsum(used) - 1).astype(np.int32)
+        cleaned[verts_key] = cleaned[verts_key][used]
+        cleaned[faces_key] = new_indices[cleaned[faces_key]]
+        if verts_key == 'verts_loc':
+            verts_removed = int(len(used) - np.count_nonzero(used))
+
+    if not faces_removed and not any(verts_key in cleaned and cleaned[verts_key] is not mesh_arrays[verts_key]
+                                     for verts_key, _ in attribute_keys):
+        return mesh_arrays, 0, 0
+    return cleaned, faces_removed, verts_removed
+
+
+def get_normal_matrix(linear):
+    """ Create the matrix transforming the normals of the linear transformation: the cofactor matrix, which is the
+        inverse transpose scaled by the determinant and stays defined for a zero scale axis. The sign of the
+        determinant is removed, so mirroring matrices transform the normals like the inverse transpose.
+        Args:
+            linear ('numpy.ndarray') - The 3x3 linear part of the transformation.
+        Returns:
+            _ ('numpy.ndarray') - The 3x3 normal matrix, normals have to be normalized after the transformation.
+    """
+    linear = np.asarray(linear, dtype=np.float64)
+    cofactor = np.array([np.cross(linear[1], linear[2]), np.cross(linear[2], linear[0]),
+                         np.cross(linear[0], linear[1])])
+    return -cofactor if np.linalg.det(linear) < 0 else cofactor
+
+
+def transform_mesh_arrays(mesh_arrays, node_matrix=None):
+    """ Bake the mesh transform and the node matrix into the vertices and normals of the mesh arrays.
+        Args:
+            mesh_arrays ('dict') - The mesh arrays of get_mesh_arrays, not modified.
+        Kwargs:
+            node_matrix ('numpy.ndarray') - The 4x4 matrix of the node (and global orientation), applied after the
+                                            position, rotation and scale of the mesh.
+        Returns:
+            _ ('dict') - The mesh arrays with the transformed vertices and normals and an identity transform.
+    """
+    matrix = _transform_matrix(mesh_arrays['position'], mesh_arrays['rotation'], mesh_arrays['scale'])
+    if node_matrix is not None:
+        matrix = np.asarray(node_matrix, dtype=np.float64).dot(matrix)
+    if np.allclose(matrix, np.identity(4)):
+        return mesh_arrays
+
+    transformed = dict(mesh_arrays, position=[0, 0, 0], rotation=[0, 0, 0], scale=[1, 1, 1])
+    linear = matrix[:3, :3]
+    transformed['verts_loc'] = (mesh_arrays['verts_loc'].dot(linear.T) + matrix[:3, 3]).astype(np.float32)
+
+    # Normals transform with the inverse transpose, non-uniform scale changes their direction
+    determinant = np.linalg.det(linear)
+    normals = mesh_arrays['verts_nor'].dot(get_normal_matrix(linear).T)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    transformed['verts_nor'] = normals.astype(np.float32)
+
+    if determinant < 0:
+        # Mirrored: flip the winding to keep the faces pointing along their normals
+        for faces_key in ('faces_loc', 'faces_nor', 'faces_uvs', 'faces_uvs2'):
+            if faces_key in mesh_arrays:
+                transformed[faces_key] = np.ascontiguousarray(mesh_arrays[faces_key][:, ::-1])
+    return transformed
+
+
+def _copy_structure(o):
+    """ Copy the nested dictionaries and lists of the data3d dictionary, numeric arrays are shared.
+        Args:
+            o ('any') - The python (sub)element to copy.
+        Returns:
+            _ ('any') - The copied element.
+    """
+    if isinstance(o, dict):
+        return o.__class__((k, _copy_structure(v)) for k, v in o.items())
+    elif isinstance(o, list):
+        return [_copy_structure(e) for e in o]
+    return o
+
+
+def _compress_block(block, codec=CODEC_GZIP, level=None):
+    """ Compress a block of data into an independent stream of the codec. Concatenated streams are read back in
+        order by _DecompressingReader, concatenated gzip members and xz streams also form valid files for the
+        standard tools.
+        Args:
+            block ('bytes') - The data to compress.
+        Kwargs:
+            codec ('str') - The compression codec. Enum {'none', 'gzip', 'zlib', 'xz'}
+            level ('int') - The compression level (xz preset) 0-9, the codec default if None or negative.
+        Returns:
+            _ ('bytes') - The compressed stream.
+    """
+    if codec == CODEC_NONE:
+        return bytes(block)
+    if codec not in CODEC_LEVELS:
+        raise Exception('Unknown compression codec: ' + str(codec) + ' Supported: ' + str(COMPRESSION_CODECS))
+    level = CODEC_LEVELS[codec] if level is None or level < 0 else level
+    if codec == CODEC_XZ:
+        return lzma.compress(block, format=lzma.FORMAT_XZ, preset=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31 if codec == CODEC_GZIP else 15)
+    return compressor.compress(block) + compressor.flush()
+
+
+def _get_decompressor(codec):
+    """ Create the decompressor of one stream of the codec.
+        Args:
+            codec ('str') - The compression codec. Enum {'gzip', 'zlib', 'xz'}
+        Returns:
+            _ ('zlib.Decompress', 'lzma.LZMADecompressor') - The decompressor.
+    """
+    if codec == CODEC_GZIP:
+        return zlib.decompressobj(31)
+    elif codec == CODEC_ZLIB:
+        return zlib.decompressobj(15)
+    elif codec == CODEC_XZ:
+        return lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+    raise Exception('Unknown compression codec: ' + str(codec) + ' Supported: ' + str(COMPRESSION_CODECS))
+
+
+def _detect_codec(head):
+    """ Detect the compression codec from the leading magic bytes of the file.
+        Args:
+            head ('bytes') - The first (6) bytes of the file.
+        Returns:
+            _ ('str') - The compression codec, CODEC_NONE for uncompressed (or unknown) files.
+    """
+    head = bytes(head[:6])
+    if head.startswith(bytes(MAGIC_NUMBER, 'ascii')):
+        return CODEC_NONE
+    elif head.startswith(b'\x1f\x8b'):
+        return CODEC_GZIP
+    elif head.startswith(b'\xfd7zXZ\x00'):
+        return CODEC_XZ
+    elif len(head) >= 2 and head[0] & 0x0f == 8 and head[0] >> 4 <= 7 and ((head[0] << 8) | head[1]) % 31 == 0:
+        # Deflate with a window of at most 32k and a valid header checksum
+        return CODEC_ZLIB
+    return CODEC_NONE
+
+
+def _get_codec_from_path(output_path):
+    """ Get the compression codec from the suffixes of the output file name, e.g. model.xz.data3d.buffer
+        Args:
+            output_path ('str') - The path to the output file.
+        Returns:
+            _ ('str') - The compression codec, CODEC_NONE if the name has no codec suffix.
+    """
+    suffixes = os.path.basename(output_path).split('.')[1:]
+    for codec, suffix in CODEC_SUFFIXES.items():
+        if suffix in suffixes:
+            return codec
+    return CODEC_NONE
+
+
+def _decompress_stream(data, codec):
+    """ Decompress one complete stream of the codec.
+        Args:
+            data ('bytes') - The compressed stream.
+            codec ('str') - The compression codec. Enum {'gzip', 'zlib', 'xz'}
+        Returns:
+            _ ('bytes') - The decompressed data.
+    """
+    decompressor = _get_decompressor(codec)
+    data = decompressor.decompress(data)
+    if not decompressor.eof:
+        raise Exception('Can not parse data3d buffer. Truncated ' + codec + ' stream.')
+    return data
+
+
+def _write_chunked_buffer(output_path, head, payload, codec=CODEC_GZIP, level=None, pool=None,
+                          block_size=CHUNKED_BLOCK_SIZE):
+    """ Write the seekable data3d.buffer container: the payload is split into blocks that are compressed
+        independently, the block index after the compressed header & structure locates the compressed blocks.
+        Args:
+            output_path ('str') - The path to the output file.
+            head ('bytes') - The data3d.buffer header and structure.
+            payload ('bytes') - The payload.
+        Kwargs:
+            codec ('str') - The compression codec. Enum {'gzip', 'zlib', 'xz'}
+            level ('int') - The compression level (xz preset) 0-9, the codec default if None.
+            pool ('concurrent.futures.Executor') - Compress the blocks on this pool.
+            block_size ('int') - The uncompressed byte size of the payload blocks.
+    """
+    if codec not in CODEC_LEVELS:
+        raise Exception('Can not serialize data3d buffer. The seekable container requires compression: ' + str(codec))
+
+    def compress(block):
+        return _compress_block(block, codec, level)
+
+    payload_view = memoryview(payload)
+    blocks = [payload_view[x:x+block_size] for x in range(0, len(payload), block_size)]
+    head_stream = compress(head)
+    offsets = np.zeros(len(blocks) + 1, dtype='<u8')
+    with open(output_path, 'wb') as buffer_file:
+        buffer_file.write(CHUNKED_HEADER.pack(CHUNKED_MAGIC, codec.encode('ascii').ljust(4, b'\0'), block_size,
+                                              len(blocks), len(head_stream), len(payload)))
+        buffer_file.write(head_stream)
+        index_offset = buffer_file.tell()
+        # The index is written once the compressed block sizes are known
+        buffer_file.write(offsets.tobytes())
+        for i, stream in enumerate(pool.map(compress, blocks) if pool else map(compress, blocks)):
+            buffer_file.write(stream)
+            offsets[i + 1] = offsets[i] + len(stream)
+        buffer_file.seek(index_offset)
+        buffer_file.write(offsets.tobytes())
+
+
+class ChunkedBuffer(object):
+    """ Random access to the seekable data3d.buffer container. Slicing returns the bytes of the uncompressed
+        data3d.buffer, like a file buffer: the header and structure are decompressed on open, the payload blocks
+        overlapping a range are decompressed on access and the last few are cached. Also reads like a file.
+        Attributes:
+            path ('str') - The container file path.
+            codec ('str') - The compression codec of the blocks.
+            block_size ('int') - The uncompressed byte size of the payload blocks.
+            head ('bytes') - The data3d.buffer header and structure.
+            payload_length ('int') - The uncompressed payload byte length.
+            offsets ('numpy.ndarray') - The offsets of the compressed blocks, relative to the first block.
+            blocks_read ('int') - The number of decompressed blocks.
+    """
+
+    def __init__(self, path, cache_blocks=CHUNKED_CACHE_BLOCKS):
+        """ Args:
+                path ('str') - The container file path.
+            Kwargs:
+                cache_blocks ('int') - The number of decompressed blocks kept in memory.
+        """
+        self.path = path
+        self.cache_blocks = cache_blocks
+        self._file = open(path, 'rb')
+        try:
+            header = self._file.read(CHUNKED_HEADER.size)
+            if len(header) != CHUNKED_HEADER.size or not header.startswith(CHUNKED_MAGIC):
+                raise Exception('Can not parse data3d buffer. Not a seekable container: ' + path)
+            _, codec, self.block_size, block_count, head_length, self.payload_length = CHUNKED_HEADER.unpack(header)
+            self.codec = codec.rstrip(b'\0').decode('ascii')
+            self.head = _decompress_stream(self._file.read(head_length), self.codec)
+            index = self._file.read((block_count + 1) * 8)
+            if len(index) != (block_count + 1) * 8:
+                raise Exception('Can not parse data3d buffer. Incomplete block index: ' + path)
+            self.offsets = np.frombuffer(index, dtype='<u8').astype(np.int64)
+            self._blocks_offset = self._file.tell()
+        except:
+            self._file.close()
+            raise
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self._position = 0
+        self.blocks_read = 0
+
+    def __len__(self):
+        return len(self.head) + self.payload_length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def __getitem__(self, key):
+        """ Get the uncompressed bytes of the range, only the overlapping payload blocks are decompressed.
+            Args:
+                key ('slice', 'int') - The byte range or the index of a single byte.
+            Returns:
+                _ ('bytes', 'int') - The uncompressed bytes, the byte value for an index.
+        """
+        if not isinstance(key, slice):
+            index = key + len(self) if key < 0 else key
+            if not 0 <= index < len(self):
+                raise IndexError('data3d buffer index out of range: ' + str(key))
+            return self[index:index + 1][0]
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            raise Exception('Can not slice data3d buffer with a step: ' + str(step))
+        head_length = len(self.head)
+        parts = [self.head[start:min(stop, head_length)]] if start < head_length else []
+        payload_start, payload_stop = max(start - head_length, 0), stop - head_length
+        if payload_stop > payload_start:
+            for i in range(payload_start // self.block_size, (payload_stop - 1) // self.block_size + 1):
+                block_start = i * self.block_size
+                parts.append(self._get_block(i)[max(payload_start - block_start, 0):payload_stop - block_start])
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def _get_block(self, index):
+        """ Get the decompressed payload block, from the cache if possible.
+            Args:
+                index ('int') - The block index.
+            Returns:
+                _ ('bytes') - The uncompressed block.
+        """
+        with self._lock:
+            if index in self._blocks:
+                self._blocks.move_to_end(index)
+                return self._blocks[index]
+            self._file.seek(self._blocks_offset + int(self.offsets[index]))
+            stream = self._file.read(int(self.offsets[index + 1] - self.offsets[index]))
+        block = _decompress_stream(stream, self.codec)
+        with self._lock:
+            self._blocks[index] = block
+            self.blocks_read += 1
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+        return block
+
+    def read(self, size=-1):
+        """ Read up to size uncompressed bytes from the current position, the rest of the buffer if negative. """
+        stop = len(self) if size < 0 else min(self._position + size, len(self))
+        data = self[self._position:stop]
+        self._position = max(stop, self._position)
+        return data
+
+    def close(self):
+        """ Close the container file and drop the cached blocks, the buffer can not be read afterwards. """
+        self._blocks.clear()
+        self._file.close()
+
+
+class _DecompressingReader(object):
+    """ Read-only file object that decompresses the file while reading. Concatenated streams (blocks compressed
+        in parallel) are decoded in order.
+        Attributes:
+            file ('file') - The compressed file.
+            codec ('str') - The compression codec. Enum {'gzip', 'zlib', 'xz'}
+            chunk_size ('int') - The number of compressed bytes read at once.
+    """
+
+    def __init__(self, file, codec, chunk_size=GZIP_BLOCK_SIZE):
+        self.file = file
+        self.codec = codec
+        self.chunk_size = chunk_size
+        self._decompressor = _get_decompressor(codec)
+        self._started = False
+        self._unused = b''
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _fill(self):
+        """ Decompress the next chunk into the read buffer.
+            Returns:
+                _ ('bool') - False at the end of the file.
+        """
+        data = self._unused or self.file.read(self.chunk_size)
+        self._unused = b''
+        if not data:
+            if self._started and not self._decompressor.eof:
+                raise Exception('Can not parse data3d buffer. Truncated ' + self.codec + ' stream.')
+            return False
+        if self._decompressor.eof:
+            # The next independent stream
+            self._decompressor = _get_decompressor(self.codec)
+        self._started = True
+        self._buffer += self._decompressor.decompress(data)
+        if self._decompressor.eof:
+            self._unused = self._decompressor.unused_data
+        return True
+
+    def read(self, size=-1):
+        """ Read and decompress up to size bytes, the rest of the file if size is negative.
+            Kwargs:
+                size ('int') - The number of decompressed bytes.
+            Returns:
+                _ ('bytes', 'bytearray') - The decompressed data.
+        """
+        while size < 0 or len(self._buffer) < size:
+            if not self._fill():
+                break
+        if size < 0 or size >= len(self._buffer):
+            data, self._buffer = self._buffer, bytearray()
+            return data
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _open_buffer_file(input_path):
+    """ Open the data3d.buffer file for reading. The compression codec is detected from the leading magic bytes,
+        compressed files are decompressed while reading.
+        Args:
+            input_path ('str') - The path to the input file.
+        Returns:
+            file ('file', '_DecompressingReader', 'ChunkedBuffer') - The readable file.
+            codec ('str') - The compression codec of the file.
+    """
+    f = open(input_path, 'rb')
+    head = f.read(6)
+    if head.startswith(CHUNKED_MAGIC):
+        f.close()
+        f = ChunkedBuffer(input_path)
+        return f, f.codec
+    codec = _detect_codec(head)
+    f.seek(0)
+    if codec == CODEC_NONE:
+        return f, codec
+    return _DecompressingReader(f, codec), codec
+
+
 def _py_encode_basestring_ascii(s):
     """ Return an ASCII-only JSON representation of a Python string
         Args:
@@ -460,122 +1893,406 @@ def _to_json(o, level=0):
             ret += '{:.5f}'.format(o)
         else:
             ret += '%.5g' % o
-    #elif isinstance(o, numpy.ndarray) ...:
+    elif isinstance(o, np.ndarray):
+        ret += _to_json(o.tolist(), level)
+    elif isinstance(o, Future):
+        # Formatted on a worker thread
+        ret += o.result()
     else:
         raise TypeError("Unknown type '%s' for json serialization" % str(type(o)))
 
     return ret
 
 
+class _JsonStreamReader(object):
+    """ Incremental json reader. Reads the text file in chunks and parses values on demand, numeric attribute arrays
+        are parsed directly into float32 arrays.
+        Attributes:
+            file ('file') - The text file to read.
+            chunk_size ('int') - The number of characters read per chunk.
+            buffer ('str') - The unconsumed text.
+            pos ('int') - The read position in the buffer.
+            eof ('bool') - The file is read completely.
+    """
+
+    def __init__(self, file, chunk_size=JSON_CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """ Read the next chunk into the buffer and drop the consumed text.
+            Returns:
+                _ ('bool') - New text was read.
+        """
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _error(self, message):
+        return ValueError('Can not parse data3d json: ' + message + ' near: ' + repr(self.buffer[self.pos:self.pos+40]))
+
+    def peek(self):
+        """ Skip whitespace and return the next character, '' at the end of the file. """
+        while True:
+            match = JSON_WHITESPACE.match(self.buffer, self.pos)
+            self.pos = match.end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self._error('expected ' + repr(char))
+        self.pos += 1
+
+    def read_string(self):
+        self.expect('"')
+        while True:
+            try:
+                value, end = json.decoder.scanstring(self.buffer, self.pos)
+                self.pos = end
+                return value
+            except ValueError:
+                # Unterminated string, the chunk ends within the string
+                if not self._fill():
+                    raise
+
+    def read_scalar(self):
+        while True:
+            match = JSON_SCALAR_CHARS.match(self.buffer, self.pos)
+            # The token may continue in the next chunk
+            if (match is None or match.end() == len(self.buffer)) and self._fill():
+                continue
+            if match is None or not JSON_SCALAR.fullmatch(match.group(0)):
+                raise self._error('unexpected token')
+            break
+        token = match.group(0)
+        self.pos = match.end()
+        if token in JSON_CONSTANTS:
+            return JSON_CONSTANTS[token]
+        elif token.isdigit() or (token[0] == '-' and token[1:].isdigit()):
+            return int(token)
+        return float(token)
+
+    def _parse_floats(self, text):
+        """ Parse comma separated numbers into a float32 array. """
+        try:
+            return np.array(text.split(','), dtype=np.float32)
+        except ValueError:
+            raise self._error('invalid numeric array')
+
+    def read_float_array(self):
+        """ Read a flat numeric json array into a float32 array. The complete numbers are parsed chunk by chunk,
+            only the last number of a chunk, which may continue in the next one, is kept in the text buffer.
+        """
+        self.expect('[')
+        parts = []
+        end = self.buffer.find(']', self.pos)
+        while end == -1:
+            separator = self.buffer.rfind(',', self.pos)
+            if separator != -1:
+                parts.append(self._parse_floats(self.buffer[self.pos:separator]))
+                self.pos = separator + 1
+            if not self._fill():
+                raise self._error('unterminated array')
+            end = self.buffer.find(']', self.pos)
+        text = self.buffer[self.pos:end]
+        # A trailing separator leaves an empty number, only the empty array has no numbers at all
+        if parts or text.strip():
+            parts.append(self._parse_floats(text))
+        self.pos = end + 1
+        if not parts:
+            return np.empty(0, dtype=np.float32)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def read_value(self, key=None):
+        """ Read the next json value.
+            Kwargs:
+                key ('str') - The key of the value, numeric attribute arrays are read into float32 arrays.
+            Returns:
+                _ ('any') - The parsed value.
+        """
+        char = self.peek()
+        if char == '{':
+            value = {}
+            for item_key in self.iter_keys():
+                value[item_key] = self.read_value(item_key)
+            return value
+        elif char == '[':
+            if key in JSON_FLOAT_ARRAY_KEYS:
+                return self.read_float_array()
+            self.pos += 1
+            value = []
+            if self.peek() == ']':
+                self.pos += 1
+                return value
+            while True:
+                value.append(self.read_value())
+                char = self.peek()
+                self.pos += 1
+                if char == ']':
+                    return value
+                elif char != ',':
+                    raise self._error('expected , or ]')
+        elif char == '"':
+            return self.read_string()
+        return self.read_scalar()
+
+    def iter_keys(self):
+        """ Iterate over the keys of the next json object, the caller reads each value. """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return
+            elif char != ',':
+                raise self._error('expected , or }')
+
+    def iter_items(self):
+        """ Iterate over the elements of the next json array, the caller reads each value. """
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            elif char != ',':
+                raise self._error('expected , or ]')
+
+
+def _iter_data3d_json_objects(file):
+    """ Parse the data3d.json file incrementally and yield every node as a Data3dObject as soon as it is parsed.
+        The nodes are yielded in post-order, the root object is yielded last. Children are linked to their parent
+        when the parent node is complete.
+        Args:
+            file ('file') - The data3d.json text file.
+        Returns:
+            _ ('generator(Data3dObject)') - The deserialized Data3dObjects.
+    """
+    reader = _JsonStreamReader(file)
+
+    def parse_node():
+        node = {}
+        children = []
+        for key in reader.iter_keys():
+            if key == D3D.o_children:
+                for _ in reader.iter_items():
+                    for data3d_object in parse_node():
+                        yield data3d_object
+                    # The child node itself is yielded after its descendants
+                    children.append(data3d_object)
+            else:
+                node[key] = reader.read_value(key)
+
+        data3d_object = Data3dObject(node)
+        for child in children:
+            child.parent = data3d_object
+            data3d_object.add_child(child)
+        yield data3d_object
+
+    for key in reader.iter_keys():
+        if key == D3D.r_container:
+            yield from parse_node()
+        else:
+            reader.read_value(key)
+
+
 def _from_data3d_json(input_path):
-    """ Import data3d from data3d.json file.
+    """ Import data3d from data3d.json file. The file is parsed incrementally, numeric attribute arrays are stored
+        as float32 arrays.
         Args:
             input_path ('str') - The path to the input file.
         Returns:
             data3d_objects ('list(Data3dObject)') - The deserialized data3d ad Data3dObjects.
-            meta ('dict') - The deserialized metadata.
     """
+    if not os.path.exists(input_path):
+        raise Exception('File does not exist, ' + input_path)
+
+    root_object = None
+    with open(input_path, mode='r', encoding='utf-8') as data3d_file:
+        for data3d_object in _iter_data3d_json_objects(data3d_file):
+            root_object = data3d_object
+    if root_object is None:
+        return []
 
-    def read_file_to_json(filepath=''):
-        if os.path.exists(filepath):
-            data3d_file = open(filepath, mode='r')
-            json_str = data3d_file.read()
-            return json.loads(json_str)
-        else:
-            raise Exception('File does not exist, ' + filepath)
+    # The nodes are yielded in post-order, return the descendants in pre-order and the root object last like the
+    # data3d.buffer import
+    data3d_objects = []
+    stack = list(reversed(root_object.children))
+    while stack:
+        data3d_object = stack.pop()
+        data3d_objects.append(data3d_object)
+        stack.extend(reversed(data3d_object.children))
+    data3d_objects.append(root_object)
 
-    data3d_json = read_file_to_json(filepath=input_path)
+    return data3d_objects
 
-    # Import JSON Data3d Objects and add root level object
-    root_object = Data3dObject(data3d_json['data3d'])
-    data3d_objects = _get_data3d_objects_recursive(data3d_json['data3d'], root_object)
-    data3d_objects.append(root_object)
 
-    del data3d_json
+def _get_buffer_header(buffer_file):
+    """ Read the header of the data3d.buffer file.
+        Args:
+            buffer_file ('bytearray') - The buffered data3d file, at least the header bytes.
+        Returns:
+            header ('list(int')) - The parsed data3d.buffer header: magic number, version, structure & payload length.
+    """
+    header_array = [buffer_file[x:x+4] for x in range(0, HEADER_BYTE_LENGTH, 4)]
+    header = [header_array[0],
+              binary_unpack('i', header_array[1]),
+              binary_unpack('i', header_array[2]),
+              binary_unpack('i', header_array[3])
+              ]
+    return header
+
 
-    return data3d_objects
+def _validate_buffer_header(magic_number, version):
+    """ Validate the magic number and the version of the data3d.buffer header.
+        Args:
+            magic_number ('bytearray') - The magic number of the header.
+            version ('int') - The version of the header.
+    """
+    # Fixme why only != gives accurate result instead of is/is not
+    # Validation warnings
+    if magic_number != bytearray(MAGIC_NUMBER, 'ascii'):
+        log.error('File header error: Wrong magic number. File is probably not data3d buffer format. %s', magic_number)
+    if version not in SUPPORTED_VERSIONS:
+        raise Exception('Can not parse data3d buffer. Unsupported version: ' + str(version) + ' Supported: ' + str(SUPPORTED_VERSIONS))
+
+
+def _decode_buffer_structure(structure_array, version):
+    """ Decode the structure section of the data3d.buffer file.
+        Args:
+            structure_array ('bytearray') - The structure bytes.
+            version ('int') - The version of the header.
+        Returns:
+            _ ('dict') - The structure json.
+    """
+    return json.loads(structure_array.decode('utf-8' if version >= VERSION_ALIGNED else 'utf-16'))
 
 
-def _from_data3d_buffer(input_path):
+def _from_data3d_buffer(input_path, use_mmap=False):
     """ Import data3d from data3d.buffer file.
         Args:
             input_path ('str') - The path to the input file.
+        Kwargs:
+            use_mmap ('bool') - Map the file instead of reading it into memory, compressed files are decompressed
+                                to a temporary file first. Seekable containers are always read on access.
         Returns:
             data3d_objects ('list(Data3dObject)') - The deserialized data3d ad Data3dObjects.
     """
 
-    def read_into_buffer(file_path):
-        """ Read binary input file into memory.
+    def map_into_buffer(file_path):
+        """ Map the binary input file read-only, the pages are loaded on access and can be dropped by the os.
             Args:
                 file_path ('str') - The input-file.
             Returns:
-                buf ('bytearray') - The file-buffer.
+                buf ('mmap.mmap') - The file-buffer.
         """
-        if '.gz' in file_path:
-            f = gzip.open(file_path, 'rb')
-            buf = bytearray(f.read())
+        f, codec = _open_buffer_file(file_path)
+        if codec != CODEC_NONE:
+            with f as compressed_file:
+                f = tempfile.TemporaryFile()
+                shutil.copyfileobj(compressed_file, f, GZIP_BLOCK_SIZE)
+            f.flush()
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
             f.close()
-            return buf
-
-        else:
-            buf = bytearray(os.path.getsize(file_path))
-            with open(file_path, 'rb') as f:
-                f.readinto(buf)
-            return buf
 
-    def get_header(buffer_file):
-        """ Read the header of the data3d.buffer file.
+    def read_into_buffer(file_path):
+        """ Read binary input file into memory.
             Args:
-                buffer_file ('bytearray') - The buffered data3d file.
+                file_path ('str') - The input-file.
             Returns:
-                header ('list(int')) - The parsed data3d.buffer header.
+                buf ('bytearray') - The file-buffer.
         """
-        header_array = [buffer_file[x:x+4] for x in range(0, HEADER_BYTE_LENGTH, 4)]
-        header = [header_array[0],
-                  binary_unpack('i', header_array[1]),
-                  binary_unpack('i', header_array[2]),
-                  binary_unpack('i', header_array[3])
-                  ]
-        return header
+        f, codec = _open_buffer_file(file_path)
+        with f:
+            if codec != CODEC_NONE:
+                return f.read()
+            buf = bytearray(os.path.getsize(file_path))
+            f.readinto(buf)
+            return buf
 
-    file_buffer = read_into_buffer(input_path)
+    with open(input_path, 'rb') as f:
+        seekable = f.read(len(CHUNKED_MAGIC)) == CHUNKED_MAGIC
+    if seekable:
+        # The mesh decoders decompress the payload blocks they access
+        file_buffer = ChunkedBuffer(input_path)
+    else:
+        file_buffer = map_into_buffer(input_path) if use_mmap else read_into_buffer(input_path)
 
-    magic_number, version, structure_byte_length, payload_byte_length = get_header(file_buffer)
-    expected_file_byte_length = HEADER_BYTE_LENGTH + structure_byte_length + payload_byte_length
+    try:
+        magic_number, version, structure_byte_length, payload_byte_length = _get_buffer_header(file_buffer)
+        expected_file_byte_length = HEADER_BYTE_LENGTH + structure_byte_length + payload_byte_length
 
-    # Fixme why only != gives accurate result instead of is/is not
-    # Validation warnings
-    if magic_number != bytearray(MAGIC_NUMBER, 'ascii'):
-        log.error('File header error: Wrong magic number. File is probably not data3d buffer format. %s', magic_number)
-    if version != VERSION:
-        log.error('File header error: Wrong version number: %s. Parser supports version: %s', version, VERSION)
+        _validate_buffer_header(magic_number, version)
 
-    # Validation errors
-    if len(file_buffer) != expected_file_byte_length:
-        raise Exception('Can not parse data3d buffer. Wrong buffer size: ' + str(len(file_buffer)) + ' Expected: ' + str(expected_file_byte_length))
+        # Validation errors
+        if len(file_buffer) != expected_file_byte_length:
+            raise Exception('Can not parse data3d buffer. Wrong buffer size: ' + str(len(file_buffer)) + ' Expected: ' + str(expected_file_byte_length))
 
-    payload_byte_offset = HEADER_BYTE_LENGTH + structure_byte_length
-    structure_array = file_buffer[HEADER_BYTE_LENGTH:payload_byte_offset]
-    structure_string = structure_array.decode('utf-16')
-    structure_json = json.loads(structure_string)
+        payload_byte_offset = HEADER_BYTE_LENGTH + structure_byte_length
+        structure_json = _decode_buffer_structure(file_buffer[HEADER_BYTE_LENGTH:payload_byte_offset], version)
+    except:
+        # On success the buffer is owned by the objects, see get_seekable_buffers
+        if isinstance(file_buffer, (ChunkedBuffer, mmap.mmap)):
+            file_buffer.close()
+        raise
 
     # Temp
     #_dump_json_to_file(structure_json, dump_file)
 
     #  Import JSON Data3d Objects and add root level object
-    root_object = Data3dObject(structure_json['data3d'], file_buffer=file_buffer, payload_byte_offset=payload_byte_offset)
-    data3d_objects = _get_data3d_objects_recursive(structure_json['data3d'], root_object, file_buffer=file_buffer, payload_byte_offset=payload_byte_offset)
+    root_object = Data3dObject(structure_json['data3d'], file_buffer=file_buffer, payload_byte_offset=payload_byte_offset,
+                               buffer_version=version)
+    data3d_objects = _get_data3d_objects_recursive(structure_json['data3d'], root_object, file_buffer=file_buffer,
+                                                   payload_byte_offset=payload_byte_offset, buffer_version=version)
     data3d_objects.append(root_object)
 
     return data3d_objects
 
 
-def _to_data3d_json(data3d, output_path):
+def _to_data3d_json(data3d, output_path, workers=None):
     """ Export data3d to data3d.json file.
         Args:
             data3d ('dict') - The parsed data3d geometry as a dictionary.
             output_path ('str') - The path to the output file.
+        Kwargs:
+            workers ('int') - The number of formatting threads, number of processors if None.
+        Returns:
+            path ('str') - The path of the written file.
     """
+    def format_arrays(o):
+        """ Copy the data3d dictionary and schedule the formatting of the numeric arrays on the pool. """
+        if isinstance(o, dict):
+            return o.__class__((k, format_arrays(v)) for k, v in o.items())
+        elif isinstance(o, list):
+            return [format_arrays(e) for e in o]
+        elif isinstance(o, np.ndarray):
+            return pool.submit(_to_json, o)
+        return o
+
     # Ensure suffix
     path = output_path
     if not path.endswith(SUFFIX_JSON):
@@ -584,17 +2301,52 @@ def _to_data3d_json(data3d, output_path):
         path = '/'.join([root, filename])
 
     log.debug('Output path: %s', path)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        json_str = _to_json(format_arrays(data3d))
     with open(path, 'w', encoding='utf-8') as file:
-        file.write(_to_json(data3d))
+        file.write(json_str)
+    return path
 
 
-def _to_data3d_buffer(data3d, output_path, compress_file):
+def _to_data3d_buffer(data3d, output_path, compress_file, version=VERSION, compact=False, normals_type='int16',
+                      uvs_type='float16', workers=None, codec=CODEC_GZIP, compression_level=None, seekable=False):
     """ Export data3d to data3d.buffer file.
         Args:
             data3d ('dict') - The parsed data3d geometry as a dictionary.
             output_path ('str') - The path to the output file.
-            compress_file ('bool') - Gzip the output file.
+            compress_file ('bool') - Compress the output file with the codec.
+        Kwargs:
+            version ('int') - The buffer version, VERSION (float32), VERSION_COMPACT (quantized payload) or
+                              VERSION_ALIGNED (utf-8 structure, 16-byte aligned payload).
+            compact ('bool') - Quantize the payload of a VERSION_ALIGNED buffer, implied by VERSION_COMPACT.
+            normals_type ('str') - The octahedral normal type of the compact payload. Enum {'int16', 'int8'}
+            uvs_type ('str') - The uv type of the compact payload. Enum {'float16', 'int16'}
+            workers ('int') - The number of encoding and compression threads, number of processors if None.
+            codec ('str') - The compression codec of a compressed file. Enum {'none', 'gzip', 'zlib', 'xz'}
+            compression_level ('int') - The compression level (xz preset) 0-9, the codec default if None.
+            seekable ('bool') - Write a compressed file as the seekable container (see ChunkedBuffer).
+        Returns:
+            _ ('str') - The path of the written file.
     """
+    if codec not in COMPRESSION_CODECS:
+        raise Exception('Can not serialize data3d buffer. Unknown compression codec: ' + str(codec))
+    compress_file = compress_file and codec != CODEC_NONE
+    if version not in SUPPORTED_VERSIONS:
+        raise Exception('Can not serialize data3d buffer. Unsupported version: ' + str(version))
+    if compact and version == VERSION:
+        raise Exception('Can not serialize data3d buffer. Version 1 does not support a compact payload.')
+    compact = compact or version == VERSION_COMPACT
+    alignment = ALIGNED_BYTE_LENGTH if version == VERSION_ALIGNED else 4
+    if normals_type not in COMPACT_NORMALS_TYPES or uvs_type not in COMPACT_UVS_TYPES:
+        raise Exception('Can not serialize data3d buffer. Unsupported compact types: ' + normals_type + ', ' + uvs_type)
+
+    attributes = [
+        (D3D.v_coords, D3D.b_coords_offset, D3D.b_coords_length, D3D.b_coords_encoding),
+        (D3D.v_normals, D3D.b_normals_offset, D3D.b_normals_length, D3D.b_normals_encoding),
+        (D3D.uv_coords, D3D.b_uvs_offset, D3D.b_uvs_length, D3D.b_uvs_encoding),
+        (D3D.uv2_coords, D3D.b_uvs2_offset, D3D.b_uvs2_length, D3D.b_uvs2_encoding)
+    ]
+
     def create_header(s_length, p_length):
         """ Create the data3d.buffer header from magic number, version and data.
             Args:
@@ -603,120 +2355,575 @@ def _to_data3d_buffer(data3d, output_path, compress_file):
             Returns:
                 _ ('bytearray') - The created header.
         """
-        return bytearray(MAGIC_NUMBER, 'ascii') + binary_pack('i', [VERSION, s_length, p_length])
+        return bytearray(MAGIC_NUMBER, 'ascii') + binary_pack('i', [version, s_length, p_length])
+
+    def encode(key, values):
+        """ Encode the attribute values for the payload.
+            Positions are quantized to int16 against the mesh bounding box, normals are octahedral encoded (compact).
+            Args:
+                key ('str') - The attribute key.
+                values ('list(float)') - The flat attribute values.
+            Returns:
+                encoded ('numpy.ndarray') - The encoded values.
+                encoding ('dict') - The decode parameters, None for float32 payloads.
+        """
+        if not compact:
+            return np.asarray(values, dtype=BUFFER_DTYPES['float32']), None
+        elif key == D3D.v_coords:
+            return _quantize(values, 3)
+        elif key == D3D.v_normals:
+            return _octahedral_encode(values, data_type=normals_type)
+        elif uvs_type == 'int16':
+            return _quantize(values, 2)
+        else:
+            return np.asarray(values, dtype=BUFFER_DTYPES[uvs_type]), {D3D.e_type: uvs_type}
+
+    def encode_mesh(mesh_attributes):
+        return [(key, encode(key, values)) for key, values in mesh_attributes]
 
     def extract_buffer_data(d):
-        """ Extracts payload data from data3d dict, adds offset & length data to dict.
+        """ Extracts and encodes payload data from data3d dict, adds offset & length data to dict.
+            The meshes are encoded on the pool and assembled in their original order.
+            Version 1 offsets count floats, version 2 & 3 offsets count bytes and add the attribute encoding.
             Args:
                 d ('dict') - The parsed data3d geometry as a dictionary.
             Returns:
                 s ('dict') - The modified structure dictionary.
-                p ('list(float)') - The payload list of floats.
+                p ('list(bytes)') - The payload chunks.
         """
-        s = copy.deepcopy(d)
+        s = _copy_structure(d)
         p = []
+        p_length = 0
+        keys = {key: (offset_key, length_key, encoding_key) for key, offset_key, length_key, encoding_key in attributes}
 
         root = s[D3D.r_container]
         # Flattened Data3d dictionary with no hierarchy
         if D3D.o_meshes in root:
-            meshes = root[D3D.o_meshes]
-            for mesh_key in meshes:
-                mesh = meshes[mesh_key]
-                v_loc = mesh.pop(D3D.v_coords, None)
-                v_norm = mesh.pop(D3D.v_normals, None)
-                v_uvs = mesh.pop(D3D.uv_coords, None)
-                v_uvs2 = mesh.pop(D3D.uv2_coords, None)
-
-                mesh[D3D.b_coords_length] = len(v_loc)
-                mesh[D3D.b_coords_offset] = len(p)
-                p.extend(v_loc)
-
-                mesh[D3D.b_normals_length] = len(v_norm)
-                mesh[D3D.b_normals_offset] = len(p)
-                p.extend(v_norm)
-
-                if v_uvs:
-                    mesh[D3D.b_uvs_length] = len(v_uvs)
-                    mesh[D3D.b_uvs_offset] = len(p)
-                    p.extend(v_uvs)
-
-                if v_uvs2:
-                    mesh[D3D.b_uvs2_length] = len(v_uvs2)
-                    mesh[D3D.b_uvs2_offset] = len(p)
-                    p.extend(v_uvs2)
+            meshes = [root[D3D.o_meshes][mesh_key] for mesh_key in root[D3D.o_meshes]]
+            mesh_attributes = []
+            for mesh in meshes:
+                values = [(key, mesh.pop(key, None)) for key, _, _, _ in attributes]
+                mesh_attributes.append([(key, v) for key, v in values if v is not None and len(v) > 0])
+
+            for mesh, encoded_attributes in zip(meshes, pool.map(encode_mesh, mesh_attributes)):
+                for key, (encoded, encoding) in encoded_attributes:
+                    offset_key, length_key, encoding_key = keys[key]
+                    if version == VERSION:
+                        mesh[length_key] = len(encoded)
+                        mesh[offset_key] = p_length // 4
+                    else:
+                        # Keep every attribute range aligned for typed views
+                        padding = -p_length % alignment
+                        p.append(bytes(padding))
+                        p_length += padding
+                        mesh[length_key] = len(encoded)
+                        mesh[offset_key] = p_length
+                        if encoding is not None:
+                            mesh[encoding_key] = encoding
+                    p.append(encoded.tobytes())
+                    p_length += encoded.nbytes
         return s, p
 
-    structure, payload = extract_buffer_data(data3d)
-    structure_json = json.dumps(structure, indent=None, skipkeys=False)
-    structure['version'] = VERSION
-
-    if not len(structure_json) % 2:
-        structure_json += ' '
-
-    # Temp
-    #_dump_json_to_file(structure, dump_file)
-
-    structure_byte_array = bytearray(structure_json, 'utf-16')
-    structure_byte_length = len(structure_byte_array)
-    payload_byte_array = binary_pack('f', payload)
-    payload_byte_length = len(payload_byte_array)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        structure, payload = extract_buffer_data(data3d)
+        payload_byte_array = b''.join(payload)
+        del payload
+        structure_json = json.dumps(structure, indent=None, skipkeys=False)
+        structure['version'] = version
+
+        if version == VERSION_ALIGNED:
+            # Pad the structure with spaces so that the payload starts aligned
+            structure_byte_array = bytearray(structure_json, 'utf-8')
+            structure_byte_array += b' ' * (-(HEADER_BYTE_LENGTH + len(structure_byte_array)) % ALIGNED_BYTE_LENGTH)
+        else:
+            if not len(structure_json) % 2:
+                structure_json += ' '
+            structure_byte_array = bytearray(structure_json, 'utf-16')
+
+        # Temp
+        #_dump_json_to_file(structure, dump_file)
+
+        structure_byte_length = len(structure_byte_array)
+        payload_byte_length = len(payload_byte_array)
+
+        header = create_header(structure_byte_length, payload_byte_length)
+
+        # Validation Warnings
+        # Validation Errors
+        if len(header) != HEADER_BYTE_LENGTH:
+            raise Exception('Can not serialize data3d buffer. Wrong header size: ' + str(len(header)) + ' Expected: ' + str(HEADER_BYTE_LENGTH))
+
+        source_name = os.path.basename(output_path)
+
+        name_parts = source_name.split('.')[:-2]
+        while len(name_parts) > 1 and name_parts[-1] in list(CODEC_SUFFIXES.values()) + [SUFFIX_CHUNKED]:
+            name_parts.pop()
+        filename = '.'.join(name_parts)
+
+        path = os.path.dirname(output_path)
+
+        log.debug('filename %s, pathname %s', filename, path)
+
+        if compress_file and seekable:
+            filename = '.'.join([filename, SUFFIX_CHUNKED, CODEC_SUFFIXES[codec], SUFFIX_BUFFER])
+            _write_chunked_buffer('/'.join([path, filename]), bytes(header + structure_byte_array), payload_byte_array,
+                                  codec=codec, level=compression_level, pool=pool)
+        elif compress_file:
+            # Compress independent streams in parallel, written in order
+            filename = '.'.join([filename, CODEC_SUFFIXES[codec], SUFFIX_BUFFER])
+            payload_view = memoryview(payload_byte_array)
+            blocks = [bytes(header + structure_byte_array)]
+            blocks.extend(payload_view[x:x+GZIP_BLOCK_SIZE] for x in range(0, payload_byte_length, GZIP_BLOCK_SIZE))
+            with open('/'.join([path, filename]), 'wb') as buffer_file:
+                for stream in pool.map(lambda block: _compress_block(block, codec, compression_level), blocks):
+                    buffer_file.write(stream)
+        else:
+            filename = '.'.join([filename, SUFFIX_BUFFER])
+            with open('/'.join([path, filename]), 'wb') as buffer_file:
+                buffer_file.write(header)
+                buffer_file.write(structure_byte_array)
+                buffer_file.write(payload_byte_array)
+    log.info('output_path %s', '/'.join([path, filename]))
+    return '/'.join([path, filename])
 
-    header = create_header(structure_byte_length, payload_byte_length)
 
-    # Validation Warnings
-    # Validation Errors
+def _inspect_buffer(f, input_path):
+    """ Read the header and the structure section of the data3d.buffer file, the payload is not read.
+        Compressed files are only decompressed up to the end of the structure.
+        Args:
+            f ('file') - The file of _open_buffer_file, positioned at the start.
+            input_path ('str') - The path to the input file.
+        Returns:
+            version ('int') - The buffer version.
+            structure_byte_length ('int') - The byte length of the structure section.
+            payload_byte_length ('int') - The byte length of the payload.
+            structure_json ('dict') - The structure json.
+    """
+    header = f.read(HEADER_BYTE_LENGTH)
     if len(header) != HEADER_BYTE_LENGTH:
-        raise Exception('Can not serialize data3d buffer. Wrong header size: ' + str(len(header)) + ' Expected: ' + str(HEADER_BYTE_LENGTH))
-
-    source_name = os.path.basename(output_path)
+        raise Exception('Can not parse data3d buffer. Incomplete header: ' + input_path)
+    magic_number, version, structure_byte_length, payload_byte_length = _get_buffer_header(bytearray(header))
+    _validate_buffer_header(magic_number, version)
+    structure_json = _decode_buffer_structure(bytearray(f.read(structure_byte_length)), version)
+    return version, structure_byte_length, payload_byte_length, structure_json
 
-    if source_name.endswith('.'.join([SUFFIX_GZIP, SUFFIX_BUFFER])):
-        filename = '.'.join(source_name.split('.')[:-3])
-    else:
-        filename = '.'.join(source_name.split('.')[:-2])
 
-    path = os.path.dirname(output_path)
+def _read_data3d(input_path):
+    """ Read the data3d file as a dictionary, the buffer payload attributes are decoded into float32 arrays.
+        Args:
+            input_path ('str') - The path to the data3d file.
+        Returns:
+            data3d ('dict') - The data3d dictionary, as it is stored in the data3d.json format.
+    """
+    if input_path.endswith(SUFFIX_JSON):
+        with open(input_path, mode='r', encoding='utf-8') as data3d_file:
+            return json.load(data3d_file)
+
+    attributes = [
+        (D3D.v_coords, D3D.b_coords_offset, D3D.b_coords_length, D3D.b_coords_encoding),
+        (D3D.v_normals, D3D.b_normals_offset, D3D.b_normals_length, D3D.b_normals_encoding),
+        (D3D.uv_coords, D3D.b_uvs_offset, D3D.b_uvs_length, D3D.b_uvs_encoding),
+        (D3D.uv2_coords, D3D.b_uvs2_offset, D3D.b_uvs2_length, D3D.b_uvs2_encoding)
+    ]
+
+    f, _ = _open_buffer_file(input_path)
+    with f:
+        file_buffer = f.read()
+
+    magic_number, version, structure_byte_length, payload_byte_length = _get_buffer_header(file_buffer)
+    _validate_buffer_header(magic_number, version)
+    expected_file_byte_length = HEADER_BYTE_LENGTH + structure_byte_length + payload_byte_length
+    if len(file_buffer) != expected_file_byte_length:
+        raise Exception('Can not parse data3d buffer. Wrong buffer size: ' + str(len(file_buffer)) + ' Expected: ' + str(expected_file_byte_length))
 
-    log.debug('filename %s, pathname %s', filename, path)
+    payload_byte_offset = HEADER_BYTE_LENGTH + structure_byte_length
+    data3d = _decode_buffer_structure(file_buffer[HEADER_BYTE_LENGTH:payload_byte_offset], version)
+
+    nodes = [data3d[D3D.r_container]]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node[D3D.o_children] if D3D.o_children in node else [])
+        for mesh in (node[D3D.o_meshes] if D3D.o_meshes in node else {}).values():
+            for array_key, offset_key, length_key, encoding_key in attributes:
+                if offset_key not in mesh:
+                    continue
+                offset = mesh.pop(offset_key)
+                length = mesh.pop(length_key)
+                encoding = mesh.pop(encoding_key, None)
+                byte_offset = payload_byte_offset + _payload_byte_offset(offset, version)
+                mesh[array_key] = _decode_attribute(file_buffer, byte_offset, length, encoding)
+    return data3d
+
+
+def inspect_data3d(input_path):
+    """ Summarize a data3d file without decoding the geometry. For data3d.buffer files only the header and the
+        structure are read, the statistics are computed from the *Offset/*Length fields.
+        Args:
+            input_path ('str') - The path to the data3d file.
+        Returns:
+            summary ('dict') - The file summary: node & mesh count, vertex count per mesh, payload bytes,
+                               materials and hierarchy depth.
+    """
+    if not os.path.exists(input_path):
+        raise Exception('File does not exist, ' + input_path)
+
+    attributes = [
+        (D3D.v_coords, D3D.b_coords_length, D3D.b_coords_encoding),
+        (D3D.v_normals, D3D.b_normals_length, D3D.b_normals_encoding),
+        (D3D.uv_coords, D3D.b_uvs_length, D3D.b_uvs_encoding),
+        (D3D.uv2_coords, D3D.b_uvs2_length, D3D.b_uvs2_encoding)
+    ]
+
+    def mesh_summary(node_id, key, mesh):
+        """ Summarize the mesh from its buffer lengths or its json arrays. """
+        vertex_count = 0
+        payload_bytes = 0
+        for array_key, length_key, encoding_key in attributes:
+            if length_key in mesh:
+                length = mesh[length_key]
+                data_type = mesh[encoding_key][D3D.e_type] if encoding_key in mesh else 'float32'
+                payload_bytes += length * np.dtype(BUFFER_DTYPES[data_type]).itemsize
+            elif array_key in mesh:
+                length = len(mesh[array_key])
+                payload_bytes += length * 4
+            else:
+                continue
+            if array_key == D3D.v_coords:
+                vertex_count = length // 3
+        return {
+            'node': node_id,
+            'key': key,
+            'material': mesh[D3D.m_material] if D3D.m_material in mesh else None,
+            'vertices': vertex_count,
+            'payloadBytes': payload_bytes
+        }
 
-    if compress_file:
-        filename = '.'.join([filename, SUFFIX_GZIP, SUFFIX_BUFFER])
-        with gzip.open('/'.join([path, filename]), 'wb') as buffer_file:
-            buffer_file.write(header)
-            buffer_file.write(structure_byte_array)
-            buffer_file.write(payload_byte_array)
+    summary = {
+        'path': input_path,
+        'fileBytes': os.path.getsize(input_path),
+    }
+
+    # (node_id, depth, meshes, materials) per node
+    nodes = []
+    if input_path.endswith(SUFFIX_JSON):
+        summary['format'] = SUFFIX_JSON
+        # The meshes of a node are summarized as soon as it is parsed and its arrays are released right away
+        summarized = []
+        with open(input_path, mode='r', encoding='utf-8') as data3d_file:
+            for data3d_object in _iter_data3d_json_objects(data3d_file):
+                node_meshes = [mesh_summary(data3d_object.node_id, key, mesh)
+                               for key, mesh in data3d_object.mesh_references.items()]
+                summarized.append((data3d_object, node_meshes, data3d_object.materials))
+                data3d_object.release_source_data()
+        # Parents are only linked after their children were yielded, resolve the depth once all nodes are read
+        for data3d_object, node_meshes, node_materials in summarized:
+            depth = 1
+            parent = data3d_object.parent
+            while parent is not None:
+                depth, parent = depth + 1, parent.parent
+            nodes.append((data3d_object.node_id, depth, node_meshes, node_materials))
     else:
-        filename = '.'.join([filename, SUFFIX_BUFFER])
-        with open('/'.join([path, filename]), 'wb') as buffer_file:
-            buffer_file.write(header)
-            buffer_file.write(structure_byte_array)
-            buffer_file.write(payload_byte_array)
-    log.info('output_path %s', '/'.join([path, filename]))
+        summary['format'] = SUFFIX_BUFFER
+        f, summary['codec'] = _open_buffer_file(input_path)
+        with f:
+            summary['seekable'] = isinstance(f, ChunkedBuffer)
+            if summary['seekable']:
+                summary['blocks'] = len(f.offsets) - 1
+            version, structure_byte_length, payload_byte_length, structure_json = _inspect_buffer(f, input_path)
+        summary['compressed'] = summary['codec'] != CODEC_NONE
+        summary['version'] = version
+        summary['structureBytes'] = structure_byte_length
+        summary['payloadBytes'] = payload_byte_length
+
+        stack = [(structure_json[D3D.r_container], 1)]
+        while stack:
+            node, depth = stack.pop()
+            node_id = node[D3D.node_id] if D3D.node_id in node else None
+            node_meshes = node[D3D.o_meshes] if D3D.o_meshes in node else {}
+            nodes.append((node_id, depth, [mesh_summary(node_id, key, node_meshes[key]) for key in node_meshes],
+                          node[D3D.o_materials] if D3D.o_materials in node else {}))
+            stack.extend((child, depth + 1) for child in reversed(node[D3D.o_children] if D3D.o_children in node else []))
+
+    meshes = [mesh for _, _, node_meshes, _ in nodes for mesh in node_meshes]
+    materials = set()
+    for _, _, _, node_materials in nodes:
+        materials.update(node_materials)
+
+    summary['nodeCount'] = len(nodes)
+    summary['hierarchyDepth'] = max(depth for _, depth, _, _ in nodes) if nodes else 0
+    summary['meshCount'] = len(meshes)
+    summary['vertexCount'] = sum(m['vertices'] for m in meshes)
+    if 'payloadBytes' not in summary:
+        summary['payloadBytes'] = sum(m['payloadBytes'] for m in meshes)
+    summary['materials'] = sorted(materials)
+    summary['meshes'] = meshes
+    return summary
+
+
+def validate_data3d(input_path):
+    """ Decode the whole data3d file and check the mesh attributes: triangle positions, one normal per position,
+        one uv per position and finite values.
+        Args:
+            input_path ('str') - The path to the data3d file.
+        Returns:
+            report ('dict') - The validation report: valid, mesh count and the list of errors.
+    """
+    report = {'path': input_path, 'valid': False, 'meshCount': 0, 'errors': []}
+    try:
+        data3d = _read_data3d(input_path)
+    except Exception as e:
+        report['errors'].append(str(e))
+        return report
+
+    nodes = [data3d[D3D.r_container]] if D3D.r_container in data3d else []
+    if not nodes:
+        report['errors'].append('Missing root node: ' + D3D.r_container)
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node[D3D.o_children] if D3D.o_children in node else [])
+        node_id = node[D3D.node_id] if D3D.node_id in node else ''
+        for key, mesh in (node[D3D.o_meshes] if D3D.o_meshes in node else {}).items():
+            report['meshCount'] += 1
+            name = node_id + '/' + key
+            if D3D.v_coords not in mesh or D3D.v_normals not in mesh:
+                report['errors'].append(name + ': Missing positions or normals.')
+                continue
+            vertex_count = len(mesh[D3D.v_coords]) // 3
+            if len(mesh[D3D.v_coords]) % 9:
+                report['errors'].append(name + ': Positions do not form triangles.')
+            if len(mesh[D3D.v_normals]) != vertex_count * 3:
+                report['errors'].append(name + ': Normal count does not match the vertex count.')
+            for uvs_key in [D3D.uv_coords, D3D.uv2_coords]:
+                if uvs_key in mesh and len(mesh[uvs_key]) != vertex_count * 2:
+                    report['errors'].append(name + ': ' + uvs_key + ' count does not match the vertex count.')
+            for array_key in [D3D.v_coords, D3D.v_normals, D3D.uv_coords, D3D.uv2_coords]:
+                if array_key in mesh and not np.isfinite(np.asarray(mesh[array_key], dtype=np.float32)).all():
+                    report['errors'].append(name + ': ' + array_key + ' contains non-finite values.')
+
+    report['valid'] = not report['errors']
+    return report
+
+
+def convert_data3d(input_path, output_path, version=VERSION, compact=False, normals_type='int16', uvs_type='float16',
+                   workers=None, codec=None, compression_level=None, seekable=None):
+    """ Convert between the data3d.json and the data3d.buffer format, the output format is defined by the suffix
+        of the output path. Buffer output requires a flattened data3d file.
+        Args:
+            input_path ('str') - The path to the data3d source file.
+            output_path ('str') - The path to the output file.
+        Kwargs:
+            version ('int') - The buffer version of a data3d.buffer output.
+            compact ('bool') - Quantize the payload of a VERSION_ALIGNED buffer.
+            normals_type ('str') - The octahedral normal type of the compact payload. Enum {'int16', 'int8'}
+            uvs_type ('str') - The uv type of the compact payload. Enum {'float16', 'int16'}
+            workers ('int') - The number of encoding threads, number of processors if None.
+            codec ('str') - The compression codec of a data3d.buffer output, from the output suffix if None.
+                            Enum {'none', 'gzip', 'zlib', 'xz'}
+            compression_level ('int') - The compression level (xz preset) 0-9, the codec default if None.
+            seekable ('bool') - Write the seekable container, from the output suffix (.chunked) if None.
+        Returns:
+            _ ('str') - The path of the written file.
+    """
+    if not os.path.exists(input_path):
+        raise Exception('File does not exist, ' + input_path)
+    data3d = _read_data3d(input_path)
+    if output_path.endswith(SUFFIX_BUFFER):
+        # The buffer writer stores the meshes of the flattened root node only
+        children = data3d[D3D.r_container][D3D.o_children] if D3D.o_children in data3d[D3D.r_container] else []
+        if children:
+            raise Exception('Can not convert to data3d buffer. Only flattened data3d (no children) is supported: ' + input_path)
+        codec = _get_codec_from_path(output_path) if codec is None else codec
+        if seekable is None:
+            seekable = SUFFIX_CHUNKED in os.path.basename(output_path).split('.')[1:]
+        return _to_data3d_buffer(data3d, output_path, compress_file=codec != CODEC_NONE, version=version,
+                                 compact=compact, normals_type=normals_type, uvs_type=uvs_type, workers=workers,
+                                 codec=codec, compression_level=compression_level, seekable=seekable)
+    return _to_data3d_json(data3d, output_path, workers=workers)
+
+
+def benchmark_compression(input_path, codecs=COMPRESSION_CODECS, levels=None, workers=None, repeat=3):
+    """ Compare the compression ratio against the encode and decode speed of the codecs on a data3d.buffer file.
+        Encoding compresses the blocks in parallel like the exporter, decoding reads the file sequentially like the
+        importer. The best time of the repetitions is reported.
+        Args:
+            input_path ('str') - The path to the data3d.buffer file, compressed or not.
+        Kwargs:
+            codecs ('list(str)') - The compression codecs to compare.
+            levels ('list(int)') - The compression levels to compare, the codec defaults if None.
+            workers ('int') - The number of compression threads, number of processors if None.
+            repeat ('int') - The number of timed repetitions per codec and level.
+        Returns:
+            report ('dict') - The uncompressed size and the size, ratio, encode & decode speed (MB/s) per codec and
+                              level.
+    """
+    if not os.path.exists(input_path):
+        raise Exception('File does not exist, ' + input_path)
+    f, _ = _open_buffer_file(input_path)
+    with f:
+        raw = bytes(f.read())
+    _validate_buffer_header(*_get_buffer_header(raw)[:2])
+
+    raw_view = memoryview(raw)
+    blocks = [raw_view[x:x+GZIP_BLOCK_SIZE] for x in range(0, len(raw), GZIP_BLOCK_SIZE)]
+    megabytes = len(raw) / (1024.0 * 1024.0)
+
+    def best_time(function):
+        """ Run the function repeat times, return the last result and the shortest duration. """
+        durations = []
+        for _ in range(max(repeat, 1)):
+            t0 = time.perf_counter()
+            result = function()
+            durations.append(time.perf_counter() - t0)
+        return result, min(durations)
+
+    def decode(compressed):
+        """ Decode the compressed file from memory. """
+        if codec == CODEC_NONE:
+            return compressed
+        return _DecompressingReader(io.BytesIO(compressed), codec).read()
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for codec in codecs:
+            for level in ([None] if codec == CODEC_NONE else levels or [None]):
+                compressed, encode_time = best_time(lambda: b''.join(
+                    pool.map(lambda block: _compress_block(block, codec, level), blocks)))
+                decoded, decode_time = best_time(lambda: decode(compressed))
+                if decoded != raw:
+                    raise Exception('Compression benchmark failed. ' + codec + ' round trip does not match.')
+                results.append({
+                    'codec': codec,
+                    'level': None if codec == CODEC_NONE else CODEC_LEVELS[codec] if level is None else level,
+                    'bytes': len(compressed),
+                    'ratio': len(raw) / len(compressed) if compressed else 0.0,
+                    'encodeMBs': megabytes / encode_time if encode_time else 0.0,
+                    'decodeMBs': megabytes / decode_time if decode_time else 0.0
+                })
+                log.debug('Benchmark %s: %s', input_path, results[-1])
+    return {'path': input_path, 'rawBytes': len(raw), 'results': results}
+
+
+def get_seekable_buffers(data3d_objects):
+    """ Return the seekable containers the data3d objects decode their meshes from, they keep their file open until
+        they are closed. Read and mapped file buffers are freed with the objects, the decoded float32 arrays can be
+        views of them.
+        Args:
+            data3d_objects ('list(Data3dObject)') - The deserialized data3d objects.
+        Returns:
+            _ ('list(ChunkedBuffer)') - The distinct seekable containers.
+    """
+    file_buffers = OrderedDict()
+    for data3d_object in data3d_objects:
+        if isinstance(data3d_object.file_buffer, ChunkedBuffer):
+            file_buffers[id(data3d_object.file_buffer)] = data3d_object.file_buffer
+    return list(file_buffers.values())
 
 
 # Public functions
-def deserialize_data3d(input_path, from_buffer):
+def deserialize_data3d(input_path, from_buffer, use_mmap=False, region_box=None, region_sphere=None):
     """ Deserialize data3d from .json or .buffer input.
         Args:
             input_path ('str') - The path to the data3d file.
             from_buffer ('bool') - Import format is buffer.
+        Kwargs:
+            use_mmap ('bool') - Map the buffer file instead of reading it into memory.
+            region_box ('tuple') - Only keep the meshes intersecting this box, (lower, upper) in data3d space.
+            region_sphere ('tuple') - Only keep the meshes intersecting this sphere, (center, radius) in data3d space.
         Returns:
             _ ('list(Data3dObject)') - The deserialized data3d ad Data3dObjects.
     """
     if from_buffer:
-        return _from_data3d_buffer(input_path)
+        data3d_objects = _from_data3d_buffer(input_path, use_mmap=use_mmap)
     else:
-        return _from_data3d_json(input_path)
+        data3d_objects = _from_data3d_json(input_path)
+
+    if region_box is not None or region_sphere is not None:
+        _filter_data3d_objects(data3d_objects, input_path, region_box=region_box, region_sphere=region_sphere)
+    return data3d_objects
 
 
-def serialize_data3d(data3d, output_path, to_buffer):
+def serialize_data3d(data3d, output_path, to_buffer, version=VERSION, compact=False, normals_type='int16',
+                     uvs_type='float16', workers=None, codec=CODEC_GZIP, compression_level=None, seekable=False):
     """ Serialize data3d to .json or -.buffer file.
         Args:
             data3d ('dict') - The parsed data3d geometry as a dictionary.
             output_path ('str') - The path to the output file.
             to_buffer ('bool') - Export format is buffer.
+        Kwargs:
+            version ('int') - The buffer version, VERSION_COMPACT stores a quantized payload, VERSION_ALIGNED a utf-8
+                              structure and a 16-byte aligned payload.
+            compact ('bool') - Quantize the payload of a VERSION_ALIGNED buffer.
+            normals_type ('str') - The octahedral normal type of the compact payload. Enum {'int16', 'int8'}
+            uvs_type ('str') - The uv type of the compact payload. Enum {'float16', 'int16'}
+            workers ('int') - The number of encoding threads, number of processors if None.
+            codec ('str') - The compression codec of the buffer file. Enum {'none', 'gzip', 'zlib', 'xz'}
+            compression_level ('int') - The compression level (xz preset) 0-9, the codec default if None.
+            seekable ('bool') - Write the buffer as the seekable container, payload blocks compressed independently.
     """
     if to_buffer:
-        _to_data3d_buffer(data3d, output_path, compress_file=True)
+        _to_data3d_buffer(data3d, output_path, compress_file=codec != CODEC_NONE, version=version, compact=compact,
+                          normals_type=normals_type, uvs_type=uvs_type, workers=workers, codec=codec,
+                          compression_level=compression_level, seekable=seekable)
     else:
-        _to_data3d_json(data3d, output_path)
+        _to_data3d_json(data3d, output_path, workers=workers)
+
+
+def main(argv=None):
+    """ Command line interface of the data3d utilities, e.g. python data3d_utils.py inspect model.data3d.buffer
+        Args:
+            argv ('list(str)') - The command line arguments, defaults to sys.argv.
+        Returns:
+            _ ('int') - The exit code.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description='Data3d file utilities.')
+    subparsers = parser.add_subparsers(dest='command')
+    inspect_parser = subparsers.add_parser('inspect', help='Print a json summary of the file header and structure.')
+    inspect_parser.add_argument('paths', nargs='+', help='data3d.buffer, data3d.gz.buffer or data3d.json files.')
+    validate_parser = subparsers.add_parser('validate', help='Decode the files and print a json validation report.')
+    validate_parser.add_argument('paths', nargs='+', help='data3d.buffer, data3d.gz.buffer or data3d.json files.')
+    convert_parser = subparsers.add_parser('convert', help='Convert between data3d.json and data3d.buffer.')
+    convert_parser.add_argument('input', help='The source file.')
+    convert_parser.add_argument('output', help='The output file, the suffix defines the format.')
+    convert_parser.add_argument('--compact', action='store_true', help='Write a compact (version 2) buffer payload.')
+    convert_parser.add_argument('--aligned', action='store_true', help='Write a utf-8, aligned (version 3) buffer.')
+    convert_parser.add_argument('--codec', choices=COMPRESSION_CODECS, default=None,
+                                help='The buffer compression codec, from the output suffix by default.')
+    convert_parser.add_argument('--level', type=int, default=None, help='The compression level (xz preset) 0-9.')
+    convert_parser.add_argument('--seekable', action='store_true', default=None,
+                                help='Write the seekable container, compressed blocks with an index.')
+    benchmark_parser = subparsers.add_parser('benchmark', help='Compare the compression codecs on buffer files.')
+    benchmark_parser.add_argument('paths', nargs='+', help='data3d.buffer files, compressed or not.')
+    benchmark_parser.add_argument('--codecs', nargs='+', choices=COMPRESSION_CODECS, default=COMPRESSION_CODECS,
+                                  help='The codecs to compare.')
+    benchmark_parser.add_argument('--levels', nargs='+', type=int, default=None,
+                                  help='The compression levels to compare, the codec defaults by default.')
+    benchmark_parser.add_argument('--repeat', type=int, default=3, help='The timed repetitions per codec and level.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'inspect':
+        for input_path in args.paths:
+            print(json.dumps(inspect_data3d(input_path), indent=2))
+        return 0
+    elif args.command == 'validate':
+        reports = [validate_data3d(input_path) for input_path in args.paths]
+        for report in reports:
+            print(json.dumps(report, indent=2))
+        return 0 if all(report['valid'] for report in reports) else 1
+    elif args.command == 'convert':
+        version = VERSION_ALIGNED if args.aligned else VERSION_COMPACT if args.compact else VERSION
+        print(convert_data3d(args.input, args.output, version=version, compact=args.compact, codec=args.codec,
+                             compression_level=args.level, seekable=args.seekable))
+        return 0
+    elif args.command == 'benchmark':
+        for input_path in args.paths:
+            print(json.dumps(benchmark_compression(input_path, codecs=args.codecs, levels=args.levels,
+                                                   repeat=args.repeat), indent=2))
+        return 0
+
+    parser.print_help()
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,17 +4,21 @@ import logging
 from datetime import datetime
 from collections import OrderedDict
 import shutil
+import hashlib
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import math
+import numpy as np
 from mathutils import Matrix
 
 import bpy
 import bmesh
-from bpy_extras.io_utils import unpack_list
 
 from . import ModuleInfo
+from . import texture_utils
 from io_scene_data3d.material_utils import get_al_material, get_default_al_material
-from io_scene_data3d.data3d_utils import D3D, serialize_data3d
+from io_scene_data3d.data3d_utils import D3D, serialize_data3d, MemoryTracker, VERSION, VERSION_COMPACT, VERSION_ALIGNED, \
+    CODEC_GZIP, get_normal_matrix
 
 
 # Global Variables
@@ -25,17 +29,406 @@ O = bpy.ops
 log = logging.getLogger('archilogic')
 
 TextureDirectory = 'textures'
+TextureMapTypes = [D3D.map_diff, D3D.map_spec, D3D.map_norm, D3D.map_alpha, D3D.map_light]
+TEXTURE_HASH_BLOCK_SIZE = 1024 * 1024
+
+# Content digests of the texture files: (path, size, mtime_ns) -> sha1
+texture_digests = {}
+
+
+class ExportCache:
+    """ Cache of the parsed data3d meshes per exported object. Unchanged objects are re-used on the next export
+        without evaluating and parsing their mesh again.
+        Attributes:
+            max_bytes ('int') - The size limit of the cached geometry arrays in bytes.
+            byte_size ('int') - The size of the cached geometry arrays in bytes.
+            entries ('OrderedDict') - The cached entries by object name, in least recently used order.
+    """
+
+    def __init__(self, max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.byte_size = 0
+        self.entries = OrderedDict()
+
+    def get(self, key, fingerprint):
+        """ Get the cached value if the fingerprint of the entry matches.
+            Args:
+                key ('str') - The object name.
+                fingerprint ('str') - The fingerprint of the object state.
+            Returns:
+                _ ('tuple(str, list)') - The cached mesh name and material meshes or None.
+        """
+        if key not in self.entries:
+            return None
+        entry_fingerprint, value, byte_size = self.entries[key]
+        if entry_fingerprint != fingerprint:
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, fingerprint, value):
+        """ Add the value to the cache and evict the least recently used entries above the size limit.
+            Args:
+                key ('str') - The object name.
+                fingerprint ('str') - The fingerprint of the object state.
+                value ('tuple(str, list)') - The mesh name and material meshes.
+        """
+        self._remove(key)
+        mesh_name, material_meshes = value
+        byte_size = sum(a.nbytes for _, al_mesh in material_meshes for a in al_mesh.values() if isinstance(a, np.ndarray))
+        self.entries[key] = (fingerprint, value, byte_size)
+        self.byte_size += byte_size
+        self.trim()
+
+    def trim(self):
+        """ Evict the least recently used entries until the cache fits the size limit. """
+        while self.entries and self.byte_size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def clear(self):
+        """ Invalidate all the cached entries. """
+        log.info('Clear export cache: %d objects, %d bytes', len(self.entries), self.byte_size)
+        self.entries.clear()
+        self.byte_size = 0
+
+    def _remove(self, key):
+        if key in self.entries:
+            self.byte_size -= self.entries.pop(key)[2]
+
+
+export_cache = ExportCache()
 
 ### Data3d Export Methods ###
 
 
-def parse_materials(export_objects, export_metadata, export_images, export_dir=None):
+class EvaluatedMeshes:
+    """ The evaluated (modifiers applied, triangulated) meshes of the export. Objects with the same mesh and modifier
+        state share one evaluation, the temporary mesh datablocks are removed as soon as their arrays are read.
+        Use as a context manager, the shared arrays are released on exit.
+        Attributes:
+            scene ('bpy.types.Scene') - The scene the objects are evaluated in.
+            entries ('dict') - The local space loop arrays and loop materials by evaluation key.
+            evaluated ('int') - The number of evaluated meshes.
+            shared ('int') - The number of objects that re-used an evaluated mesh.
+    """
+
+    def __init__(self, context):
+        self.scene = context.scene
+        self.entries = {}
+        self.evaluated = 0
+        self.shared = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.evaluated:
+            log.debug('Evaluated meshes: %d, shared: %d', self.evaluated, self.shared)
+        self.entries.clear()
+        return False
+
+    @staticmethod
+    def get_key(obj):
+        """ Get the key of the evaluated mesh of the object: the mesh datablock and the modifier stack.
+            Modifiers with object targets depend on the relative transform, the world matrix is part of their key.
+            Args:
+                obj ('bpy.types.Object') - The exported object.
+            Returns:
+                _ ('tuple') - The evaluation key.
+        """
+        modifiers = tuple(get_rna_values(modifier) for modifier in obj.modifiers)
+        matrix = None
+        if any(has_object_pointers(modifier) for modifier in obj.modifiers):
+            matrix = tuple(tuple(row) for row in obj.matrix_world)
+        return obj.data.name, modifiers, matrix
+
+    def get(self, obj):
+        """ Get the local space loop arrays and loop materials of the object, evaluate the mesh if needed.
+            Args:
+                obj ('bpy.types.Object') - The exported object.
+            Returns:
+                mesh_arrays ('dict') - The flat per loop arrays (see get_loop_arrays), must not be modified.
+                loop_materials ('numpy.ndarray') - The material slot index per loop.
+        """
+        key = self.get_key(obj)
+        if key in self.entries:
+            self.shared += 1
+            return self.entries[key]
+
+        log.debug('Transforming object into mesh: %s', obj.name)
+        mesh = obj.to_mesh(self.scene, apply_modifiers=True, settings='RENDER')
+        try:
+            triangulate_mesh(mesh)
+            entry = self.entries[key] = (get_loop_arrays(mesh), get_loop_materials(mesh))
+        finally:
+            D.meshes.remove(mesh, do_unlink=True)
+        self.evaluated += 1
+        return entry
+
+
+def get_rna_values(struct):
+    """ Get the printable property values of a bpy struct, pointers by name. Object pointers include the world
+        matrix of the object.
+        Args:
+            struct ('bpy.types.bpy_struct') - The struct, e.g. a modifier.
+        Returns:
+            _ ('str') - The property values.
+    """
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.identifier == 'rna_type' or prop.type == 'COLLECTION':
+            continue
+        value = getattr(struct, prop.identifier, None)
+        if prop.type == 'POINTER':
+            if isinstance(value, bpy.types.Object):
+                # Modifier target objects change the evaluated mesh with their transform
+                value = (value.name, [tuple(row) for row in value.matrix_world])
+            else:
+                value = getattr(value, 'name', None)
+        elif getattr(prop, 'array_length', 0) > 0:
+            value = tuple(value)
+        values.append((prop.identifier, value))
+    return repr(values)
+
+
+def has_object_pointers(struct):
+    """ Return True if the struct references an object, e.g. a boolean or mirror modifier target. """
+    return any(prop.type == 'POINTER' and isinstance(getattr(struct, prop.identifier, None), bpy.types.Object)
+               for prop in struct.bl_rna.properties if prop.identifier != 'rna_type')
+
+
+def triangulate_mesh(mesh):
+    """ Triangulate the mesh in place, meshes with triangles only are left untouched.
+        Args:
+            mesh ('bpy.types.Mesh') - The (temporary) mesh datablock.
+    """
+    loop_total = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loop_total)
+    if np.all(loop_total == 3):
+        return
+
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    bmesh.ops.triangulate(bm, faces=bm.faces)
+    bm.to_mesh(mesh)
+    bm.free()
+    del bm
+
+
+def transform_loop_arrays(mesh_arrays, loop_materials, matrix):
+    """ Transform the local space loop arrays of a triangulated mesh. The normals are transformed with the inverse
+        transpose (see get_normal_matrix), mirroring matrices reverse the triangle winding.
+        Args:
+            mesh_arrays ('dict') - The flat per loop arrays (see get_loop_arrays).
+            loop_materials ('numpy.ndarray') - The material slot index per loop.
+            matrix ('Matrix') - The export matrix of the object.
+        Returns:
+            mesh_arrays ('dict') - The transformed loop arrays.
+            loop_materials ('numpy.ndarray') - The material slot index per (re-ordered) loop.
+    """
+    matrix = np.array(matrix, dtype=np.float64)
+    linear = matrix[:3, :3]
+    transformed = dict(mesh_arrays)
+    positions = mesh_arrays['positions'].reshape(-1, 3).dot(linear.T) + matrix[:3, 3]
+    transformed['positions'] = positions.astype(np.float32).ravel()
+
+    normals = mesh_arrays['normals'].reshape(-1, 3).dot(get_normal_matrix(linear).T)
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0.0] = 1.0
+    transformed['normals'] = (normals / lengths[:, None]).astype(np.float32).ravel()
+
+    if np.linalg.det(linear) < 0.0:
+        for key, size in (('positions', 3), ('normals', 3), ('uvs', 2), ('uvs2', 2)):
+            if key in transformed:
+                transformed[key] = transformed[key].reshape(-1, 3, size)[:, ::-1].ravel()
+        loop_materials = loop_materials.reshape(-1, 3)[:, ::-1].ravel()
+    return transformed, loop_materials
+
+
+def get_file_digest(filepath):
+    """ Return the content digest of the file, cached by path, size and modification time.
+        Args:
+            filepath ('str') - The file path.
+        Returns:
+            _ ('str') - The sha1 hex digest.
+    """
+    stat = os.stat(filepath)
+    key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+    if key not in texture_digests:
+        sha1 = hashlib.sha1()
+        with open(filepath, 'rb') as file:
+            for block in iter(lambda: file.read(TEXTURE_HASH_BLOCK_SIZE), b''):
+                sha1.update(block)
+        texture_digests[key] = sha1.hexdigest()
+    return texture_digests[key]
+
+
+def sync_texture_file(source, dest_path, use_hardlinks=False):
+    """ Copy (or hardlink) the texture file unless the destination has the same content.
+        Args:
+            source ('str', 'bytes') - The source file path or the packed image data.
+            dest_path ('str') - The destination file path.
+        Kwargs:
+            use_hardlinks ('bool') - Hardlink the source file instead of copying it, if possible.
+        Returns:
+            copied ('bool') - True if the file was written, False if it was unchanged.
+            size ('int') - The file size in bytes.
+    """
+    packed = isinstance(source, bytes)
+    size = len(source) if packed else os.path.getsize(source)
+
+    if os.path.exists(dest_path) and os.path.getsize(dest_path) == size:
+        if packed:
+            if hashlib.sha1(source).hexdigest() == get_file_digest(dest_path):
+                return False, size
+        elif os.stat(source).st_mtime_ns == os.stat(dest_path).st_mtime_ns or os.path.samefile(source, dest_path):
+            # Copies keep the modification time of the source
+            return False, size
+        elif get_file_digest(source) == get_file_digest(dest_path):
+            os.utime(dest_path, ns=(os.stat(dest_path).st_atime_ns, os.stat(source).st_mtime_ns))
+            return False, size
+
+    # Write next to the destination and replace it, an interrupted export leaves no partial textures
+    temp_path = dest_path + '.tmp'
+    if packed:
+        with open(temp_path, 'wb') as file:
+            file.write(source)
+    else:
+        linked = False
+        if use_hardlinks:
+            try:
+                os.link(source, temp_path)
+                linked = True
+            except OSError:
+                # Other file system or not supported
+                pass
+        if not linked:
+            shutil.copy2(source, temp_path)
+    os.replace(temp_path, dest_path)
+    return True, size
+
+
+def export_image_textures(bl_images, tex_dir, use_hardlinks=False, workers=None):
+    """ Sync the image textures to the texture directory. Unchanged files (size, modification time, content digest)
+        are skipped, the others are copied on a thread pool, packed images are written from their packed data.
+        Args:
+            bl_images ('list(bpy.types.Image)') - The associated image data blocks.
+            tex_dir ('str') - The texture export directory.
+        Kwargs:
+            use_hardlinks ('bool') - Hardlink the changed files instead of copying them, if possible.
+            workers ('int') - The number of copy threads, number of processors if None.
+        Returns:
+            stats ('dict') - The number and bytes of the copied and skipped files, the number of missing files.
+    """
+    log.debug("Export images %s", " * ".join([img.name for img in bl_images]))
+
+    stats = {'copied': 0, 'copiedBytes': 0, 'skipped': 0, 'skippedBytes': 0, 'missing': 0}
+    sources = OrderedDict()
+    for image in bl_images:
+        if image.packed_file is not None:
+            # Named like the texture reference of get_al_material
+            source = image.packed_file.data
+            dest_path = os.path.join(tex_dir, os.path.basename(image.filepath) or image.name)
+        else:
+            source = image.filepath_from_user()
+            if not os.path.exists(source):
+                log.warn("File does not exist: %s", source)
+                stats['missing'] += 1
+                continue
+            dest_path = os.path.join(tex_dir, os.path.basename(source))
+
+        if dest_path in sources:
+            log.warn("Texture file name used by multiple images, exported once: %s", dest_path)
+            continue
+        sources[dest_path] = source
+
+    if sources and not os.path.exists(tex_dir):
+        os.makedirs(tex_dir)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        results = list(pool.map(lambda item: sync_texture_file(item[1], item[0], use_hardlinks=use_hardlinks),
+                                sources.items()))
+
+    for copied, size in results:
+        key = 'copied' if copied else 'skipped'
+        stats[key] += 1
+        stats[key + 'Bytes'] += size
+
+    log.info('Texture export: %d copied (%.1f MB), %d skipped (%.1f MB), %d missing', stats['copied'],
+             stats['copiedBytes'] / 1048576, stats['skipped'], stats['skippedBytes'] / 1048576, stats['missing'])
+    return stats
+
+
+def create_blender_preview(image_path, preview_path, max_size):
+    """ Downscale the image to the preview with blender, if Pillow is not available.
+        Args:
+            image_path ('str') - The image file path.
+            preview_path ('str') - The preview file path.
+            max_size ('int') - The longest side of the preview in pixels.
+    """
+    image = D.images.load(image_path, check_existing=False)
+    try:
+        width, height = image.size
+        scale = max_size / max(width, height, 1)
+        if scale < 1:
+            image.scale(max(1, int(width * scale)), max(1, int(height * scale)))
+        image.filepath_raw = preview_path
+        image.save()
+    finally:
+        D.images.remove(image)
+    texture_utils.stamp_preview(image_path, preview_path)
+
+
+def export_preview_textures(al_materials, export_dir, workers=None):
+    """ Generate the downscaled preview maps of the exported textures and reference them in the mapXPreview keys.
+        Previews of unchanged textures are not generated again.
+        Args:
+            al_materials ('dict') - The data3d materials dictionary, the preview keys are updated.
+            export_dir ('str') - The exported directory.
+        Kwargs:
+            workers ('int') - The number of preview threads, number of processors if None.
+    """
+    jobs = OrderedDict()
+    preview_keys = []
+    for al_mat in al_materials.values():
+        for map_type in TextureMapTypes:
+            map_key = map_type + D3D.map_suffix_hires
+            if map_key not in al_mat or not al_mat[map_key].startswith(TextureDirectory + '/'):
+                continue
+            image_path = os.path.join(export_dir, al_mat[map_key])
+            if os.path.exists(image_path):
+                jobs[image_path] = preview_path = texture_utils.get_preview_path(image_path)
+                preview_keys.append((al_mat, map_type + D3D.map_suffix_lores, preview_path,
+                                     texture_utils.get_preview_path(al_mat[map_key])))
+
+    jobs = [(image_path, preview_path) for image_path, preview_path in jobs.items()
+            if not texture_utils.is_preview_current(image_path, preview_path)]
+    if texture_utils.Image is not None:
+        texture_utils.create_previews(jobs, workers=workers)
+    else:
+        for image_path, preview_path in jobs:
+            create_blender_preview(image_path, preview_path, texture_utils.PREVIEW_MAX_SIZE)
+
+    # Only reference the previews that were written
+    for al_mat, preview_key, preview_path, relative_preview_path in preview_keys:
+        if os.path.exists(preview_path):
+            al_mat[preview_key] = relative_preview_path
+    log.info('Preview textures: %d generated', len(jobs))
+
+
+def parse_materials(export_objects, export_metadata, export_images, export_dir=None, use_hardlinks=False,
+                    export_previews=False, workers=None):
     """ Parse Blender Materials and translate them to data3d materials.
         Args:
             export_objects ('bpy_prop_collection') - The exported objects.
             export_metadata ('bool') - Export Archilogic Metadata, if it exists.
             export_images ('bool') -  Export associated texture files.
             export_dir ('str') - The exported directory.
+        Kwargs:
+            use_hardlinks ('bool') - Hardlink the changed texture files instead of copying them, if possible.
+            export_previews ('bool') - Generate the preview maps of the exported textures.
+            workers ('int') - The number of texture copy threads, number of processors if None.
         Returns:
             al_materials ('dict') - The data3d materials dictionary.
     """
@@ -45,24 +438,6 @@ def parse_materials(export_objects, export_metadata, export_images, export_dir=N
     bl_materials = []
     raw_images = []
 
-    def export_image_textures(bl_images, dest_dir):
-        """ Copy the image texture to destination directory.
-            Args:
-                bl_images ('list(bpy.types.Image)') - The associated image data blocks.
-                dest_dir ('str') - The texture export directory.
-        """
-        log.debug("Export images %s", " * ".join([img.name for img in bl_images]))
-
-        for image in bl_images:
-            filepath = image.filepath_from_user()
-            if os.path.exists(filepath):
-                tex_dir = os.path.join(dest_dir, TextureDirectory)
-                if not os.path.exists(tex_dir):
-                    os.makedirs(tex_dir)
-                shutil.copy(filepath, os.path.join(tex_dir))
-            else:
-                log.warn("File does not exist: %s", filepath)
-
     for obj in export_objects:
         obj_materials = [slot.material for slot in obj.material_slots if slot.material is not None]
         bl_materials.extend(obj_materials)
@@ -75,93 +450,91 @@ def parse_materials(export_objects, export_metadata, export_images, export_dir=N
 
     if export_images and export_dir:
         # Distinct the List
-        export_image_textures(list(set(raw_images)), export_dir)
+        export_image_textures(list(set(raw_images)), os.path.join(export_dir, TextureDirectory),
+                              use_hardlinks=use_hardlinks, workers=workers)
+        if export_previews:
+            export_preview_textures(al_materials, export_dir, workers=workers)
 
     return al_materials
 
 
-def parse_flattened_geometry(context, export_objects):
+def parse_flattened_geometry(context, export_objects, cache=None, workers=None):
     """ Triangulate the specified mesh, calculate normals & tessfaces, apply export matrix
         Args:
             context ('bpy.types.context') - Current window manager and data context.
             export_objects ('bpy_prop_collection') - The exported objects.
+        Kwargs:
+            cache ('ExportCache') - Re-use the meshes of unchanged objects from the cache.
+            workers ('int') - The number of encoding threads, number of processors if None.
         Returns:
             json_meshes ('dict') - The data3d meshes dictionary.
     """
-    obj_mesh_pairs = [get_obj_mesh_pair(obj, context) for obj in export_objects]
     json_meshes = {}
     default_material = None
     # FIXME rename (json) & fix unclarity
 
-    for obj, bl_mesh in obj_mesh_pairs:
-        log.debug('Parsing blender mesh to json: %s', bl_mesh.name)
-        mesh_materials = [m for m in bl_mesh.materials if m]
-
-        if len(mesh_materials) == 0:
-            # No Material Mesh
-            json_mesh = parse_mesh(bl_mesh)
-            json_mesh[D3D.m_material] = D3D.mat_default
-            if default_material is None:
-                default_material = get_default_al_material()
-            json_meshes[bl_mesh.name] = json_mesh
-        else:
-            for i, bl_mat in enumerate(mesh_materials):
-                faces = [face for face in bl_mesh.polygons if face.material_index == i]
-                if len(faces) > 0:
-                    mat_name = bl_mat.name
-                    json_mesh = parse_mesh(bl_mesh, faces=faces)
-                    json_mesh[D3D.m_material] = mat_name
+    for mesh_name, material_meshes in parse_objects(context, export_objects, cache=cache, workers=workers):
+        log.debug('Parsing blender mesh to json: %s', mesh_name)
+
+        for mat_name, json_mesh in material_meshes:
+            # The meshes can be cache entries, annotate a copy
+            json_mesh = dict(json_mesh)
+            if mat_name is None:
+                # No Material Mesh
+                json_mesh[D3D.m_material] = D3D.mat_default
+                if default_material is None:
+                    default_material = get_default_al_material()
+                json_meshes[mesh_name] = json_mesh
+            else:
+                json_mesh[D3D.m_material] = mat_name
 
-                    json_mesh_name = bl_mesh.name + "-" + mat_name
-                    json_meshes[json_mesh_name] = json_mesh
+                json_mesh_name = mesh_name + "-" + mat_name
+                json_meshes[json_mesh_name] = json_mesh
 
     return json_meshes, default_material
 
 
-def parse_geometry(context, export_objects, al_materials):
+def parse_geometry(context, export_objects, al_materials, cache=None, workers=None):
     """ Triangulate the specified mesh, calculate normals & tessfaces, apply export matrix
         Args:
             context ('bpy.types.context') - Current window manager and data context.
             export_objects ('bpy_prop_collection') - The exported objects.
             al_materials ('dict') - The data3d materials dictionary.
+        Kwargs:
+            cache ('ExportCache') - Re-use the meshes of unchanged objects from the cache.
+            workers ('int') - The number of encoding threads, number of processors if None.
         Returns:
             data3d_objects ('dict') - The data3d objects dictionary.
     """
     # Fixme PARENT - child objects
-    obj_mesh_pairs = [get_obj_mesh_pair(obj, context) for obj in export_objects]
-
     json_objects = []
-    # bl_meshes = [mesh for (obj, mesh) in obj_mesh_pairs]
 
-    for obj, bl_mesh in obj_mesh_pairs:
+    for mesh_name, material_meshes in parse_objects(context, export_objects, cache=cache, workers=workers):
         json_object = OrderedDict()
         # Fixme: export object position & rotation (right now, pos & rot are applied to the mesh when parsed
         # json_object[D3D.o_position] = list(obj.location[0:3])
         # json_object[D3D.o_rotation] = list(obj.rotation_euler[0:3])
 
         json_meshes = OrderedDict()
-        mesh_materials = [m for m in bl_mesh.materials if m]
 
-        if len(mesh_materials) == 0:
+        if material_meshes and material_meshes[0][0] is None:
             # Parse mesh with no material.
-            json_meshes[bl_mesh.name] = parse_mesh(bl_mesh)
+            json_meshes[mesh_name] = material_meshes[0][1]
             json_object[D3D.o_meshes] = json_meshes
 
         else:
             # Parse mesh with one or more materials.
             json_materials = {}
-            for i, bl_mat in enumerate(mesh_materials):
-                faces = [face for face in bl_mesh.polygons if face.material_index == i]
-                if len(faces) > 0:
-                    mat_name = bl_mat.name
-                    json_mesh = parse_mesh(bl_mesh, faces=faces)
-                    json_mesh[D3D.m_material] = mat_name
+            for mat_name, json_mesh in material_meshes:
+                # The meshes can be cache entries, annotate a copy
+                json_mesh = dict(json_mesh)
+                json_mesh[D3D.m_material] = mat_name
 
-                    json_mesh_name = bl_mesh.name + "-" + mat_name
-                    json_meshes[json_mesh_name] = json_mesh
+                json_mesh_name = mesh_name + "-" + mat_name
+                json_meshes[json_mesh_name] = json_mesh
 
-                    if mat_name in al_materials:
-                        json_materials[mat_name] = al_materials[mat_name]
+                if mat_name in al_materials:
+                    json_materials[mat_name] = al_materials[mat_name]
 
             json_object[D3D.o_meshes] = json_meshes
             json_object[D3D.o_materials] = json_materials
@@ -173,28 +546,212 @@ def parse_geometry(context, export_objects, al_materials):
     return json_objects
 
 
-def get_obj_mesh_pair(obj, context):
-        log.debug('Transforming object into mesh: %s', obj.name)
-        mesh = obj.to_mesh(context.scene, apply_modifiers=True, settings='RENDER')
-        mesh.name = obj.name
-        mesh.transform(Matrix.Rotation(-math.pi / 2, 4, 'X') * obj.matrix_world)
+def parse_objects(context, export_objects, cache=None, workers=None):
+    """ Get the data3d meshes of the objects, split by material. The meshes are evaluated and read into raw arrays
+        on the main thread, once per mesh and modifier state (see EvaluatedMeshes). Splitting and gathering the arrays
+        runs on a thread pool while the next objects are evaluated. Unchanged objects are taken from the cache,
+        objects without a fingerprint (see get_object_fingerprint) are always parsed.
+        Args:
+            context ('bpy.types.context') - Current window manager and data context.
+            export_objects ('bpy_prop_collection') - The exported objects.
+        Kwargs:
+            cache ('ExportCache') - The export cache, no caching if None.
+            workers ('int') - The number of encoding threads, number of processors if None.
+        Returns:
+            _ ('list(tuple(str, list))') - The mesh name and material meshes per object, in export_objects order.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        with EvaluatedMeshes(context) as evaluated_meshes:
+            for obj in export_objects:
+                fingerprint = get_object_fingerprint(obj) if cache is not None else None
+                if fingerprint is not None:
+                    cached = cache.get(obj.name, fingerprint)
+                    if cached is not None:
+                        log.debug('Export cache hit: %s', obj.name)
+                        results.append((obj.name, None, cached))
+                        continue
+
+                # bpy data access has to stay on the main thread
+                mesh_data = extract_mesh_data(obj, evaluated_meshes)
+                results.append((obj.name, fingerprint, pool.submit(parse_material_meshes, mesh_data)))
+                del mesh_data
+
+        # Collect the results in a deterministic order
+        for i, (obj_name, fingerprint, value) in enumerate(results):
+            if isinstance(value, Future):
+                value = value.result()
+                if fingerprint is not None:
+                    cache.set(obj_name, fingerprint, value)
+            results[i] = value
+    return results
+
+
+def get_object_fingerprint(obj):
+    """ Fingerprint the export relevant state of the object: mesh datablock, shape keys, modifier stack, world matrix
+        and materials. The modifier target objects are fingerprinted the same way, armatures by their pose.
+        Args:
+            obj ('bpy.types.Object') - The exported object.
+        Returns:
+            _ ('str') - The hex digest of the object state, None if the evaluated mesh depends on data that is not
+                        fingerprinted (e.g. a curve or lattice modifier target) and must not be cached.
+    """
+    digest = hashlib.md5()
+    if not update_object_digest(digest, obj, set()):
+        return None
+    digest.update(repr([slot.material.name if slot.material else None for slot in obj.material_slots]).encode('utf-8'))
+    return digest.hexdigest()
 
-        bm = bmesh.new()
-        bm.from_mesh(mesh)
-        bmesh.ops.triangulate(bm, faces=bm.faces)
-        bm.to_mesh(mesh)
-        bm.free()
-        del bm
 
-        mesh.calc_normals()
-        mesh.calc_tessface()
+def update_object_digest(digest, obj, visited):
+    """ Add the state of the object that changes its evaluated mesh to the digest, modifier targets recursively.
+        Args:
+            digest ('hashlib.md5') - The digest of the exported object.
+            obj ('bpy.types.Object') - The exported object or a modifier target.
+            visited ('set(str)') - The names of the objects already added.
+        Returns:
+            _ ('bool') - False if the object state can not be fingerprinted.
+    """
+    if obj.name in visited:
+        return True
+    visited.add(obj.name)
+    digest.update(repr((obj.name, obj.type, [tuple(row) for row in obj.matrix_world])).encode('utf-8'))
+
+    if obj.type == 'MESH':
+        digest.update(repr((obj.show_only_shape_key, obj.active_shape_key_index)).encode('utf-8'))
+        update_mesh_digest(digest, obj.data)
+    elif obj.type == 'ARMATURE':
+        # Armature modifiers deform with the pose
+        digest.update(repr((obj.data.pose_position,
+                            [[tuple(row) for row in bone.matrix] for bone in obj.pose.bones])).encode('utf-8'))
+    elif obj.type != 'EMPTY':
+        return False
+
+    for modifier in obj.modifiers:
+        digest.update(get_rna_values(modifier).encode('utf-8'))
+        for prop in modifier.bl_rna.properties:
+            target = getattr(modifier, prop.identifier, None) if prop.type == 'POINTER' else None
+            if isinstance(target, bpy.types.Object) and not update_object_digest(digest, target, visited):
+                return False
+    return True
+
+
+def update_mesh_digest(digest, mesh):
+    """ Add the geometry, uvs and shape keys of the mesh to the digest.
+        Args:
+            digest ('hashlib.md5') - The digest of the exported object.
+            mesh ('bpy.types.Mesh') - The mesh datablock.
+    """
+    digest.update(repr((mesh.name, mesh.use_auto_smooth, mesh.auto_smooth_angle)).encode('utf-8'))
+
+    for collection, attribute, size, dtype in [(mesh.vertices, 'co', 3, np.float32),
+                                               (mesh.loops, 'vertex_index', 1, np.int32),
+                                               (mesh.polygons, 'loop_start', 1, np.int32),
+                                               (mesh.polygons, 'material_index', 1, np.int16)]:
+        values = np.empty(len(collection) * size, dtype=dtype)
+        collection.foreach_get(attribute, values)
+        digest.update(values.tobytes())
+
+    use_smooth = [False] * len(mesh.polygons)
+    mesh.polygons.foreach_get('use_smooth', use_smooth)
+    digest.update(bytes(use_smooth))
+
+    for uv_layer in mesh.uv_layers:
+        uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+        uv_layer.data.foreach_get('uv', uvs)
+        digest.update(uv_layer.name.encode('utf-8'))
+        digest.update(uvs.tobytes())
+
+    shape_keys = mesh.shape_keys
+    if shape_keys is not None:
+        digest.update(repr((shape_keys.use_relative, shape_keys.eval_time)).encode('utf-8'))
+        for key_block in shape_keys.key_blocks:
+            relative_key = key_block.relative_key.name if key_block.relative_key else None
+            digest.update(repr((key_block.name, key_block.value, key_block.mute, key_block.interpolation,
+                                key_block.vertex_group, relative_key)).encode('utf-8'))
+            coordinates = np.empty(len(key_block.data) * 3, dtype=np.float32)
+            key_block.data.foreach_get('co', coordinates)
+            digest.update(coordinates.tobytes())
+
+
+def extract_mesh_data(obj, evaluated_meshes):
+    """ Evaluate the object mesh and read the raw arrays needed for the export.
+        Args:
+            obj ('bpy.types.Object') - The exported object.
+            evaluated_meshes ('EvaluatedMeshes') - The evaluated meshes of the export.
+        Returns:
+            mesh_data ('dict') - The mesh name, the flat loop arrays, the loop material indices and material names.
+    """
+    mesh_arrays, loop_materials = evaluated_meshes.get(obj)
+    mesh_arrays, loop_materials = transform_loop_arrays(mesh_arrays, loop_materials,
+                                                        Matrix.Rotation(-math.pi / 2, 4, 'X') * obj.matrix_world)
+    return {
+        'name': obj.name,
+        'arrays': mesh_arrays,
+        'loop_materials': loop_materials,
+        'materials': [slot.material.name if slot.material else None for slot in obj.material_slots]
+    }
+
+
+def parse_material_meshes(mesh_data):
+    """ Parse the raw mesh arrays into one data3d mesh per used material slot.
+        The loops are grouped per material slot with a stable sort, so the mesh data is partitioned in a single pass.
+        Does not access bpy data and can run on a worker thread.
+        Args:
+            mesh_data ('dict') - The raw mesh data (see extract_mesh_data).
+        Returns:
+            mesh_name ('str') - The name of the evaluated mesh.
+            material_meshes ('list(tuple(str, dict))') - The material name and data3d mesh pairs.
+                                  The material name is None for meshes without materials.
+    """
+    mesh_arrays = mesh_data['arrays']
+    materials = mesh_data['materials']
+
+    if not any(materials):
+        return mesh_data['name'], [(None, parse_mesh(mesh_arrays))]
+
+    material_meshes = []
+    for slot, loop_indices in split_loops_by_material(mesh_data['loop_materials']):
+        if slot < len(materials) and materials[slot]:
+            material_meshes.append((materials[slot], parse_mesh(mesh_arrays, loop_indices=loop_indices)))
+    return mesh_data['name'], material_meshes
+
+
+def get_loop_materials(bl_mesh):
+    """ Read the material index of the polygon of each loop.
+        Args:
+            bl_mesh ('bpy.types.Mesh') - The mesh data block.
+        Returns:
+            loop_materials ('numpy.ndarray') - The material slot index per loop.
+    """
+    n_polygons = len(bl_mesh.polygons)
+    material_index = np.empty(n_polygons, dtype=np.int16)
+    loop_total = np.empty(n_polygons, dtype=np.int32)
+    bl_mesh.polygons.foreach_get('material_index', material_index)
+    bl_mesh.polygons.foreach_get('loop_total', loop_total)
 
-        return (obj, mesh)
+    loop_materials = np.empty(len(bl_mesh.loops), dtype=np.int16)
+    loop_materials[get_polygon_loop_indices(bl_mesh, np.arange(n_polygons))] = np.repeat(material_index, loop_total)
+    return loop_materials
 
 
-def parse_mesh(bl_mesh, faces=None):
+def split_loops_by_material(loop_materials):
+    """ Group the loop indices by the material index of their polygon.
+        Args:
+            loop_materials ('numpy.ndarray') - The material slot index per loop.
+        Returns:
+            _ ('list(tuple(int, numpy.ndarray))') - The material slot index and the loop indices of its polygons.
+    """
+    # A stable sort keeps the original polygon order within each material
+    order = np.argsort(loop_materials, kind='stable')
+    slots, starts = np.unique(loop_materials[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    return [(int(slot), order[start:end]) for slot, start, end in zip(slots, starts, ends)]
+
+
+def parse_mesh(mesh_arrays, loop_indices=None):
         """
-            Parses a blender mesh into data3d arrays
+            Parses the loop arrays of a blender mesh into data3d arrays
             Example:
 
             Non-interleaved: (data3d.json)
@@ -207,61 +764,28 @@ def parse_mesh(bl_mesh, faces=None):
                 (... TODO)
 
             Args:
-                bl_mesh ('bpy.types.Mesh') - The mesh data block to parse.
+                mesh_arrays ('dict') - The flat per loop arrays of the mesh (see get_loop_arrays).
             Kwargs:
-                faces ('list(bpy.types.MeshPolygon)') - The subset of polygons to parse.
+                loop_indices ('numpy.ndarray') - The subset of loops to parse.
             Returns:
                 al_mesh ('dict') - The data3d mesh dictionary.
         """
-
-        # UV Textures by name
-        # FIXME Tessface uv Textures vs. Mesh.polygon for normals
-        # FIXME triangulate
         # FIXME if channel names do not apply, get 1 channel as uv and 2nd channel as lightmap Uv
-        texture_uvs = bl_mesh.tessface_uv_textures.get('UVMap')
-        lightmap_uvs = bl_mesh.tessface_uv_textures.get('UVLightmap')
-
-        if faces is None:
-            faces = bl_mesh.polygons
-
-        _vertices = []
-        _normals = []
-        _uvs = []
-        _uvs2 = []
-
-        # Used for split normals export
-        face_index_pairs = [(face, index) for index, face in enumerate(faces)]
-        # FIXME What does calc_normals split do for custom vertex normals?
-        bl_mesh.calc_normals_split()
-        loops = bl_mesh.loops
-
-        for face, face_index in face_index_pairs:
-            # gather the face vertices
-            face_vertices = [bl_mesh.vertices[v] for v in face.vertices]
-            face_vertices_length = len(face_vertices)
-
-            vertices = [(v.co.x, v.co.y, v.co.z) for v in face_vertices]
-            normals = [(loops[l_idx].normal.x, loops[l_idx].normal.y, loops[l_idx].normal.z) for l_idx in face.loop_indices]
-
-            uvs = [None] * face_vertices_length
-            uvs2 = [None] * face_vertices_length
-
-            if texture_uvs:
-                uv_layer = texture_uvs.data[face.index].uv
-                uvs = [(uv[0], uv[1]) for uv in uv_layer]
-
-            if lightmap_uvs:
-                uv_layer = lightmap_uvs.data[face.index].uv
-                uvs2 = [(uv[0], uv[1]) for uv in uv_layer]
-
-            _vertices += vertices
-            _normals += normals
-            _uvs += uvs
-            _uvs2 += uvs2
+        def gather(values, size):
+            """ Gather the per loop values of the selected loops into a flat array.
+                Args:
+                    values ('numpy.ndarray') - The flat per loop values.
+                    size ('int') - The number of components per loop.
+                Returns:
+                    _ ('numpy.ndarray') - The flat float32 array of gathered values.
+            """
+            if loop_indices is not None:
+                values = values.reshape(-1, size)[loop_indices]
+            return values.ravel()
 
         al_mesh = OrderedDict()
-        al_mesh[D3D.v_coords] = unpack_list(_vertices)
-        al_mesh[D3D.v_normals] = unpack_list(_normals)
+        al_mesh[D3D.v_coords] = gather(mesh_arrays['positions'], 3)
+        al_mesh[D3D.v_normals] = gather(mesh_arrays['normals'], 3)
 
         # temp
         al_mesh[D3D.m_position] = [0.0, ]*3  #list(obj.location[0:3])
@@ -269,16 +793,75 @@ def parse_mesh(bl_mesh, faces=None):
         al_mesh['rotDeg'] = [0.0, ]*3
         al_mesh['scale'] = [1.0, ]*3
 
-        if texture_uvs:
-            al_mesh[D3D.uv_coords] = unpack_list(_uvs)
+        if 'uvs' in mesh_arrays:
+            al_mesh[D3D.uv_coords] = gather(mesh_arrays['uvs'], 2)
 
-        if lightmap_uvs:
-            al_mesh[D3D.uv2_coords] = unpack_list(_uvs2)
+        if 'uvs2' in mesh_arrays:
+            al_mesh[D3D.uv2_coords] = gather(mesh_arrays['uvs2'], 2)
 
         return al_mesh
 
 
-def _write(context, export_path, global_matrix, export_selection_only, export_images, export_format, export_al_metadata):
+def get_loop_arrays(bl_mesh):
+    """ Read the per loop vertex data of the mesh into flat float32 arrays with foreach_get.
+        Args:
+            bl_mesh ('bpy.types.Mesh') - The mesh data block to read.
+        Returns:
+            mesh_arrays ('dict') - The flat per loop arrays: positions, normals and optional uvs, uvs2.
+    """
+    # FIXME What does calc_normals split do for custom vertex normals?
+    bl_mesh.calc_normals_split()
+    n_vertices = len(bl_mesh.vertices)
+    n_loops = len(bl_mesh.loops)
+
+    coords = np.empty(n_vertices * 3, dtype=np.float32)
+    bl_mesh.vertices.foreach_get('co', coords)
+    loop_vertex_indices = np.empty(n_loops, dtype=np.int32)
+    bl_mesh.loops.foreach_get('vertex_index', loop_vertex_indices)
+    normals = np.empty(n_loops * 3, dtype=np.float32)
+    bl_mesh.loops.foreach_get('normal', normals)
+
+    mesh_arrays = {
+        'positions': coords.reshape(-1, 3)[loop_vertex_indices].ravel(),
+        'normals': normals
+    }
+
+    # UV layers by name
+    for key, layer_name in (('uvs', 'UVMap'), ('uvs2', 'UVLightmap')):
+        uv_layer = bl_mesh.uv_layers.get(layer_name)
+        if uv_layer:
+            uvs = np.empty(n_loops * 2, dtype=np.float32)
+            uv_layer.data.foreach_get('uv', uvs)
+            mesh_arrays[key] = uvs
+
+    return mesh_arrays
+
+
+def get_polygon_loop_indices(bl_mesh, poly_indices):
+    """ Get the loop indices of the specified polygons, in polygon order.
+        Args:
+            bl_mesh ('bpy.types.Mesh') - The mesh data block.
+            poly_indices ('numpy.ndarray') - The polygon indices.
+        Returns:
+            _ ('numpy.ndarray') - The loop indices of the polygons.
+    """
+    n_polygons = len(bl_mesh.polygons)
+    loop_start = np.empty(n_polygons, dtype=np.int32)
+    loop_total = np.empty(n_polygons, dtype=np.int32)
+    bl_mesh.polygons.foreach_get('loop_start', loop_start)
+    bl_mesh.polygons.foreach_get('loop_total', loop_total)
+
+    starts = loop_start[poly_indices]
+    totals = loop_total[poly_indices]
+    # Offset of each loop within its polygon
+    loop_offsets = np.arange(totals.sum(), dtype=np.int32) - np.repeat(np.cumsum(totals) - totals, totals)
+    return np.repeat(starts, totals) + loop_offsets
+
+
+def _write(context, export_path, global_matrix, export_selection_only, export_images, export_format, export_al_metadata,
+           compact_payload=False, aligned_buffer=False, use_cache=False, cache_size=1024, workers=None,
+           track_memory=False, memory_report_path='', use_hardlinks=False, export_previews=False, codec=CODEC_GZIP,
+           compression_level=None, seekable=False):
     """ Export the scene as an Archilogic Data3d File
         Args:
             context ('bpy.types.context') - Current window manager and data context.
@@ -288,7 +871,22 @@ def _write(context, export_path, global_matrix, export_selection_only, export_im
             export_images ('bool') - Export associated texture files.
             export_format ('int') - Export interleaved (buffer, 0) or non-interleaved (json, 1).
             export_al_metadata ('bool') - Export Archilogic Metadata, if it exists.
+        Kwargs:
+            compact_payload ('bool') - Export the buffer with a quantized payload (version 2).
+            aligned_buffer ('bool') - Export the buffer with a utf-8 structure and a 16-byte aligned payload (version 3).
+            use_cache ('bool') - Re-use the meshes of unchanged objects from previous exports.
+            cache_size ('int') - The export cache size limit in megabytes.
+            workers ('int') - The number of encoding threads, number of processors if None.
+            track_memory ('bool') - Log and write a memory report of the export stages.
+            memory_report_path ('str') - The memory report file, named after the data3d file in the temp directory
+                                         if empty.
+            use_hardlinks ('bool') - Hardlink the changed texture files instead of copying them, if possible.
+            export_previews ('bool') - Generate the downscaled preview maps of the exported textures.
+            codec ('str') - The compression codec of the data3d.buffer file. Enum {'none', 'gzip', 'zlib', 'xz'}
+            compression_level ('int') - The compression level (xz preset) 0-9, the codec default if None.
+            seekable ('bool') - Write the data3d.buffer as the seekable container (independently compressed blocks).
     """
+    memory_tracker = MemoryTracker(enabled=track_memory)
     # Fixme: use global matrix from param export_global_matrix
     try:
         output_path = export_path
@@ -310,22 +908,43 @@ def _write(context, export_path, global_matrix, export_selection_only, export_im
         data3d[D3D.o_rotation] = [0, ] * 3
         data3d['rotDeg'] = [0, ] * 3
 
-        materials = parse_materials(export_objects, export_al_metadata, export_images, export_dir=os.path.dirname(output_path))
+        cache = None
+        if use_cache:
+            cache = export_cache
+            cache.max_bytes = cache_size * 1024 * 1024
+            cache.trim()
+
+        with memory_tracker.stage('material_export'):
+            materials = parse_materials(export_objects, export_al_metadata, export_images, export_dir=os.path.dirname(output_path),
+                                        use_hardlinks=use_hardlinks, export_previews=export_previews, workers=workers)
+
+        with memory_tracker.stage('geometry_export'):
+            if to_buffer:
+                data3d[D3D.o_meshes], default_material = parse_flattened_geometry(context, export_objects, cache=cache, workers=workers)
+                if default_material:
+                    materials[D3D.mat_default] = default_material
+                data3d[D3D.o_materials] = materials
+            else:
+                #Fixme: add functionality to parse parent-child hierarchy for data3d.json
+                #data3d[D3D.o_meshes] = {}
+                #data3d[D3D.o_materials]
+                data3d[D3D.o_children] = parse_geometry(context, export_objects, materials, cache=cache, workers=workers)
 
-        if to_buffer:
-            data3d[D3D.o_meshes], default_material = parse_flattened_geometry(context, export_objects)
-            if default_material:
-                materials[D3D.mat_default] = default_material
-            data3d[D3D.o_materials] = materials
+        if aligned_buffer:
+            version = VERSION_ALIGNED
         else:
-            #Fixme: add functionality to parse parent-child hierarchy for data3d.json
-            #data3d[D3D.o_meshes] = {}
-            #data3d[D3D.o_materials]
-            data3d[D3D.o_children] = parse_geometry(context, export_objects, materials)
+            version = VERSION_COMPACT if compact_payload else VERSION
+        with memory_tracker.stage('serialization'):
+            serialize_data3d(export_data, output_path, to_buffer=to_buffer, version=version, compact=compact_payload,
+                             workers=workers, codec=codec, compression_level=compression_level, seekable=seekable)
 
-        serialize_data3d(export_data, output_path, to_buffer=to_buffer)
+        memory_tracker.stop()
+        if track_memory:
+            memory_tracker.log_report()
+            memory_tracker.write_report(MemoryTracker.get_report_path(output_path, memory_report_path))
 
     except:
+        memory_tracker.stop()
         raise Exception('Export Scene failed. ', sys.exc_info())
 
 
@@ -338,8 +957,21 @@ def save(context,
             filepath ('str') - The filepath to the data3d file.
             use_selection ('bool') - Export selected objects only.
             export_images ('bool') - Export associated texture files.
+            link_textures ('bool') - Hardlink the changed texture files instead of copying them, if possible.
+            export_previews ('bool') - Generate the downscaled preview maps of the exported textures.
             export_mode ('int') - Export interleaved (buffer, 0) or non-interleaved (json, 1).
             export_al_metadata ('bool') - Export Archilogic Metadata, if it exists.
+            compact_payload ('bool') - Export the buffer with a quantized payload (version 2).
+            aligned_buffer ('bool') - Export the buffer with a utf-8 structure and a 16-byte aligned payload (version 3).
+            compression ('str') - The compression codec of the buffer. Enum {'gzip', 'zlib', 'xz', 'none'}
+            compression_level ('int') - The compression level (xz preset) 0-9, -1 uses the codec default.
+            seekable_buffer ('bool') - Write the buffer as the seekable container (independently compressed blocks).
+            use_export_cache ('bool') - Re-use the meshes of unchanged objects from previous exports.
+            export_cache_size ('int') - The export cache size limit in megabytes.
+            export_threads ('int') - The number of encoding threads, 0 uses the number of processors.
+            track_memory ('bool') - Log and write a memory report of the export stages.
+            memory_report_path ('str') - The memory report file, named after the data3d file in the temp directory
+                                         if empty.
             global_matrix ('Matrix') - The target world matrix.
     """
     if args['config_logger']:
@@ -350,6 +982,18 @@ def save(context,
            export_selection_only=args['use_selection'],
            export_images=args['export_images'],
            export_format=args['export_format'],
-           export_al_metadata=args['export_al_metadata'])
+           export_al_metadata=args['export_al_metadata'],
+           compact_payload=args.get('compact_payload', False),
+           aligned_buffer=args.get('aligned_buffer', False),
+           use_cache=args.get('use_export_cache', False),
+           cache_size=args.get('export_cache_size', 1024),
+           workers=args.get('export_threads', 0) or None,
+           track_memory=args.get('track_memory', False),
+           memory_report_path=args.get('memory_report_path', ''),
+           use_hardlinks=args.get('link_textures', False),
+           export_previews=args.get('export_previews', False),
+           codec=args.get('compression', CODEC_GZIP),
+           compression_level=args.get('compression_level', -1),
+           seekable=args.get('seekable_buffer', False))
 
     return {'FINISHED'}
@@ -1,4 +1,5 @@
 import os
+import json
 import logging
 
 import bpy
@@ -13,6 +14,10 @@ O = bpy.ops
 
 log = logging.getLogger('archilogic')
 
+# ID property of the materials imported for one render engine: the data3d source and options to create the setup of
+# the other engine when the render engine is toggled, stored as json
+DEFERRED_SETUP_KEY = 'd3d_deferred_setup'
+
 
 class Material:
     """
@@ -22,7 +27,7 @@ class Material:
             bl_material
     """
 
-    def __init__(self, key, al_material, import_metadata, working_dir, place_holder_images):
+    def __init__(self, key, al_material, import_metadata, working_dir, place_holder_images, render_engine='BOTH'):
         """ Return a Material object. Import data3d materials and translate them to Blender Internal & Cycles materials
         Args:
             key ('str') - The hashed material key. Used for naming the material.
@@ -31,6 +36,9 @@ class Material:
                                       Enum {'NONE', 'BASIC', 'ADVANCED' }
             working_dir ('str') - The source directory of the data3d file, used for recursive image search.
             place_holder_images ('bool') - Import place-holder images if source is not available.
+        Kwargs:
+            render_engine ('str') - Create the setup of this render engine only, the setup of the other engine is
+                                    created when the engine is toggled. Enum {'BOTH', 'BLENDER_RENDER', 'CYCLES'}
         """
         self.al_material = al_material
         self.al_material_hash = key
@@ -39,11 +47,23 @@ class Material:
         #Fixme: This is a workaround for #9620
         self.add_lead_slash()
 
+        # Import Archilogic Material Datablock (FIXME check PropertyGroup)
+        if import_metadata == 'BASIC' or import_metadata == 'ADVANCED':
+            self.bl_material[D3D.bl_meta] = self.al_material
+
         # Create Blender Material
-        create_blender_material(self.al_material, self.bl_material, working_dir, import_metadata, place_holder_images)
+        if render_engine != 'CYCLES':
+            create_blender_material(self.al_material, self.bl_material, working_dir, place_holder_images)
 
         # Create Cycles Material
-        create_cycles_material(self.al_material, self.bl_material, working_dir, place_holder_images)
+        if render_engine != 'BLENDER_RENDER':
+            create_cycles_material(self.al_material, self.bl_material, working_dir, place_holder_images)
+
+        if render_engine != 'BOTH':
+            self.bl_material[DEFERRED_SETUP_KEY] = json.dumps({'engine': render_engine,
+                                                               'material': self.al_material,
+                                                               'workingDir': working_dir,
+                                                               'placeHolderImages': place_holder_images})
 
     def get_bake_nodes(self):
         add_lightmap = self.al_material[D3D.add_lightmap] if D3D.add_lightmap in self.al_material else True
@@ -103,24 +123,18 @@ class Material:
             return fallback
 
 
-def create_blender_material(al_mat, bl_mat, working_dir, import_metadata, place_holder_images):
+def create_blender_material(al_mat, bl_mat, working_dir, place_holder_images):
     """ Create the blender material
         Args:
             al_mat ('dict') - The data3d Material source.
             bl_mat ('bpy.types.Material') - The Blender Material datablock.
             working_dir ('str') - The source directory of the data3d file, used for recursive image search.
-            import_metadata ('str') - Import Archilogic json-material as blender-material metadata.
-                                      Enum {'NONE', 'BASIC', 'ADVANCED' }
             place_holder_images ('bool') - Import place-holder images if source is not available.
     """
     # Override default material settings
     bl_mat.diffuse_intensity = 1
     bl_mat.specular_intensity = 1
 
-    # Import Archilogic Material Datablock (FIXME check PropertyGroup)
-    if import_metadata == 'BASIC' or import_metadata == 'ADVANCED':
-        bl_mat[D3D.bl_meta] = al_mat
-
     if D3D.col_diff in al_mat:
         bl_mat.diffuse_color = al_mat[D3D.col_diff]
     else:
@@ -178,7 +192,6 @@ def create_cycles_material(al_mat, bl_mat, working_dir, place_holder_images):
     }
 
     # Setup Cycles Material and remove all nodes.
-    C.scene.render.engine = 'CYCLES'
     bl_mat.use_nodes = True
     node_tree = bl_mat.node_tree
     for node in node_tree.nodes:
@@ -439,9 +452,9 @@ def get_al_material(bl_mat, tex_subdir, from_metadata=False):
                 elif tex_slot.use_map_alpha:
                     al_mat[D3D.map_alpha] = tex_subdir + file
                 elif tex_slot.use_map_emit:
+                    # The preview key is only set for generated previews, see export_preview_textures
                     al_mat[D3D.map_light + D3D.map_suffix_hires] = tex_subdir + file
                     al_mat[D3D.map_light + D3D.map_suffix_source] = tex_subdir + file
-                    al_mat[D3D.map_light + D3D.map_suffix_lores] = tex_subdir + file
                 # FIXME get Lightmap texture set
                 else:
                     log.info('Texture type not supported for export: %s', file)
@@ -457,10 +470,37 @@ def get_default_al_material():
     return al_mat
 
 
+def create_deferred_materials(render_engine):
+    """ Create the missing setups of the materials imported for the other render engine.
+        Args:
+            render_engine ('str') - The render engine. Enum {'BLENDER_RENDER', 'CYCLES'}
+    """
+    for bl_mat in D.materials:
+        if DEFERRED_SETUP_KEY not in bl_mat:
+            continue
+        deferred_setup = json.loads(bl_mat[DEFERRED_SETUP_KEY])
+        if deferred_setup['engine'] == render_engine:
+            continue
+        del bl_mat[DEFERRED_SETUP_KEY]
+        # The material values are tuples, see import_data3d_materials
+        al_mat = {key: tuple(value) if isinstance(value, list) else value
+                  for key, value in deferred_setup['material'].items()}
+        working_dir = deferred_setup['workingDir']
+        place_holder_images = deferred_setup['placeHolderImages']
+        if render_engine == 'CYCLES':
+            if 'archilogic-basic' not in D.node_groups:
+                import_material_node_groups()
+            create_cycles_material(al_mat, bl_mat, working_dir, place_holder_images)
+        else:
+            create_blender_material(al_mat, bl_mat, working_dir, place_holder_images)
+        log.debug('Created the deferred %s material: %s', render_engine, bl_mat.name)
+
+
 def toggle_render_engine():
     cycles_engine = 'CYCLES'
     blender_engine = 'BLENDER_RENDER'
     use_cycles = True if C.scene.render.engine == blender_engine else False
+    create_deferred_materials(cycles_engine if use_cycles else blender_engine)
     for mat in bpy.data.materials:
         mat.use_nodes = use_cycles
     bpy.context.scene.render.engine = cycles_engine if use_cycles else blender_engine
@@ -0,0 +1,89 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    # Optional, the exporter falls back to blender's image scaling
+    Image = None
+
+
+log = logging.getLogger('archilogic')
+
+# Longest side of the preview (low-res) texture maps in pixels
+PREVIEW_MAX_SIZE = 256
+PREVIEW_SUFFIX = '-preview'
+
+
+def get_preview_path(image_path):
+    """ Return the path of the preview map of the image, next to the image.
+        Args:
+            image_path ('str') - The image file path.
+        Returns:
+            _ ('str') - The preview file path.
+    """
+    stem, ext = os.path.splitext(image_path)
+    return stem + PREVIEW_SUFFIX + ext
+
+
+def is_preview_current(image_path, preview_path):
+    """ Return True if the preview was generated from the current image, previews carry the modification time of
+        their image.
+        Args:
+            image_path ('str') - The image file path.
+            preview_path ('str') - The preview file path.
+        Returns:
+            _ ('bool') - The preview exists and is up to date.
+    """
+    return os.path.exists(preview_path) and os.stat(preview_path).st_mtime_ns == os.stat(image_path).st_mtime_ns
+
+
+def stamp_preview(image_path, preview_path):
+    """ Give the preview the modification time of its image, see is_preview_current.
+        Args:
+            image_path ('str') - The image file path.
+            preview_path ('str') - The preview file path.
+    """
+    stat = os.stat(image_path)
+    os.utime(preview_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def _create_preview(image_path, preview_path, max_size):
+    """ Downscale the image to the preview, runs on a worker thread.
+        Args:
+            image_path ('str') - The image file path.
+            preview_path ('str') - The preview file path.
+            max_size ('int') - The longest side of the preview in pixels.
+        Returns:
+            _ ('str') - The preview file path.
+    """
+    temp_path = preview_path + '.tmp'
+    with Image.open(image_path) as image:
+        image_format = image.format
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        image.save(temp_path, format=image_format)
+    os.replace(temp_path, preview_path)
+    stamp_preview(image_path, preview_path)
+    return preview_path
+
+
+def create_previews(jobs, max_size=PREVIEW_MAX_SIZE, workers=None):
+    """ Downscale the images to their previews in parallel. Requires Pillow (Image is not None).
+        The previews are created on threads, Pillow releases the GIL while decoding, resampling and encoding. Worker
+        processes would fork or spawn blender.
+        Args:
+            jobs ('list(tuple)') - The image and preview file paths.
+        Kwargs:
+            max_size ('int') - The longest side of the previews in pixels.
+            workers ('int') - The number of workers, number of processors if None.
+        Returns:
+            _ ('list(str)') - The created preview file paths.
+    """
+    if not jobs:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_create_preview, image_path, preview_path, max_size)
+                   for image_path, preview_path in jobs]
+        return [future.result() for future in futures]
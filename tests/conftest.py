@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The data3d utilities run without blender, the package __init__ requires bpy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'io_scene_data3d'))
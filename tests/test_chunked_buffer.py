@@ -0,0 +1,120 @@
+import os
+import struct
+
+import numpy as np
+import pytest
+
+import data3d_utils
+from data3d_utils import D3D
+
+BLOCK_SIZE = 64
+
+
+@pytest.fixture
+def container(tmp_path):
+    head = bytes(range(40))
+    payload = os.urandom(10 * BLOCK_SIZE + 17)
+    path = str(tmp_path / 'raw.chunked')
+    data3d_utils._write_chunked_buffer(path, head, payload, block_size=BLOCK_SIZE)
+    return path, head + payload
+
+
+@pytest.mark.parametrize('start, stop', [(0, 10), (0, 40), (30, 50), (40, 40 + BLOCK_SIZE), (100, 500),
+                                         (39, 41), (0, None), (-20, None), (-700, -100), (500, 100)])
+def test_slices_match_the_uncompressed_bytes(container, start, stop):
+    path, raw = container
+    with data3d_utils.ChunkedBuffer(path) as buffer:
+        assert len(buffer) == len(raw)
+        assert buffer[start:stop] == raw[start:stop]
+
+
+def test_indexing(container):
+    path, raw = container
+    with data3d_utils.ChunkedBuffer(path) as buffer:
+        for index in (0, 39, 40, 41, 300, len(raw) - 1, -1, -2, -len(raw)):
+            assert buffer[index] == raw[index]
+        for index in (len(raw), len(raw) + 5, -len(raw) - 1):
+            with pytest.raises(IndexError):
+                buffer[index]
+
+
+def test_read_and_block_cache(container):
+    path, raw = container
+    with data3d_utils.ChunkedBuffer(path, cache_blocks=2) as buffer:
+        assert buffer.read(30) == raw[:30]
+        assert buffer.read(100) == raw[30:130]
+        assert buffer.read() == raw[130:]
+        assert buffer.read(10) == b''
+        blocks_read = buffer.blocks_read
+        assert buffer[-5:] == raw[-5:]
+        assert buffer.blocks_read == blocks_read
+        buffer[40:41]
+        assert buffer.blocks_read == blocks_read + 1
+
+
+def test_close(container):
+    path, _ = container
+    buffer = data3d_utils.ChunkedBuffer(path)
+    with buffer:
+        pass
+    assert buffer._file.closed
+    with pytest.raises(ValueError):
+        buffer[100:200]
+
+
+@pytest.fixture
+def opened_buffers(monkeypatch):
+    """ Record the containers opened by the data3d utilities. """
+    buffers = []
+
+    class RecordingBuffer(data3d_utils.ChunkedBuffer):
+        def __init__(self, *args, **kwargs):
+            super(RecordingBuffer, self).__init__(*args, **kwargs)
+            buffers.append(self)
+
+    monkeypatch.setattr(data3d_utils, 'ChunkedBuffer', RecordingBuffer)
+    return buffers
+
+
+def write_mesh(tmp_path, seekable=True):
+    positions = np.random.RandomState(0).rand(300 * 9).astype(np.float32)
+    mesh = {D3D.v_coords: positions, D3D.v_normals: np.tile(np.float32([0, 0, 1]), 300 * 3)}
+    data3d = {D3D.r_container: {D3D.o_meshes: {'m': mesh}}}
+    path = str(tmp_path / ('m.data3d.buffer' + ('.chunked' if seekable else '')))
+    return data3d_utils._to_data3d_buffer(data3d, path, compress_file=True, seekable=seekable), positions
+
+
+def test_inspect_and_validate_close_the_container(tmp_path, opened_buffers):
+    path, _ = write_mesh(tmp_path)
+    summary = data3d_utils.inspect_data3d(path)
+    assert summary['seekable'] and summary['vertexCount'] == 900
+    assert data3d_utils.validate_data3d(path)['valid']
+    assert opened_buffers and all(buffer._file.closed for buffer in opened_buffers)
+
+
+def test_deserialized_meshes_decode_from_the_container(tmp_path, opened_buffers):
+    path, positions = write_mesh(tmp_path)
+    data3d_objects = data3d_utils._from_data3d_buffer(path)
+    root = data3d_objects[-1]
+    mesh = root.mesh_references['m']
+    decoded = root._get_attribute_from_buffer(mesh, D3D.b_coords_offset, D3D.b_coords_length, D3D.b_coords_encoding)
+    assert np.array_equal(decoded.ravel(), positions)
+    buffers = data3d_utils.get_seekable_buffers(data3d_objects)
+    assert buffers == opened_buffers
+    for buffer in buffers:
+        buffer.close()
+    assert opened_buffers[0]._file.closed
+
+
+def test_invalid_container_is_closed(tmp_path, opened_buffers):
+    path, _ = write_mesh(tmp_path, seekable=False)
+    with data3d_utils._DecompressingReader(open(path, 'rb'), data3d_utils.CODEC_GZIP) as f:
+        raw = f.read()
+    # The header announces more payload than the container holds
+    head = raw[:12] + struct.pack('<i', struct.unpack('<i', raw[12:16])[0] + 4) + raw[16:]
+    structure_length = struct.unpack('<i', raw[8:12])[0]
+    chunked_path = str(tmp_path / 'invalid.data3d.buffer.chunked')
+    data3d_utils._write_chunked_buffer(chunked_path, head[:16 + structure_length], head[16 + structure_length:])
+    with pytest.raises(Exception, match='Wrong buffer size'):
+        data3d_utils._from_data3d_buffer(chunked_path)
+    assert len(opened_buffers) == 1 and opened_buffers[0]._file.closed
@@ -0,0 +1,46 @@
+import numpy as np
+
+import data3d_utils
+
+
+def mesh_arrays():
+    # Two triangles of a quad, a collapsed triangle, a sliver and an unreferenced vertex
+    verts_loc = np.float32([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0], [2, 0, 0], [2, 1e-4, 0], [5, 5, 5]])
+    faces_loc = np.int32([[0, 1, 2], [0, 2, 3], [1, 1, 2], [1, 4, 5]])
+    verts_uvs = np.float32([[0, 0], [1, 0], [1, 1], [0, 1], [0.5, 0.5]])
+    faces_uvs = np.int32([[0, 1, 2], [0, 2, 3], [4, 4, 4], [1, 4, 4]])
+    return {'verts_loc': verts_loc, 'faces_loc': faces_loc, 'verts_uvs': verts_uvs, 'faces_uvs': faces_uvs,
+            'verts_nor': np.float32([[0, 0, 1]]), 'faces_nor': np.zeros((4, 3), dtype=np.int32)}
+
+
+def test_degenerate_faces_and_unreferenced_vertices_are_removed():
+    original = mesh_arrays()
+    cleaned, faces_removed, verts_removed = data3d_utils._clean_mesh_arrays(original, min_area=1e-4)
+    assert faces_removed == 2 and verts_removed == 3
+    assert np.array_equal(cleaned['verts_loc'], original['verts_loc'][:4])
+    assert np.array_equal(cleaned['faces_loc'], original['faces_loc'][:2])
+    assert np.array_equal(cleaned['verts_uvs'], original['verts_uvs'][:4])
+    assert np.array_equal(cleaned['faces_uvs'], original['faces_uvs'][:2])
+    assert cleaned['faces_nor'].shape == (2, 3) and cleaned['verts_nor'] is original['verts_nor']
+    # The input is not modified
+    assert len(original['faces_loc']) == 4 and len(original['verts_loc']) == 7
+
+
+def test_min_area():
+    cleaned, faces_removed, verts_removed = data3d_utils._clean_mesh_arrays(mesh_arrays(), min_area=0.0)
+    assert faces_removed == 1 and verts_removed == 1
+    assert np.array_equal(cleaned['faces_loc'], np.int32([[0, 1, 2], [0, 2, 3], [1, 4, 5]]))
+
+
+def test_indices_are_remapped():
+    verts_loc = np.float32([[9, 9, 9], [0, 0, 0], [9, 9, 9], [1, 0, 0], [0, 1, 0]])
+    arrays = {'verts_loc': verts_loc, 'faces_loc': np.int32([[1, 3, 4]])}
+    cleaned, faces_removed, verts_removed = data3d_utils._clean_mesh_arrays(arrays)
+    assert (faces_removed, verts_removed) == (0, 2)
+    assert np.array_equal(cleaned['verts_loc'][cleaned['faces_loc']], verts_loc[arrays['faces_loc']])
+
+
+def test_clean_mesh_is_returned_unchanged():
+    arrays = {'verts_loc': np.float32([[0, 0, 0], [1, 0, 0], [0, 1, 0]]), 'faces_loc': np.int32([[0, 1, 2]])}
+    cleaned, faces_removed, verts_removed = data3d_utils._clean_mesh_arrays(arrays)
+    assert cleaned is arrays and (faces_removed, verts_removed) == (0, 0)
@@ -0,0 +1,101 @@
+import io
+import os
+
+import numpy as np
+import pytest
+
+import data3d_utils
+from data3d_utils import D3D
+
+CODECS = [data3d_utils.CODEC_GZIP, data3d_utils.CODEC_ZLIB, data3d_utils.CODEC_XZ]
+
+
+def payload(size=300000):
+    # Compressible but not trivial
+    return bytes(np.random.RandomState(0).randint(0, 16, size).astype(np.uint8))
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_concatenated_streams_are_read_in_order(codec):
+    data = payload()
+    blocks = [data[x:x + 65536] for x in range(0, len(data), 65536)]
+    stream = b''.join(data3d_utils._compress_block(block, codec, level=1) for block in blocks)
+    assert data3d_utils._detect_codec(stream[:6]) == codec
+    reader = data3d_utils._DecompressingReader(io.BytesIO(stream), codec, chunk_size=1000)
+    with reader:
+        assert reader.read(10) == data[:10]
+        assert reader.read() == data[10:]
+        assert reader.read() == b''
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_truncated_stream_raises(codec):
+    stream = data3d_utils._compress_block(payload(), codec)
+    with pytest.raises(Exception, match='Truncated'):
+        data3d_utils._DecompressingReader(io.BytesIO(stream[:-20]), codec).read()
+    with pytest.raises(Exception, match='Truncated'):
+        data3d_utils._decompress_stream(stream[:-20], codec)
+
+
+def test_codec_detection_and_suffixes():
+    header = bytes(data3d_utils.MAGIC_NUMBER, 'ascii') + bytes(12)
+    assert data3d_utils._detect_codec(header) == data3d_utils.CODEC_NONE
+    assert data3d_utils._compress_block(header, data3d_utils.CODEC_NONE) == header
+    assert data3d_utils._get_codec_from_path('/a/model.xz.data3d.buffer') == data3d_utils.CODEC_XZ
+    assert data3d_utils._get_codec_from_path('model.gz.data3d.buffer') == data3d_utils.CODEC_GZIP
+    assert data3d_utils._get_codec_from_path('model.data3d.buffer') == data3d_utils.CODEC_NONE
+    with pytest.raises(Exception, match='Unknown compression codec'):
+        data3d_utils._get_decompressor('brotli')
+
+
+def write_buffer(tmp_path, codec, level=None):
+    positions = np.random.RandomState(1).rand(300 * 9).astype(np.float32)
+    mesh = {D3D.v_coords: positions, D3D.v_normals: np.tile(np.float32([0, 1, 0]), 300 * 3)}
+    data3d = {D3D.r_container: {D3D.o_meshes: {'m': mesh}}}
+    path = data3d_utils._to_data3d_buffer(data3d, str(tmp_path / 'm.data3d.buffer'),
+                                          compress_file=codec != data3d_utils.CODEC_NONE, codec=codec,
+                                          compression_level=level)
+    return path, positions
+
+
+@pytest.mark.parametrize('codec', [data3d_utils.CODEC_NONE] + CODECS)
+def test_buffer_files_are_read_with_the_detected_codec(tmp_path, codec):
+    path, positions = write_buffer(tmp_path, codec, level=1)
+    f, detected = data3d_utils._open_buffer_file(path)
+    with f:
+        assert detected == codec
+    assert data3d_utils.inspect_data3d(path)['codec'] == codec
+    root = data3d_utils._from_data3d_buffer(path)[-1]
+    mesh = root.mesh_references['m']
+    decoded = root._get_attribute_from_buffer(mesh, D3D.b_coords_offset, D3D.b_coords_length, D3D.b_coords_encoding)
+    assert np.array_equal(decoded.ravel(), positions)
+
+
+def test_unknown_codec_is_rejected(tmp_path):
+    with pytest.raises(Exception, match='Unknown compression codec'):
+        write_buffer(tmp_path, 'brotli')
+
+
+def test_benchmark_compression(tmp_path):
+    path, _ = write_buffer(tmp_path, data3d_utils.CODEC_GZIP)
+    report = data3d_utils.benchmark_compression(path, codecs=[data3d_utils.CODEC_NONE, data3d_utils.CODEC_ZLIB],
+                                                levels=[1], workers=1, repeat=1)
+    assert report['rawBytes'] == os.path.getsize(write_buffer(tmp_path, data3d_utils.CODEC_NONE)[0])
+    assert [(r['codec'], r['level']) for r in report['results']] == [('none', None), ('zlib', 1)]
+    assert report['results'][0]['ratio'] == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize('codec', [data3d_utils.CODEC_NONE, data3d_utils.CODEC_GZIP])
+def test_inspect_opens_the_file_once(tmp_path, monkeypatch, codec):
+    path, _ = write_buffer(tmp_path, codec)
+    open_buffer_file = data3d_utils._open_buffer_file
+    opened = []
+
+    def recording_open(input_path):
+        opened.append(input_path)
+        return open_buffer_file(input_path)
+
+    monkeypatch.setattr(data3d_utils, '_open_buffer_file', recording_open)
+    summary = data3d_utils.inspect_data3d(path)
+    assert opened == [path]
+    assert summary['codec'] == codec and summary['meshCount'] == 1 and summary['vertexCount'] == 900
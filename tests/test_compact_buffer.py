@@ -0,0 +1,126 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import data3d_utils
+from data3d_utils import D3D
+
+
+ATTRIBUTES = {
+    D3D.v_coords: (D3D.b_coords_offset, D3D.b_coords_length, D3D.b_coords_encoding),
+    D3D.v_normals: (D3D.b_normals_offset, D3D.b_normals_length, D3D.b_normals_encoding),
+    D3D.uv_coords: (D3D.b_uvs_offset, D3D.b_uvs_length, D3D.b_uvs_encoding),
+}
+
+
+def random_mesh(seed, vertex_count=3000):
+    rng = np.random.RandomState(seed)
+    normals = rng.normal(size=(vertex_count, 3))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    return OrderedDict([
+        (D3D.v_coords, (rng.uniform(-50.0, 50.0, size=(vertex_count, 3)) * [1.0, 0.1, 3.0]).astype(np.float32).ravel()),
+        (D3D.v_normals, normals.astype(np.float32).ravel()),
+        (D3D.uv_coords, rng.uniform(-4.0, 4.0, size=(vertex_count, 2)).astype(np.float32).ravel()),
+        (D3D.m_material, 'mat'),
+    ])
+
+
+def write_and_read(tmp_path, meshes, version, **kwargs):
+    """ Write the meshes with _to_data3d_buffer and read the decoded attributes back with _from_data3d_buffer. """
+    data3d = {D3D.r_container: OrderedDict([(D3D.o_meshes, meshes), (D3D.o_materials, {'mat': {}})])}
+    path = data3d_utils._to_data3d_buffer(data3d, str(tmp_path / 'scene.data3d.buffer'), compress_file=False,
+                                          version=version, **kwargs)
+    data3d_objects = data3d_utils._from_data3d_buffer(path)
+    root = data3d_objects[-1]
+    decoded = {}
+    for mesh_key, mesh in root.mesh_references.items():
+        decoded[mesh_key] = {key: np.asarray(root._get_attribute_from_buffer(mesh, *keys), dtype=np.float64)
+                             for key, keys in ATTRIBUTES.items()}
+    return root, decoded
+
+
+def angles_deg(a, b):
+    """ Angle between the unit vectors, well conditioned for small angles. """
+    a = a.reshape(-1, 3).astype(np.float64)
+    b = b.reshape(-1, 3).astype(np.float64)
+    return np.degrees(np.arctan2(np.linalg.norm(np.cross(a, b), axis=1), (a * b).sum(axis=1)))
+
+
+@pytest.mark.parametrize('normals_type, max_angle', [('int16', 0.02), ('int8', 1.0)])
+@pytest.mark.parametrize('uvs_type', ['float16', 'int16'])
+def test_compact_round_trip_error_bounds(tmp_path, normals_type, max_angle, uvs_type):
+    meshes = OrderedDict([('a', random_mesh(0)), ('b', random_mesh(1, vertex_count=30))])
+    source = {key: {k: v.copy() for k, v in mesh.items() if k != D3D.m_material} for key, mesh in meshes.items()}
+    root, decoded = write_and_read(tmp_path, meshes, data3d_utils.VERSION_COMPACT, normals_type=normals_type,
+                                   uvs_type=uvs_type)
+    assert root.buffer_version == data3d_utils.VERSION_COMPACT
+
+    for mesh_key, mesh in root.mesh_references.items():
+        original = source[mesh_key]
+        result = decoded[mesh_key]
+
+        # Positions: at most half a quantization step per axis (plus the float32 rounding of the result)
+        scale = np.asarray(mesh[D3D.b_coords_encoding][D3D.e_scale])
+        positions = original[D3D.v_coords].astype(np.float64).reshape(-1, 3)
+        rounding = np.finfo(np.float32).eps * np.abs(positions).max(axis=0)
+        error = np.abs(result[D3D.v_coords].reshape(-1, 3) - positions)
+        assert np.all(error <= scale / 2 + rounding)
+
+        # Normals
+        assert angles_deg(result[D3D.v_normals], original[D3D.v_normals]).max() < max_angle
+
+        # Uvs
+        uvs = original[D3D.uv_coords].astype(np.float64).reshape(-1, 2)
+        error = np.abs(result[D3D.uv_coords].reshape(-1, 2) - uvs)
+        if uvs_type == 'float16':
+            assert mesh[D3D.b_uvs_encoding][D3D.e_type] == 'float16'
+            assert np.all(error <= np.abs(uvs) * 2.0 ** -11 + 2.0 ** -24)
+        else:
+            scale = np.asarray(mesh[D3D.b_uvs_encoding][D3D.e_scale])
+            rounding = np.finfo(np.float32).eps * np.abs(uvs).max(axis=0)
+            assert np.all(error <= scale / 2 + rounding)
+
+
+def test_compact_payload_is_smaller(tmp_path):
+    meshes = OrderedDict([('a', random_mesh(0))])
+    data3d_utils._to_data3d_buffer({D3D.r_container: {D3D.o_meshes: meshes}}, str(tmp_path / 'f.data3d.buffer'),
+                                   compress_file=False, version=data3d_utils.VERSION)
+    meshes = OrderedDict([('a', random_mesh(0))])
+    data3d_utils._to_data3d_buffer({D3D.r_container: {D3D.o_meshes: meshes}}, str(tmp_path / 'c.data3d.buffer'),
+                                   compress_file=False, version=data3d_utils.VERSION_COMPACT, normals_type='int8')
+    assert (tmp_path / 'c.data3d.buffer').stat().st_size < (tmp_path / 'f.data3d.buffer').stat().st_size / 2
+
+
+@pytest.mark.parametrize('version', data3d_utils.SUPPORTED_VERSIONS)
+def test_reader_dispatches_by_header_version(tmp_path, version):
+    mesh = random_mesh(3, vertex_count=9)
+    source = {k: v.copy() for k, v in mesh.items() if k != D3D.m_material}
+    root, decoded = write_and_read(tmp_path, OrderedDict([('a', mesh)]), version)
+    assert root.buffer_version == version
+    # Version 1 offsets count floats, version 3 offsets count aligned bytes
+    offsets = [root.mesh_references['a'][keys[0]] for keys in ATTRIBUTES.values()]
+    if version == data3d_utils.VERSION:
+        assert offsets == [0, 27, 54]
+    else:
+        assert all(offset % (16 if version == data3d_utils.VERSION_ALIGNED else 4) == 0 for offset in offsets)
+    tolerance = 0.0 if version != data3d_utils.VERSION_COMPACT else 0.01
+    for key in ATTRIBUTES:
+        assert np.allclose(decoded['a'][key], source[key], atol=tolerance, rtol=0)
+
+
+def test_reader_rejects_unsupported_version(tmp_path):
+    path = data3d_utils._to_data3d_buffer({D3D.r_container: {D3D.o_meshes: OrderedDict([('a', random_mesh(4, 3))])}},
+                                          str(tmp_path / 'v.data3d.buffer'), compress_file=False)
+    with open(path, 'r+b') as f:
+        f.seek(4)
+        f.write(data3d_utils.binary_pack('i', [99]))
+    with pytest.raises(Exception, match='Unsupported version'):
+        data3d_utils._from_data3d_buffer(path)
+
+
+def test_version_1_rejects_compact_payload(tmp_path):
+    with pytest.raises(Exception, match='compact'):
+        data3d_utils._to_data3d_buffer({D3D.r_container: {D3D.o_meshes: OrderedDict([('a', random_mesh(5, 3))])}},
+                                       str(tmp_path / 'x.data3d.buffer'), compress_file=False,
+                                       version=data3d_utils.VERSION, compact=True)
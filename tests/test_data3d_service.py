@@ -0,0 +1,124 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import data3d_service
+import data3d_utils
+from data3d_utils import D3D
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def buffer_path(tmp_path):
+    positions = np.random.RandomState(0).rand(6 * 9).astype(np.float32)
+    mesh = {D3D.v_coords: positions, D3D.v_normals: np.tile(np.float32([0, 0, 1]), 6 * 3)}
+    data3d = {D3D.r_container: {D3D.o_meshes: {'m': mesh}}}
+    return data3d_utils._to_data3d_buffer(data3d, str(tmp_path / 'm.data3d.buffer'), compress_file=False)
+
+
+async def with_service(test, socket_path=None, **kwargs):
+    """ Run the test coroutine against an in-process service, without a server unless a socket path is given. """
+    kwargs.setdefault('workers', 2)
+    with ThreadPoolExecutor(max_workers=kwargs['workers']) as executor:
+        service = data3d_service.Data3dService(executor=executor, **kwargs)
+        await service.start(socket_path=socket_path, port=None)
+        try:
+            return await test(service)
+        finally:
+            await service.close()
+
+
+def test_operations(buffer_path, tmp_path):
+    output_path = str(tmp_path / 'm.data3d.json')
+
+    async def test(service):
+        return await asyncio.gather(
+            service.submit({'id': 1, 'op': 'inspect', 'input': buffer_path}),
+            service.submit({'id': 2, 'op': 'validate', 'input': buffer_path}),
+            service.submit({'id': 3, 'op': 'convert', 'input': buffer_path, 'output': output_path}))
+
+    inspected, validated, converted = run(with_service(test))
+    assert inspected['id'] == 1 and inspected['ok'] and inspected['result']['vertexCount'] == 18
+    assert validated['id'] == 2 and validated['ok'] and validated['result']['valid']
+    assert converted['id'] == 3 and converted['ok'] and converted['result']['output'] == output_path
+    assert data3d_utils.inspect_data3d(output_path)['vertexCount'] == 18
+
+
+def test_errors_and_metrics(buffer_path, tmp_path):
+    async def test(service):
+        responses = [await service.submit({'id': 1, 'op': 'inspect', 'input': buffer_path}),
+                     await service.submit({'id': 2, 'op': 'inspect', 'input': str(tmp_path / 'missing')}),
+                     await service.submit({'id': 3, 'op': 'unknown'}),
+                     await service.submit(None)]
+        return responses, await service.submit({'id': 4, 'op': 'metrics'})
+
+    responses, metrics = run(with_service(test))
+    assert [r['ok'] for r in responses] == [True, False, False, False]
+    assert 'File does not exist' in responses[1]['error']
+    assert 'Unknown operation' in responses[2]['error']
+    assert metrics['ok']
+    result = metrics['result']
+    assert result['queueDepth'] == 0 and result['inFlight'] == 0 and result['workers'] == 2
+    inspect = result['operations']['inspect']
+    assert inspect['count'] == 2 and inspect['errors'] == 1
+    assert inspect['meanRun'] >= 0.0 and inspect['maxRun'] >= inspect['meanRun']
+    assert result['operations']['convert']['count'] == 0
+
+
+def test_full_queue_rejects_requests(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_operation(operation, args):
+        started.set()
+        release.wait(10)
+        return {'input': args['input']}
+
+    monkeypatch.setattr(data3d_service, '_run_operation', blocking_operation)
+
+    async def test(service):
+        loop = asyncio.get_event_loop()
+        running = asyncio.ensure_future(service.submit({'id': 1, 'op': 'inspect', 'input': 'a'}))
+        await loop.run_in_executor(None, started.wait, 10)
+        queued = asyncio.ensure_future(service.submit({'id': 2, 'op': 'inspect', 'input': 'b'}))
+        await asyncio.sleep(0)
+        rejected = await service.submit({'id': 3, 'op': 'inspect', 'input': 'c'})
+        metrics = service.get_metrics()
+        release.set()
+        return rejected, metrics, await running, await queued
+
+    rejected, metrics, running, queued = run(with_service(test, workers=1, queue_size=1))
+    assert not rejected['ok'] and rejected['error'].startswith('Queue full')
+    assert metrics['queueDepth'] == 1 and metrics['inFlight'] == 1
+    assert running['ok'] and running['result'] == {'input': 'a'}
+    assert queued['ok'] and queued['result'] == {'input': 'b'}
+
+
+@pytest.mark.skipif(not hasattr(asyncio, 'start_unix_server'), reason='unix sockets only')
+def test_socket_protocol(buffer_path, tmp_path):
+    socket_path = str(tmp_path / 'service.sock')
+
+    async def test(service):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(b'{"id": 1, "op": "inspect", "input": ' + json.dumps(buffer_path).encode('utf-8') + b'}\n')
+        writer.write(b'not json\n\n{"id": 2, "op": "metrics"}\n')
+        await writer.drain()
+        responses = [json.loads((await reader.readline()).decode('utf-8')) for _ in range(3)]
+        writer.close()
+        return responses
+
+    responses = run(with_service(test, socket_path=socket_path))
+    by_id = {response['id']: response for response in responses}
+    assert by_id[1]['ok'] and by_id[1]['result']['meshCount'] == 1
+    assert by_id[2]['ok'] and 'operations' in by_id[2]['result']
+    assert not by_id[None]['ok'] and by_id[None]['error'].startswith('Invalid request')
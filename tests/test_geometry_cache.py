@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import data3d_utils
+
+
+def source_file(tmp_path, name, content=b'data3d'):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def mesh(seed=0, vertex_count=100):
+    rng = np.random.RandomState(seed)
+    return {'name': 'mesh', 'verts_loc': rng.rand(vertex_count, 3).astype(np.float32),
+            'faces_loc': rng.randint(0, vertex_count, (vertex_count, 3)).astype(np.int32)}
+
+
+def write_entry(cache, input_path, meshes, options=None):
+    writer = cache.create(input_path, options)
+    writer.add(0, 'm', meshes)
+    writer.commit()
+
+
+def test_round_trip(tmp_path):
+    cache = data3d_utils.GeometryCache(str(tmp_path / 'cache'))
+    input_path = source_file(tmp_path, 'a.data3d.buffer')
+    assert cache.open(input_path) is None
+    meshes = [mesh(0), mesh(1)]
+    write_entry(cache, input_path, meshes)
+    with cache.open(input_path) as entry:
+        cached = entry.get(0, 'm')
+        assert entry.get(1, 'm') is None
+        for expected, actual in zip(meshes, cached):
+            assert actual['name'] == 'mesh'
+            assert np.array_equal(actual['verts_loc'], expected['verts_loc'])
+            assert np.array_equal(actual['faces_loc'], expected['faces_loc'])
+        del cached, actual
+
+
+def test_options_are_part_of_the_key(tmp_path):
+    cache = data3d_utils.GeometryCache(str(tmp_path / 'cache'))
+    input_path = source_file(tmp_path, 'a.data3d.buffer')
+    options = {'weldThreshold': 0.0001, 'degenerateArea': 1e-8, 'region': None}
+    write_entry(cache, input_path, [mesh()], options)
+    assert cache.open(input_path) is None
+    assert cache.open(input_path, dict(options, weldThreshold=0.001)) is None
+    assert cache.open(input_path, dict(options, region=[[0, 0, 0], [1, 1, 1]])) is None
+    assert cache.open(input_path, dict(options, degenerateArea=0.0)) is None
+    entry = cache.open(input_path, dict(options))
+    assert entry is not None
+    entry.close()
+
+
+def test_entry_close(tmp_path):
+    cache = data3d_utils.GeometryCache(str(tmp_path / 'cache'))
+    input_path = source_file(tmp_path, 'a.data3d.buffer')
+    write_entry(cache, input_path, [mesh()])
+
+    entry = cache.open(input_path)
+    entry.close()
+    assert entry.buffer.closed
+
+    # Referenced arrays keep the mapping until they are freed
+    entry = cache.open(input_path)
+    arrays = entry.get(0, 'm')
+    entry.close()
+    assert arrays[0]['verts_loc'].sum() > 0
+
+
+def test_invalid_entry_is_ignored(tmp_path):
+    cache = data3d_utils.GeometryCache(str(tmp_path / 'cache'))
+    input_path = source_file(tmp_path, 'a.data3d.buffer')
+    write_entry(cache, input_path, [mesh()])
+    path = cache.get_path(cache.get_digest(input_path))
+    with open(path, 'r+b') as cache_file:
+        cache_file.seek(-data3d_utils.GEOMETRY_CACHE_FOOTER.size, os.SEEK_END)
+        cache_file.write(b'XXXX')
+    assert cache.open(input_path) is None
+
+
+def test_trim_evicts_least_recently_used(tmp_path):
+    cache = data3d_utils.GeometryCache(str(tmp_path / 'cache'))
+    paths = []
+    for i in range(3):
+        input_path = source_file(tmp_path, '%d.data3d.buffer' % i, content=bytes([i]))
+        write_entry(cache, input_path, [mesh(i)])
+        path = cache.get_path(cache.get_digest(input_path))
+        os.utime(path, (i, i))
+        paths.append(path)
+    # Room for two of the three equally sized entries
+    cache.max_bytes = 2 * os.path.getsize(paths[0])
+    cache.trim()
+    assert [os.path.exists(path) for path in paths] == [False, True, True]
+    cache.clear()
+    assert not any(name.endswith(data3d_utils.GEOMETRY_CACHE_SUFFIX) for name in os.listdir(cache.cache_dir))
+
+
+def test_index_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(data3d_utils, 'GEOMETRY_CACHE_INDEX_SIZE', 3)
+    cache = data3d_utils.GeometryCache(str(tmp_path / 'cache'))
+    input_paths = [source_file(tmp_path, '%d.data3d.buffer' % i, content=bytes([i])) for i in range(5)]
+    for input_path in input_paths:
+        cache.get_digest(input_path)
+    with open(os.path.join(cache.cache_dir, 'index.json'), encoding='utf-8') as index_file:
+        index = json.load(index_file)
+    assert len(index) == 3
+    assert [key.split('|')[0] for key in index] == [os.path.abspath(p) for p in input_paths[2:]]
+
+
+def test_concurrent_index_updates(tmp_path):
+    cache = data3d_utils.GeometryCache(str(tmp_path / 'cache'))
+    input_paths = [source_file(tmp_path, '%d.data3d.buffer' % i, content=bytes([i]) * 1000) for i in range(32)]
+    errors = []
+
+    def hash_files(paths):
+        try:
+            for input_path in paths:
+                data3d_utils.GeometryCache(cache.cache_dir).get_digest(input_path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=hash_files, args=(input_paths[i::4],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    with open(os.path.join(cache.cache_dir, 'index.json'), encoding='utf-8') as index_file:
+        assert len(json.load(index_file)) == len(input_paths)
+    assert not [name for name in os.listdir(cache.cache_dir) if name.endswith('.tmp')]
+
+
+@pytest.mark.parametrize('options', [None, {'region': None}])
+def test_paths_differ_per_digest(tmp_path, options):
+    cache = data3d_utils.GeometryCache(str(tmp_path / 'cache'))
+    assert cache.get_path('a' * 40, options) != cache.get_path('b' * 40, options)
+    assert cache.get_path('a' * 40, options).endswith(data3d_utils.GEOMETRY_CACHE_SUFFIX)
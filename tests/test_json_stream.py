@@ -0,0 +1,107 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+import data3d_utils
+from data3d_utils import D3D
+
+
+def reader_for(text, chunk_size):
+    return data3d_utils._JsonStreamReader(io.StringIO(text), chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, 4096])
+def test_float_array_spanning_chunks(chunk_size):
+    values = np.random.RandomState(0).uniform(-1e3, 1e3, 500).astype(np.float32)
+    text = '{"positions": [' + ', '.join(repr(float(v)) for v in values) + '], "name": "a"}'
+    reader = reader_for(text, chunk_size)
+    parsed = {key: reader.read_value(key) for key in reader.iter_keys()}
+    assert parsed['positions'].dtype == np.float32
+    assert np.array_equal(parsed['positions'], values)
+    assert parsed['name'] == 'a'
+
+
+def test_float_array_text_buffer_stays_small():
+    text = '[' + ','.join(['0.123456'] * 20000) + ']'
+    reader = reader_for(text, 256)
+    fill = reader._fill
+    sizes = []
+
+    def tracked_fill():
+        result = fill()
+        sizes.append(len(reader.buffer))
+        return result
+
+    reader._fill = tracked_fill
+    values = reader.read_float_array()
+    assert len(values) == 20000
+    # Only the incomplete last number of a chunk is carried over
+    assert max(sizes) < 256 + 16
+
+
+@pytest.mark.parametrize('text', ['[]', '[ ]', '[\n]'])
+def test_empty_float_array(text):
+    values = reader_for(text, 1).read_float_array()
+    assert values.dtype == np.float32 and len(values) == 0
+
+
+@pytest.mark.parametrize('text', ['[1,2,]', '[1,,2]', '[,]', '[1,x]', '[1 2]', '[1,2', '[1,2,3'])
+@pytest.mark.parametrize('chunk_size', [2, 4096])
+def test_invalid_float_array(text, chunk_size):
+    with pytest.raises(ValueError):
+        reader_for(text, chunk_size).read_float_array()
+
+
+def node(node_id, children=(), **kwargs):
+    value = {D3D.node_id: node_id, D3D.o_meshes: {}}
+    if children:
+        value[D3D.o_children] = list(children)
+    value.update(kwargs)
+    return value
+
+
+def write_json(tmp_path, root):
+    path = tmp_path / 'scene.data3d.json'
+    path.write_text(json.dumps({'meta': {}, D3D.r_container: root}), encoding='utf-8')
+    return str(path)
+
+
+def test_json_objects_are_yielded_post_order(tmp_path):
+    root = node('root', [node('a', [node('a1'), node('a2')]), node('b')])
+    with open(write_json(tmp_path, root), encoding='utf-8') as f:
+        objects = list(data3d_utils._iter_data3d_json_objects(f))
+    assert [o.node_id for o in objects] == ['a1', 'a2', 'a', 'b', 'root']
+
+
+def test_json_import_keeps_pre_order_with_root_last(tmp_path):
+    # Keys after the children must still be applied to the parent
+    root = node('root', [node('a', [node('a1', [node('a11')]), node('a2')]), node('b')], position=[1, 2, 3])
+    objects = data3d_utils._from_data3d_json(write_json(tmp_path, root))
+    assert [o.node_id for o in objects] == ['a', 'a1', 'a11', 'a2', 'b', 'root']
+    by_id = {o.node_id: o for o in objects}
+    assert by_id['root'].position == [1, 2, 3]
+    assert by_id['root'].parent is None
+    assert by_id['a11'].parent is by_id['a1'] and by_id['a1'].parent is by_id['a']
+    assert [c.node_id for c in by_id['root'].children] == ['a', 'b']
+
+
+def test_json_import_without_container(tmp_path):
+    path = tmp_path / 'empty.data3d.json'
+    path.write_text('{"meta": {}}', encoding='utf-8')
+    assert data3d_utils._from_data3d_json(str(path)) == []
+
+
+def test_inspect_json(tmp_path):
+    mesh = {D3D.v_coords: [0.0] * 18, D3D.v_normals: [0.0] * 18, D3D.m_material: 'wall'}
+    root = node('root', [node('a', [node('a1', **{D3D.o_meshes: {'m': mesh}})])],
+                **{D3D.o_materials: {'wall': {}}})
+    summary = data3d_utils.inspect_data3d(write_json(tmp_path, root))
+    assert summary['nodeCount'] == 3
+    assert summary['hierarchyDepth'] == 3
+    assert summary['meshCount'] == 1
+    assert summary['vertexCount'] == 6
+    assert summary['payloadBytes'] == 36 * 4
+    assert summary['materials'] == ['wall']
+    assert summary['meshes'][0]['node'] == 'a1' and summary['meshes'][0]['material'] == 'wall'
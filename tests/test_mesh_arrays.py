@@ -0,0 +1,83 @@
+from collections import OrderedDict
+
+import numpy as np
+
+import data3d_utils
+from data3d_utils import D3D
+
+
+def write_buffer(tmp_path, mesh, version=data3d_utils.VERSION_ALIGNED):
+    data3d = {D3D.r_container: {D3D.o_meshes: OrderedDict([('a', mesh)])}}
+    path = data3d_utils._to_data3d_buffer(data3d, str(tmp_path / 'm.data3d.buffer'), compress_file=False,
+                                          version=version)
+    return data3d_utils._from_data3d_buffer(path)[-1]
+
+
+def quad_mesh():
+    """ Two triangles of a unit quad sharing an edge, the first triangle repeated with reversed winding. """
+    positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0],
+                          [0, 0, 0], [1, 1, 0], [0, 1, 0],
+                          [0, 0, 0], [1, 1, 0], [1, 0, 0]], dtype=np.float32)
+    return OrderedDict([
+        (D3D.v_coords, positions.ravel()),
+        (D3D.v_normals, np.tile([0.0, 0.0, 1.0], 9).astype(np.float32)),
+        (D3D.uv_coords, positions[:, :2].ravel().copy()),
+    ])
+
+
+def test_float32_attributes_are_views_of_the_buffer(tmp_path):
+    root = write_buffer(tmp_path, quad_mesh())
+    mesh = root.mesh_references['a']
+    positions = root._get_attribute_from_buffer(mesh, D3D.b_coords_offset, D3D.b_coords_length,
+                                                D3D.b_coords_encoding)
+    assert isinstance(positions, np.ndarray) and positions.dtype == np.float32
+    assert not positions.flags.owndata
+
+
+def test_mesh_data_indexes_distinct_vertices(tmp_path):
+    root = write_buffer(tmp_path, quad_mesh(), version=data3d_utils.VERSION)
+    single_sided, double_sided = root.get_mesh_data('a')
+    assert single_sided['verts_loc'].tolist() == [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]
+    assert single_sided['faces_loc'].tolist() == [[0, 1, 2], [0, 2, 3]]
+    assert single_sided['faces_loc'].dtype == np.int32
+    assert single_sided['verts_nor'].tolist() == [[0, 0, 1]]
+    assert single_sided['faces_uvs'].tolist() == [[0, 1, 2], [0, 2, 3]]
+    # The reversed copy of the first triangle is split into the double sided mesh
+    assert double_sided['faces_loc'].tolist() == [[0, 2, 1]]
+    assert double_sided['verts_loc'] is single_sided['verts_loc']
+
+
+def test_mesh_data_from_json_arrays():
+    mesh = quad_mesh()
+    del mesh[D3D.uv_coords]
+    mesh[D3D.v_coords] = mesh[D3D.v_coords][:18]
+    mesh[D3D.v_normals] = mesh[D3D.v_normals][:18]
+    data3d_object = data3d_utils.Data3dObject({D3D.o_meshes: {'a': mesh}})
+    mesh_data, = data3d_object.get_mesh_data('a')
+    assert mesh_data['faces_loc'].tolist() == [[0, 1, 2], [0, 2, 3]]
+    assert 'verts_uvs' not in mesh_data and 'faces_uvs' not in mesh_data
+
+
+def test_negative_zero_equals_zero():
+    distinct, indices = data3d_utils._distinct_rows(np.array([[0.0, 1.0], [-0.0, 1.0], [2.0, 1.0]], dtype=np.float32))
+    assert distinct.tolist() == [[0.0, 1.0], [2.0, 1.0]]
+    assert indices.tolist() == [0, 0, 1]
+
+
+def test_normal_matrix_is_the_inverse_transpose():
+    rng = np.random.RandomState(0)
+    for linear in (rng.rand(3, 3), np.diag([2.0, -1.0, 0.5])):
+        normal_matrix = data3d_utils.get_normal_matrix(linear)
+        expected = np.linalg.inv(linear).T
+        assert np.allclose(normal_matrix / np.linalg.norm(normal_matrix), expected / np.linalg.norm(expected))
+
+
+def test_zero_scale_axis():
+    assert np.array_equal(data3d_utils.get_normal_matrix(np.diag([2.0, 1.0, 0.0])), np.diag([0.0, 0.0, 2.0]))
+    mesh_arrays = {'position': [0, 0, 0], 'rotation': [0, 0, 0], 'scale': [1, 1, 0],
+                   'verts_loc': np.float32([[0, 0, 0], [1, 0, 1], [0, 1, 1]]),
+                   'verts_nor': np.float32([[0, 0, 1], [0.6, 0, 0.8], [1, 0, 0]]), 'faces_loc': np.int32([[0, 1, 2]])}
+    transformed = data3d_utils.transform_mesh_arrays(mesh_arrays)
+    assert transformed['verts_loc'].tolist() == [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+    # The flattened mesh faces along z, normals within the flattened plane have no direction left
+    assert transformed['verts_nor'].tolist() == [[0, 0, 1], [0, 0, 1], [0, 0, 0]]
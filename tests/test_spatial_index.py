@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+import pytest
+
+import data3d_utils
+from data3d_utils import D3D
+
+CUBE = np.float32([[0, 0, 0], [1, 1, 1], [0, 1, 0]]).ravel()
+
+
+def scene():
+    """ A rotated root with a mesh and a child mesh, a far away second root and a mesh without positions.
+        World bounds:
+            root/r - [9, 10] x [0, 1] x [0, 1]
+            child/c - [9, 10] x [1, 2] x [5, 6]
+            far/f - [100, 101] x [0, 1] x [0, 1]
+    """
+    root = data3d_utils.Data3dObject({D3D.node_id: 'root', D3D.o_position: [10, 0, 0],
+                                      D3D.o_rotation: [0, 0, math.pi / 2],
+                                      D3D.o_meshes: {'r': {D3D.v_coords: CUBE}, 'empty': {D3D.v_coords: []}}})
+    child = data3d_utils.Data3dObject({D3D.node_id: 'child', D3D.o_position: [1, 0, 0],
+                                       D3D.o_meshes: {'c': {D3D.v_coords: CUBE, D3D.m_position: [0, 0, 5]}}},
+                                      parent=root)
+    far = data3d_utils.Data3dObject({D3D.node_id: 'far', D3D.o_position: [100, 0, 0],
+                                     D3D.o_meshes: {'f': {D3D.v_coords: CUBE}}})
+    return [child, root, far]
+
+
+def test_bounds_accumulate_the_hierarchy():
+    index = data3d_utils.Data3dSpatialIndex(scene())
+    assert index.mesh_bounds[1]['empty'] is None
+    expected = {(1, 'r'): ([9, 0, 0], [10, 1, 1]), (0, 'c'): ([9, 1, 5], [10, 2, 6]),
+                (2, 'f'): ([100, 0, 0], [101, 1, 1])}
+    assert set(index.world_mesh_bounds) == set(expected)
+    for key, (lower, upper) in expected.items():
+        assert np.allclose(index.world_mesh_bounds[key][0], lower, atol=1e-6)
+        assert np.allclose(index.world_mesh_bounds[key][1], upper, atol=1e-6)
+    assert np.allclose(index.node_bounds[1][0], [9, 0, 0], atol=1e-6)
+    assert np.allclose(index.node_bounds[1][1], [10, 2, 6], atol=1e-6)
+
+
+@pytest.mark.parametrize('box_min, box_max, hits', [
+    ([9.5, 1.5, 5.5], [9.6, 1.6, 5.6], {(0, 'c')}),
+    ([9.2, 0.2, 0.2], [9.3, 0.3, 0.3], {(1, 'r')}),
+    ([0, 0, 0], [200, 1, 1], {(1, 'r'), (2, 'f')}),
+    ([-10, -10, -10], [200, 10, 10], {(0, 'c'), (1, 'r'), (2, 'f')}),
+    ([0, 0, 0], [8, 8, 8], set()),
+])
+def test_query_box(box_min, box_max, hits):
+    assert data3d_utils.Data3dSpatialIndex(scene()).query_box(box_min, box_max) == hits
+
+
+@pytest.mark.parametrize('center, radius, hits', [
+    ([9.5, 1.5, 4.5], 0.4, set()),
+    ([9.5, 1.5, 4.5], 0.6, {(0, 'c')}),
+    ([100.5, 0.5, 0.5], 0.1, {(2, 'f')}),
+    ([11, 0.5, 0.5], 1.0, {(1, 'r')}),
+])
+def test_query_sphere(center, radius, hits):
+    assert data3d_utils.Data3dSpatialIndex(scene()).query_sphere(center, radius) == hits
+
+
+def test_filter_removes_the_meshes_outside_the_region(tmp_path, monkeypatch):
+    input_path = tmp_path / 'scene.data3d.json'
+    input_path.write_bytes(b'{}')
+    data3d_objects = scene()
+    data3d_utils._filter_data3d_objects(data3d_objects, str(input_path), region_box=([9, 0, 0], [10, 2, 6]))
+    assert [sorted(o.mesh_references) for o in data3d_objects] == [['c'], ['r'], []]
+
+    # The local bounds are cached per file, the next filter does not compute them
+    def fail(self, mesh_key):
+        raise AssertionError('bounds not cached')
+
+    monkeypatch.setattr(data3d_utils.Data3dObject, 'get_mesh_bounds', fail)
+    data3d_objects = scene()
+    data3d_utils._filter_data3d_objects(data3d_objects, str(input_path), region_sphere=([100.5, 0.5, 0.5], 0.1))
+    assert [sorted(o.mesh_references) for o in data3d_objects] == [[], [], ['f']]
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+import texture_utils
+
+
+def test_preview_path():
+    assert texture_utils.get_preview_path('textures/wall.jpg') == 'textures/wall-preview.jpg'
+
+
+def test_preview_is_current_once_stamped(tmp_path):
+    image_path, preview_path = str(tmp_path / 'a.png'), str(tmp_path / 'a-preview.png')
+    open(image_path, 'wb').close()
+    assert not texture_utils.is_preview_current(image_path, preview_path)
+    open(preview_path, 'wb').close()
+    os.utime(preview_path, ns=(0, 0))
+    assert not texture_utils.is_preview_current(image_path, preview_path)
+    texture_utils.stamp_preview(image_path, preview_path)
+    assert texture_utils.is_preview_current(image_path, preview_path)
+
+
+def test_create_previews(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    jobs = []
+    for i, size in enumerate([(1024, 512), (100, 300)]):
+        image_path = str(tmp_path / ('%d.png' % i))
+        Image.new('RGB', size, (i * 100, 0, 0)).save(image_path)
+        jobs.append((image_path, texture_utils.get_preview_path(image_path)))
+
+    assert texture_utils.create_previews(jobs, max_size=256, workers=2) == [p for _, p in jobs]
+    with Image.open(jobs[0][1]) as preview:
+        assert preview.size == (256, 128)
+    with Image.open(jobs[1][1]) as preview:
+        assert preview.size == (86, 256)
+    assert all(texture_utils.is_preview_current(image_path, preview_path) for image_path, preview_path in jobs)
+    assert texture_utils.create_previews([]) == []
@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+import pytest
+
+import data3d_utils
+
+THRESHOLD = data3d_utils.WELD_THRESHOLD
+
+
+def weld(positions, threshold=THRESHOLD):
+    return data3d_utils._weld_vertices(np.array(positions, dtype=np.float32), threshold)
+
+
+def test_vertices_beyond_the_threshold_are_kept():
+    # Both vertices are on the same cell of the threshold sized grid
+    welded, remap = weld([[0.0, 0.0, 0.0], [1.7e-4, 0.0, 0.0]])
+    assert welded.tolist() == [0, 1]
+    assert remap.tolist() == [0, 1]
+
+
+@pytest.mark.parametrize('positions', [
+    [[0.99999, 0.0, 0.0], [0.9999928, 0.0, 0.0]],
+    [[THRESHOLD - 1.4e-6, 0.0, 0.0], [THRESHOLD + 1.4e-6, 0.0, 0.0]],
+    [[2 * THRESHOLD - 1.4e-6, 2 * THRESHOLD - 1e-6, -1e-6], [2 * THRESHOLD + 1.4e-6, 2 * THRESHOLD + 1e-6, 1e-6]],
+])
+def test_close_vertices_across_cell_borders_are_merged(positions):
+    welded, remap = weld(positions)
+    assert len(welded) == 1
+    assert remap.tolist() == [0, 0]
+
+
+def check_weld(positions, welded, remap):
+    """ Merged vertices are within the threshold of the kept one, kept vertices are more than that apart. """
+    positions = np.asarray(positions, dtype=np.float32)
+    kept = positions[welded].astype(np.float64)
+    assert np.linalg.norm(kept[remap] - positions, axis=1).max() <= THRESHOLD * (1 + 1e-6)
+    assert np.array_equal(remap[welded], np.arange(len(welded)))
+    assert len(data3d_utils._weld_vertices(positions[welded], THRESHOLD)[0]) == len(welded)
+
+
+def test_merges_do_not_chain():
+    positions = [[0.0, 0.0, 0.0], [0.6e-4, 0.0, 0.0], [1.2e-4, 0.0, 0.0]]
+    welded, remap = weld(positions)
+    # Either the middle vertex is kept or both outer ones
+    assert welded.tolist() in ([1], [0, 2])
+    check_weld(positions, welded, remap)
+
+
+def test_merged_vertices_are_within_the_threshold():
+    rng = np.random.RandomState(1)
+    positions = (rng.rand(20000, 3) * 0.05).astype(np.float32)
+    welded, remap = data3d_utils._weld_vertices(positions, THRESHOLD)
+    assert len(welded) < len(positions)
+    check_weld(positions, welded, remap)
+
+
+@pytest.mark.parametrize('positions', [
+    # Thousands of vertices in a few grid cells
+    np.random.RandomState(2).rand(5000, 3) * 2 * THRESHOLD,
+    np.zeros((20000, 3)),
+    # A dense lattice and a dense line in vertex order
+    np.stack(np.meshgrid(*[np.arange(30) * THRESHOLD / 3] * 3, indexing='ij'), -1).reshape(-1, 3),
+    np.outer(np.arange(20000) * 0.6 * THRESHOLD, [1, 0, 0]),
+])
+def test_dense_vertices(positions):
+    start = time.time()
+    welded, remap = weld(positions)
+    assert time.time() - start < 2.0
+    check_weld(positions, welded, remap)
+
+
+def mesh_arrays(positions, faces):
+    return {'verts_loc': np.array(positions, dtype=np.float32), 'faces_loc': np.array(faces, dtype=np.int32)}
+
+
+def test_weld_mesh_arrays_remaps_faces():
+    arrays = mesh_arrays([[0, 0, 0], [1, 0, 0], [1, 1, 0], [1, 0, 5e-5], [2, 0, 0]], [[0, 1, 2], [3, 4, 2]])
+    welded, merged = data3d_utils._weld_mesh_arrays(arrays)
+    assert merged == 1
+    assert np.allclose(welded['verts_loc'], [[0, 0, 0], [1, 0, 0], [1, 1, 0], [2, 0, 0]], atol=1e-4)
+    assert welded['faces_loc'].tolist() == [[0, 1, 2], [1, 3, 2]]
+
+
+@pytest.mark.parametrize('threshold', [0, THRESHOLD])
+def test_weld_mesh_arrays_without_merges(threshold):
+    arrays = mesh_arrays([[0, 0, 0], [1, 0, 0], [0, 0, 1e-5]], [[0, 1, 2]])
+    welded, merged = data3d_utils._weld_mesh_arrays(arrays, threshold)
+    if threshold:
+        assert merged == 1 and welded['faces_loc'].tolist() in ([[0, 1, 0]], [[1, 0, 1]])
+    else:
+        assert merged == 0 and welded is arrays